@@ -2,17 +2,85 @@
 """
 Servidor HTTP simple para el simulador FLUVI
 Ejecuta este script y abre http://localhost:8000 en tu navegador
+
+Además de servir los archivos, ofrece una API para analizar métricas sin
+cargar Pyodide en el navegador:
+    GET  /api/estado                          -> disponibilidad y cola del análisis
+    POST /api/analizar?tipo=csv&formato=datos -> cuerpo: archivo exportado (CSV, JSON o NPZ)
+         (&instrumentar=1 agrega tiempo y memoria por etapa, &instrumentar=tiempo solo tiempos;
+          &perfilar=<etapa> además su reporte de cProfile)
+
+y monitoreo en vivo de simulaciones en curso:
+    POST   /api/vivo/<sesion>           -> cuerpo: lote JSON {timestamps, density, throughput, ...}
+    GET    /api/vivo/<sesion>?horas=48  -> estado actual, agregados por hora y eventos recientes
+    GET    /api/vivo                    -> sesiones activas
+    DELETE /api/vivo/<sesion>
 """
 
 import http.server
-import socketserver
 import os
 import sys
 import socket
+import errno
+import json
+import argparse
+import threading
+import hashlib
+import gzip
+import mimetypes
+import re
+import time
+from collections import OrderedDict
+from email.utils import formatdate
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, TimeoutError as TiempoAgotado
+from concurrent.futures.process import BrokenProcessPool
+from urllib.parse import urlparse, parse_qs
+
+try:
+    import brotli
+    BROTLI_AVAILABLE = True
+except ImportError:
+    BROTLI_AVAILABLE = False
 
 # Configuración
 PORT = 8000
 DIRECTORY = "."
+SERVIDOR_HILOS = 64             # conexiones atendidas a la vez (cada una puede reutilizarse con keep-alive)
+SERVIDOR_COLA_CONEXIONES = 128  # conexiones pendientes de aceptar en el socket
+KEEP_ALIVE_TIMEOUT = 15         # segundos que una conexión inactiva conserva su hilo
+DESCARTE_MAX_BYTES = 1024 * 1024  # cuerpos no leídos mayores que esto cierran la conexión en vez de descartarse
+
+# API de análisis (ANALISIS_WORKERS = 0 la desactiva)
+ANALISIS_WORKERS = 2                     # procesos con el analizador ya importado
+ANALISIS_MAX_COLA = 8                    # solicitudes en espera además de las que se ejecutan
+ANALISIS_TIMEOUT = 120                   # segundos máximos por solicitud
+ANALISIS_MAX_BYTES = 200 * 1024 * 1024   # tamaño máximo del archivo recibido
+ANALISIS_CACHE_BYTES = 64 * 1024 * 1024           # resultados repetidos en memoria de cada worker
+ANALISIS_CACHE_DISCO_BYTES = 1024 * 1024 * 1024   # nivel en disco compartido (--cache-analisis)
+RUTA_ANALIZADOR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "src", "python")
+
+# Monitoreo en vivo (las sesiones viven en el proceso del servidor)
+VIVO_MAX_SESIONES = 16                   # sesiones simultáneas
+VIVO_INACTIVIDAD = 3600                  # segundos sin lotes tras los que una sesión puede descartarse
+VIVO_MAX_BYTES_LOTE = 5 * 1024 * 1024    # tamaño máximo de un lote
+PATRON_SESION = re.compile(r"^[A-Za-z0-9_-]{1,64}$")
+
+# Caché de archivos estáticos en memoria
+CACHE_MAX_BYTES = 128 * 1024 * 1024      # memoria total (original + variantes comprimidas)
+CACHE_MAX_ARCHIVO = 16 * 1024 * 1024     # archivos mayores se leen de disco en cada solicitud
+COMPRIMIR_MIN_BYTES = 1024               # no vale la pena comprimir archivos menores
+TIPOS_COMPRIMIBLES = ("text/", "application/javascript", "application/json",
+                      "application/xml", "image/svg+xml", "application/wasm")
+
+# Política de Cache-Control según la ruta
+CACHE_NO_STORE = "no-store, no-cache, must-revalidate"   # código de la app en desarrollo y API
+CACHE_LIBRERIAS = "public, max-age=31536000, immutable"  # librerías de terceros versionadas
+CACHE_IMAGENES = "public, max-age=86400"                 # sprites e imágenes (revalidan con ETag)
+RUTAS_LIBRERIAS = ("src/bootstrap-5.0.2-dist/", "src/libs/")
+EXTENSIONES_IMAGEN = (".png", ".jpg", ".jpeg", ".gif", ".webp", ".svg", ".ico")
+# En Windows el registro puede asociar .js a text/plain
+mimetypes.add_type("application/javascript", ".js")
 
 def get_local_ip():
     """Obtiene la IP local de la máquina"""
@@ -26,57 +94,773 @@ def get_local_ip():
     except Exception:
         return "No disponible"
 
+def _importar_analizador():
+    """Importa el módulo del analizador (solo numpy; pandas y matplotlib se cargan al usarse)"""
+    if RUTA_ANALIZADOR not in sys.path:
+        sys.path.insert(0, RUTA_ANALIZADOR)
+    import analizador
+    return analizador
+
+def _precargar_analizador(directorio_cache=None):
+    """Inicializador de cada proceso: importa el analizador (pandas, matplotlib, scipy) una sola vez
+
+    Args:
+        directorio_cache: Directorio del nivel en disco de la caché de resultados (None = solo memoria)
+    """
+    os.environ.setdefault("MPLBACKEND", "Agg")
+    analizador = _importar_analizador()
+    # El analizador difiere sus importaciones pesadas; los workers las pagan al arrancar
+    analizador.precargar_dependencias()
+    analizador.configurar_cache_resultados(ANALISIS_CACHE_BYTES, directorio_cache, ANALISIS_CACHE_DISCO_BYTES)
+
+def _proceso_listo():
+    """Tarea vacía para arrancar los procesos antes de la primera solicitud"""
+    return os.getpid()
+
+def _ejecutar_analisis(contenido, tipo, formato, instrumentar=False, perfilar=None):
+    """Analiza un archivo exportado dentro de un proceso del pool
+
+    Returns:
+        String JSON con el mismo contenido que devuelve analizar_archivo_web
+    """
+    import analizador
+    if tipo != "npz":
+        contenido = contenido.decode("utf-8-sig")
+    resultado = analizador.analizar_archivo_web(contenido, tipo, formato=formato,
+                                                instrumentar=instrumentar, perfilar=perfilar)
+    return resultado if isinstance(resultado, str) else json.dumps(resultado)
+
+class ColaLlenaError(Exception):
+    """La cola de análisis alcanzó ANALISIS_MAX_COLA"""
+
+class AnalisisNoDisponibleError(Exception):
+    """El pool no arrancó o se está reiniciando tras la caída de un worker"""
+
+class PoolAnalisis:
+    """Pool de procesos precalentados para AnalizadorTraficoFLUVI con cola acotada
+
+    Si un worker muere (OOM, segfault) o un análisis supera el timeout, los
+    procesos se reemplazan en un hilo aparte; mientras tanto la API responde
+    503 y /api/estado informa que no está disponible. Reemplazar el pool por
+    un timeout también interrumpe los demás análisis en curso.
+    """
+
+    def __init__(self, workers=ANALISIS_WORKERS, max_cola=ANALISIS_MAX_COLA, timeout=ANALISIS_TIMEOUT,
+                 directorio_cache=None):
+        self.workers = workers
+        self.directorio_cache = directorio_cache
+        self.max_cola = max_cola
+        self.timeout = timeout
+        self.pendientes = 0
+        self.lock = threading.Lock()
+        self.ejecutor = None
+        self.reiniciando = False
+        self.error = None
+
+    def iniciar(self):
+        """Arranca los procesos e importa el analizador en cada uno
+
+        Returns:
+            True si el pool quedó listo; si falla (p. ej. falta pandas) la API
+            responde como no disponible y la página usa Pyodide
+        """
+        ejecutor = None
+        try:
+            # 'spawn' evita heredar los hilos del servidor en los procesos hijos
+            ejecutor = ProcessPoolExecutor(max_workers=self.workers,
+                                           mp_context=multiprocessing.get_context("spawn"),
+                                           initializer=_precargar_analizador,
+                                           initargs=(self.directorio_cache,))
+            # La importación inicial no cuenta para el timeout de las solicitudes
+            for futuro in [ejecutor.submit(_proceso_listo) for _ in range(self.workers)]:
+                futuro.result()
+        except Exception as e:
+            self.error = str(e) or type(e).__name__
+            if ejecutor is not None:
+                ejecutor.shutdown(wait=False, cancel_futures=True)
+            return False
+        with self.lock:
+            self.ejecutor = ejecutor
+            self.error = None
+        return True
+
+    def detener(self):
+        with self.lock:
+            ejecutor, self.ejecutor = self.ejecutor, None
+        if ejecutor is not None:
+            ejecutor.shutdown(wait=False, cancel_futures=True)
+
+    def disponible(self):
+        """True si hay un pool arrancado y ninguno de sus workers ha muerto
+
+        Un pool roto se empieza a reemplazar en cuanto se detecta aquí.
+        """
+        ejecutor = self.ejecutor
+        if ejecutor is None:
+            return False
+        # _broken se marca en cuanto el ejecutor detecta un proceso muerto, antes de la siguiente solicitud
+        if getattr(ejecutor, '_broken', False):
+            self._reiniciar(ejecutor)
+            return False
+        return True
+
+    def estado(self):
+        """Disponibilidad y profundidad de la cola"""
+        disponible = self.disponible()
+        with self.lock:
+            pendientes = self.pendientes
+        return {
+            "disponible": disponible,
+            "reiniciando": self.reiniciando,
+            "workers": self.workers,
+            "en_proceso": min(pendientes, self.workers),
+            "en_cola": max(pendientes - self.workers, 0),
+            "max_cola": self.max_cola,
+            "timeout": self.timeout,
+            "error": self.error,
+        }
+
+    def reservar(self):
+        """Aparta un lugar en la cola antes de leer el archivo recibido
+
+        Cada reserva se consume con analizar() o se devuelve con _liberar().
+
+        Raises:
+            AnalisisNoDisponibleError: Si el pool no está disponible
+            ColaLlenaError: Si ya hay workers + max_cola solicitudes pendientes
+        """
+        if not self.disponible():
+            raise AnalisisNoDisponibleError()
+        with self.lock:
+            if self.ejecutor is None:
+                raise AnalisisNoDisponibleError()
+            if self.pendientes >= self.workers + self.max_cola:
+                raise ColaLlenaError()
+            self.pendientes += 1
+
+    def analizar(self, contenido, tipo, formato, instrumentar=False, perfilar=None):
+        """Ejecuta un análisis en un lugar ya reservado y espera su resultado
+
+        Raises:
+            AnalisisNoDisponibleError: Si el pool se rompió y se está reiniciando
+            TimeoutError: Si el análisis no termina en `timeout` segundos
+        """
+        ejecutor = self.ejecutor
+        try:
+            if ejecutor is None:
+                raise AnalisisNoDisponibleError()
+            futuro = ejecutor.submit(_ejecutar_analisis, contenido, tipo, formato, instrumentar, perfilar)
+        except BrokenProcessPool:
+            self._liberar()
+            self._reiniciar(ejecutor)
+            raise AnalisisNoDisponibleError()
+        except Exception:
+            self._liberar()
+            raise
+        # El lugar en la cola se libera cuando el proceso termina, aunque la solicitud ya haya expirado
+        futuro.add_done_callback(lambda _: self._liberar())
+        try:
+            return futuro.result(timeout=self.timeout)
+        except TiempoAgotado:
+            # cancel() no detiene una tarea que ya corre: el worker colgado solo se libera reemplazando el pool
+            if not futuro.cancel():
+                self._reiniciar(ejecutor)
+            raise TimeoutError()
+        except BrokenProcessPool:
+            self._reiniciar(ejecutor)
+            raise AnalisisNoDisponibleError()
+
+    def _liberar(self):
+        with self.lock:
+            self.pendientes -= 1
+
+    def _reiniciar(self, ejecutor):
+        """Termina los procesos de `ejecutor` y arranca otros en un hilo aparte"""
+        with self.lock:
+            if self.ejecutor is not ejecutor or self.reiniciando:
+                return
+            self.ejecutor = None
+            self.reiniciando = True
+        print("⚠️  Reiniciando los procesos de análisis (un worker murió o superó el timeout)")
+        for proceso in list((getattr(ejecutor, '_processes', None) or {}).values()):
+            proceso.terminate()
+        ejecutor.shutdown(wait=False, cancel_futures=True)
+        threading.Thread(target=self._rearrancar, daemon=True).start()
+
+    def _rearrancar(self):
+        listo = self.iniciar()
+        with self.lock:
+            self.reiniciando = False
+        print("✅ Procesos de análisis reiniciados" if listo
+              else f"⚠️  No se pudo reiniciar el análisis ({self.error}); la página usará Pyodide")
+
+POOL_ANALISIS = PoolAnalisis()
+
+class LimiteSesionesError(Exception):
+    """Se alcanzó VIVO_MAX_SESIONES y ninguna sesión está inactiva"""
+
+class RegistroSesiones:
+    """Sesiones de monitoreo en vivo (analizador.SesionEnVivo) indexadas por id
+
+    El analizador se importa en el proceso del servidor la primera vez que
+    llega un lote, fuera del lock del registro. Cada sesión tiene su propio lock: los lotes de una misma
+    simulación se procesan en orden y las demás sesiones no esperan.
+    """
+
+    def __init__(self, max_sesiones=VIVO_MAX_SESIONES, inactividad=VIVO_INACTIVIDAD):
+        self.max_sesiones = max_sesiones
+        self.inactividad = inactividad
+        self.sesiones = {}   # id -> [SesionEnVivo, lock, última actividad]
+        self.lock = threading.Lock()
+
+    def _crear(self, analizador):
+        return analizador.SesionEnVivo()
+
+    def obtener(self, sesion, crear=False):
+        """Devuelve [SesionEnVivo, lock, última actividad], o None si no existe
+
+        Raises:
+            LimiteSesionesError: Si hay que crearla y no hay lugar
+        """
+        # La primera importación no debe retener el lock que usan las demás sesiones
+        analizador = _importar_analizador() if crear else None
+        with self.lock:
+            entrada = self.sesiones.get(sesion)
+            if entrada is not None or not crear:
+                return entrada
+            if len(self.sesiones) >= self.max_sesiones:
+                limite = time.monotonic() - self.inactividad
+                inactivas = [s for s, (_, _, actividad) in self.sesiones.items() if actividad < limite]
+                if not inactivas:
+                    raise LimiteSesionesError()
+                del self.sesiones[min(inactivas, key=lambda s: self.sesiones[s][2])]
+            entrada = self.sesiones[sesion] = [self._crear(analizador), threading.Lock(), time.monotonic()]
+            return entrada
+
+    def agregar(self, sesion, lote):
+        entrada = self.obtener(sesion, crear=True)
+        with entrada[1]:
+            try:
+                resultado = entrada[0].agregar(lote)
+            except Exception:
+                # Un primer lote inválido no deja una sesión vacía ocupando lugar
+                if entrada[0].buffer.total == 0:
+                    self.eliminar(sesion)
+                raise
+            entrada[2] = time.monotonic()
+            return {"sesion": sesion, "aceptadas": resultado["aceptadas"],
+                    "total": entrada[0].buffer.total, "eventos": resultado["eventos"]}
+
+    def resumen(self, sesion, horas):
+        entrada = self.obtener(sesion)
+        if entrada is None:
+            return None
+        with entrada[1]:
+            return entrada[0].resumen(horas)
+
+    def eliminar(self, sesion):
+        with self.lock:
+            return self.sesiones.pop(sesion, None) is not None
+
+    def listar(self):
+        ahora = time.monotonic()
+        with self.lock:
+            return {sesion: {"muestras": s.buffer.total, "inactiva_seg": round(ahora - actividad, 1)}
+                    for sesion, (s, _, actividad) in self.sesiones.items()}
+
+SESIONES_VIVO = RegistroSesiones()
+
+class ServidorConcurrente(http.server.HTTPServer):
+    """HTTPServer que atiende cada conexión en un pool de hilos acotado
+
+    A diferencia de ThreadingHTTPServer, el número de hilos no crece con los
+    clientes: las conexiones que exceden SERVIDOR_HILOS esperan en la cola del pool.
+    """
+    request_queue_size = SERVIDOR_COLA_CONEXIONES
+    # En Windows SO_REUSEADDR permite abrir dos servidores en el mismo puerto
+    allow_reuse_address = sys.platform != "win32"
+
+    def __init__(self, direccion, handler, hilos=SERVIDOR_HILOS):
+        super().__init__(direccion, handler)
+        self.hilos = hilos
+        self.pool = ThreadPoolExecutor(max_workers=hilos, thread_name_prefix="fluvi-http")
+        self.conexiones = set()
+        self.lock_conexiones = threading.Lock()
+
+    def process_request(self, request, client_address):
+        with self.lock_conexiones:
+            self.conexiones.add(request)
+        self.pool.submit(self._atender, request, client_address)
+
+    def _atender(self, request, client_address):
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            with self.lock_conexiones:
+                self.conexiones.discard(request)
+            self.shutdown_request(request)
+
+    def cerrar(self):
+        """Apagado ordenado: deja de aceptar conexiones, termina las respuestas en
+        curso y libera las conexiones keep-alive inactivas"""
+        self.server_close()
+        with self.lock_conexiones:
+            abiertas = list(self.conexiones)
+        for conexion in abiertas:
+            try:
+                # Sin cerrar la escritura: la respuesta que se esté enviando se completa
+                conexion.shutdown(socket.SHUT_RD)
+            except OSError:
+                pass
+        self.pool.shutdown(wait=True)
+
+class EntradaCache:
+    """Archivo estático en memoria con sus variantes comprimidas"""
+
+    def __init__(self, ruta, tamano, mtime_ns, cuerpo, tipo):
+        self.ruta = ruta
+        self.tamano = tamano
+        self.mtime_ns = mtime_ns
+        self.tipo = tipo
+        self.modificado = formatdate(mtime_ns / 1e9, usegmt=True)
+        # ETag fuerte: depende del contenido; cada codificación tiene el suyo
+        self.etag = hashlib.sha1(cuerpo).hexdigest()[:20]
+        self.variantes = {"identity": cuerpo}
+        if tamano >= COMPRIMIR_MIN_BYTES and tipo.startswith(TIPOS_COMPRIMIBLES):
+            comprimidos = {"gzip": gzip.compress(cuerpo, compresslevel=9, mtime=0)}
+            if BROTLI_AVAILABLE:
+                comprimidos["br"] = brotli.compress(cuerpo, quality=11)
+            for codificacion, datos in comprimidos.items():
+                if len(datos) < 0.9 * tamano:
+                    self.variantes[codificacion] = datos
+
+    def bytes_en_memoria(self):
+        return sum(len(datos) for datos in self.variantes.values())
+
+    def vigente(self, tamano, mtime_ns):
+        return self.tamano == tamano and self.mtime_ns == mtime_ns
+
+class CacheEstatica:
+    """Caché LRU de archivos estáticos, invalidada por tamaño y fecha de modificación"""
+
+    def __init__(self, max_bytes=CACHE_MAX_BYTES, max_archivo=CACHE_MAX_ARCHIVO):
+        self.max_bytes = max_bytes
+        self.max_archivo = max_archivo
+        self.entradas = OrderedDict()
+        self.bytes_totales = 0
+        self.lock = threading.Lock()
+
+    def obtener(self, ruta):
+        """Devuelve la entrada vigente de `ruta`, leyéndola de disco si cambió
+
+        Returns:
+            EntradaCache, o None si el archivo no existe o excede max_archivo
+        """
+        try:
+            info = os.stat(ruta)
+        except OSError:
+            return None
+        if info.st_size > self.max_archivo:
+            return None
+
+        with self.lock:
+            entrada = self.entradas.get(ruta)
+            if entrada is not None and entrada.vigente(info.st_size, info.st_mtime_ns):
+                self.entradas.move_to_end(ruta)
+                return entrada
+
+        # Leer y comprimir fuera del lock para no bloquear a los demás hilos
+        try:
+            with open(ruta, "rb") as f:
+                cuerpo = f.read()
+        except OSError:
+            return None
+        tipo = mimetypes.guess_type(ruta)[0] or "application/octet-stream"
+        entrada = EntradaCache(ruta, len(cuerpo), info.st_mtime_ns, cuerpo, tipo)
+
+        with self.lock:
+            anterior = self.entradas.pop(ruta, None)
+            if anterior is not None:
+                self.bytes_totales -= anterior.bytes_en_memoria()
+            self.entradas[ruta] = entrada
+            self.bytes_totales += entrada.bytes_en_memoria()
+            while self.bytes_totales > self.max_bytes and len(self.entradas) > 1:
+                _, expulsada = self.entradas.popitem(last=False)
+                self.bytes_totales -= expulsada.bytes_en_memoria()
+        return entrada
+
+    def precargar(self, directorio):
+        """Carga y comprime al inicio los archivos del directorio, hasta llenar la caché
+
+        Returns:
+            Tupla (archivos cargados, bytes originales, bytes de la variante más pequeña)
+        """
+        archivos, original, comprimido = 0, 0, 0
+        for raiz, carpetas, nombres in os.walk(directorio):
+            carpetas[:] = [c for c in carpetas if not c.startswith((".", "__"))]
+            for nombre in nombres:
+                if self.bytes_totales >= self.max_bytes:
+                    return archivos, original, comprimido
+                entrada = self.obtener(os.path.join(raiz, nombre))
+                if entrada is not None:
+                    archivos += 1
+                    original += entrada.tamano
+                    comprimido += min(len(datos) for datos in entrada.variantes.values())
+        return archivos, original, comprimido
+
+CACHE_ESTATICA = CacheEstatica()
+
+def politica_cache(ruta_relativa):
+    """Cache-Control para un archivo según su ubicación dentro de DIRECTORY"""
+    ruta = ruta_relativa.replace(os.sep, "/")
+    if ruta.startswith(RUTAS_LIBRERIAS):
+        return CACHE_LIBRERIAS
+    if ruta.lower().endswith(EXTENSIONES_IMAGEN):
+        return CACHE_IMAGENES
+    return CACHE_NO_STORE
+
+def elegir_codificacion(accept_encoding, variantes):
+    """Elige la variante más compacta aceptada por el cliente (br > gzip > identity)"""
+    aceptadas = set()
+    for parte in (accept_encoding or "").split(","):
+        nombre, _, parametros = parte.strip().partition(";")
+        if parametros.replace(" ", "") not in ("q=0", "q=0.0", "q=0.00", "q=0.000"):
+            aceptadas.add(nombre.strip().lower())
+    for codificacion in ("br", "gzip"):
+        if codificacion in variantes and (codificacion in aceptadas or "*" in aceptadas):
+            return codificacion
+    return "identity"
+
+def puerto_en_uso(error):
+    """Indica si un OSError de bind corresponde a un puerto ocupado (Linux, macOS o Windows)"""
+    codigos = {errno.EADDRINUSE, getattr(errno, "WSAEADDRINUSE", 10048)}
+    return error.errno in codigos or getattr(error, "winerror", None) in codigos
+
 class MyHTTPRequestHandler(http.server.SimpleHTTPRequestHandler):
+    # HTTP/1.1 mantiene la conexión abierta entre archivos (todas las respuestas llevan Content-Length)
+    protocol_version = "HTTP/1.1"
+    # Tiempo máximo de inactividad antes de cerrar una conexión keep-alive
+    timeout = KEEP_ALIVE_TIMEOUT
+    # Sin Nagle: en keep-alive los encabezados y el cuerpo salen en escrituras separadas
+    disable_nagle_algorithm = True
+
+    # Cache-Control de la respuesta en curso (por defecto no-store)
+    cache_control = None
+
     def __init__(self, *args, **kwargs):
         super().__init__(*args, directory=DIRECTORY, **kwargs)
 
     def end_headers(self):
         # Agregar headers CORS para evitar problemas
         self.send_header('Access-Control-Allow-Origin', '*')
-        self.send_header('Access-Control-Allow-Methods', 'GET, POST, OPTIONS')
+        self.send_header('Access-Control-Allow-Methods', 'GET, POST, DELETE, OPTIONS')
         self.send_header('Access-Control-Allow-Headers', 'Content-Type')
-        self.send_header('Cache-Control', 'no-store, no-cache, must-revalidate')
+        self.send_header('Cache-Control', self.cache_control or CACHE_NO_STORE)
+        self.cache_control = None
         super().end_headers()
 
+    def do_HEAD(self):
+        if not self.servir_desde_cache(solo_encabezados=True):
+            super().do_HEAD()
+
+    def do_OPTIONS(self):
+        self.send_response(204)
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        if url.path == '/api/estado':
+            self.enviar_json(200, {**POOL_ANALISIS.estado(),
+                                   "vivo": {"sesiones": len(SESIONES_VIVO.sesiones),
+                                            "max_sesiones": SESIONES_VIVO.max_sesiones}})
+        elif url.path == '/api/vivo':
+            self.enviar_json(200, SESIONES_VIVO.listar())
+        elif url.path.startswith('/api/vivo/'):
+            self.resumen_vivo(url)
+        elif not self.servir_desde_cache():
+            super().do_GET()
+
+    def do_DELETE(self):
+        sesion = self.sesion_de_ruta(urlparse(self.path).path)
+        if sesion is None:
+            return
+        if SESIONES_VIVO.eliminar(sesion):
+            self.enviar_json(200, {"sesion": sesion, "eliminada": True})
+        else:
+            self.enviar_json(404, {"error": f"Sesión '{sesion}' no encontrada"})
+
+    def sesion_de_ruta(self, ruta):
+        """Extrae el id de /api/vivo/<sesion>; responde 404/400 y devuelve None si no es válido"""
+        if not ruta.startswith('/api/vivo/'):
+            self.descartar_cuerpo()
+            self.enviar_json(404, {"error": "Ruta no encontrada"})
+            return None
+        sesion = ruta[len('/api/vivo/'):]
+        if not PATRON_SESION.match(sesion):
+            self.descartar_cuerpo()
+            self.enviar_json(400, {"error": "Id de sesión inválido (letras, números, '-' o '_', hasta 64)"})
+            return None
+        return sesion
+
+    def resumen_vivo(self, url):
+        sesion = self.sesion_de_ruta(url.path)
+        if sesion is None:
+            return
+        horas = parse_qs(url.query).get('horas', ['48'])[0]
+        if not horas.isdigit() or int(horas) < 1:
+            self.enviar_json(400, {"error": "El parámetro horas debe ser un entero positivo"})
+            return
+        try:
+            resumen = SESIONES_VIVO.resumen(sesion, int(horas))
+        except ValueError as e:
+            # La sesión existe pero ningún lote trajo filas válidas
+            self.enviar_json(409, {"error": str(e)})
+            return
+        if resumen is None:
+            self.enviar_json(404, {"error": f"Sesión '{sesion}' no encontrada"})
+        else:
+            self.enviar_json(200, resumen)
+
+    def agregar_lote_vivo(self, ruta):
+        sesion = self.sesion_de_ruta(ruta)
+        if sesion is None:
+            return
+        tamano = self.longitud_cuerpo()
+        if not tamano or tamano > VIVO_MAX_BYTES_LOTE:
+            self.close_connection = True
+            self.enviar_json(413, {"error": f"El lote debe tener entre 1 y {VIVO_MAX_BYTES_LOTE} bytes"})
+            return
+        try:
+            lote = json.loads(self.rfile.read(tamano))
+            lote = lote.get('metrics', lote)
+            self.enviar_json(200, SESIONES_VIVO.agregar(sesion, lote))
+        except LimiteSesionesError:
+            self.enviar_json(503, {"error": f"Se alcanzó el máximo de {VIVO_MAX_SESIONES} sesiones activas"},
+                             {'Retry-After': '60'})
+        except ImportError as e:
+            self.enviar_json(503, {"error": f"Monitoreo en vivo no disponible: {e}"})
+        except Exception as e:
+            self.enviar_json(422, {"error": f"Lote inválido: {e}"})
+
+    def servir_desde_cache(self, solo_encabezados=False):
+        """Sirve un archivo desde CACHE_ESTATICA con ETag, 304 y compresión
+
+        Returns:
+            False si la solicitud debe resolverla SimpleHTTPRequestHandler
+            (directorios sin index, redirecciones, 404 o archivos muy grandes)
+        """
+        ruta = self.translate_path(self.path)
+        if os.path.isdir(ruta):
+            if not urlparse(self.path).path.endswith('/'):
+                return False
+            ruta = os.path.join(ruta, 'index.html')
+        entrada = CACHE_ESTATICA.obtener(ruta)
+        if entrada is None:
+            return False
+
+        codificacion = elegir_codificacion(self.headers.get('Accept-Encoding'), entrada.variantes)
+        sufijo = '' if codificacion == 'identity' else '-' + codificacion
+        etag = f'"{entrada.etag}{sufijo}"'
+        no_modificado = self.headers.get('If-None-Match', '')
+        self.cache_control = politica_cache(os.path.relpath(ruta, self.directory))
+
+        if etag in [e.strip().removeprefix('W/') for e in no_modificado.split(',')] or no_modificado.strip() == '*':
+            self.send_response(304)
+            self.send_header('ETag', etag)
+            self.send_header('Vary', 'Accept-Encoding')
+            self.end_headers()
+            return True
+
+        cuerpo = entrada.variantes[codificacion]
+        self.send_response(200)
+        self.send_header('Content-Type', entrada.tipo)
+        self.send_header('Content-Length', str(len(cuerpo)))
+        if codificacion != 'identity':
+            self.send_header('Content-Encoding', codificacion)
+        self.send_header('ETag', etag)
+        self.send_header('Last-Modified', entrada.modificado)
+        self.send_header('Vary', 'Accept-Encoding')
+        self.end_headers()
+        if not solo_encabezados:
+            self.wfile.write(cuerpo)
+        return True
+
+    def do_POST(self):
+        url = urlparse(self.path)
+        if url.path.startswith('/api/vivo/'):
+            self.agregar_lote_vivo(url.path)
+            return
+        if url.path != '/api/analizar':
+            self.descartar_cuerpo()
+            self.enviar_json(404, {"error": "Ruta no encontrada"})
+            return
+        if not POOL_ANALISIS.disponible():
+            self.descartar_cuerpo()
+            self.enviar_json(503, {"error": "Análisis en servidor no disponible"})
+            return
+
+        parametros = parse_qs(url.query)
+        tipo = parametros.get('tipo', ['csv'])[0]
+        formato = parametros.get('formato', ['datos'])[0]
+        instrumentar = parametros.get('instrumentar', ['0'])[0]
+        instrumentar = 'tiempo' if instrumentar == 'tiempo' else instrumentar in ('1', 'true')
+        perfilar = parametros.get('perfilar', [None])[0]
+        if tipo not in ('csv', 'json', 'npz') or formato not in ('datos', 'imagenes'):
+            self.descartar_cuerpo()
+            self.enviar_json(400, {"error": "Parámetros inválidos: tipo=csv|json|npz, formato=datos|imagenes"})
+            return
+
+        tamano = self.longitud_cuerpo()
+        if not tamano or tamano > ANALISIS_MAX_BYTES:
+            self.close_connection = True
+            self.enviar_json(413, {"error": f"El archivo debe tener entre 1 y {ANALISIS_MAX_BYTES} bytes"})
+            return
+        # Reservar el lugar antes de leer: con la cola llena el archivo no llega a memoria
+        try:
+            POOL_ANALISIS.reservar()
+        except (ColaLlenaError, AnalisisNoDisponibleError) as e:
+            self.descartar_cuerpo()
+            mensaje = ("Cola de análisis llena, intenta más tarde" if isinstance(e, ColaLlenaError)
+                       else "Análisis en servidor no disponible")
+            self.enviar_json(503, {"error": mensaje}, {'Retry-After': '5'})
+            return
+        try:
+            contenido = self.rfile.read(tamano)
+        except Exception:
+            POOL_ANALISIS._liberar()
+            raise
+
+        try:
+            resultado = POOL_ANALISIS.analizar(contenido, tipo, formato, instrumentar, perfilar)
+        except AnalisisNoDisponibleError:
+            self.enviar_json(503, {"error": "Los procesos de análisis se están reiniciando, intenta más tarde"},
+                             {'Retry-After': '5'})
+            return
+        except TimeoutError:
+            self.enviar_json(504, {"error": f"El análisis superó {POOL_ANALISIS.timeout} s"})
+            return
+        except Exception as e:
+            self.enviar_json(422, {"error": f"No se pudo analizar el archivo: {e}"})
+            return
+
+        self.enviar_cuerpo(200, resultado.encode('utf-8'))
+
+    def longitud_cuerpo(self):
+        """Content-Length de la solicitud; None si no es un entero válido o el cuerpo viene por chunks"""
+        if 'chunked' in self.headers.get('Transfer-Encoding', '').lower():
+            return None
+        valor = (self.headers.get('Content-Length') or '0').strip()
+        return int(valor) if valor.isdigit() else None
+
+    def descartar_cuerpo(self, limite=DESCARTE_MAX_BYTES):
+        """Consume el cuerpo de una solicitud que se responde sin leerlo
+
+        Con keep-alive, un cuerpo sin leer se interpretaría como la siguiente
+        solicitud de la conexión. Si la longitud no es válida o supera
+        `limite`, la conexión se cierra después de responder.
+        """
+        tamano = self.longitud_cuerpo()
+        if tamano is None or tamano > limite:
+            self.close_connection = True
+            return
+        while tamano > 0:
+            leido = self.rfile.read(min(tamano, 64 * 1024))
+            if not leido:
+                self.close_connection = True
+                return
+            tamano -= len(leido)
+
+    def enviar_json(self, codigo, datos, headers=None):
+        self.enviar_cuerpo(codigo, json.dumps(datos, ensure_ascii=False).encode('utf-8'), headers)
+
+    def enviar_cuerpo(self, codigo, cuerpo, headers=None):
+        """Envía una respuesta JSON con la profundidad de la cola de análisis"""
+        self.send_response(codigo)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(cuerpo)))
+        self.send_header('X-Cola-Analisis', str(POOL_ANALISIS.estado()['en_cola']))
+        if self.close_connection:
+            self.send_header('Connection', 'close')
+        for nombre, valor in (headers or {}).items():
+            self.send_header(nombre, valor)
+        self.end_headers()
+        self.wfile.write(cuerpo)
+
 def main():
+    parser = argparse.ArgumentParser(description="Servidor web de pruebas para FLUVI")
+    parser.add_argument("--puerto", type=int, default=PORT, help=f"Puerto (por defecto {PORT})")
+    parser.add_argument("--hilos", type=int, default=SERVIDOR_HILOS,
+                        help=f"Conexiones atendidas a la vez (por defecto {SERVIDOR_HILOS})")
+    parser.add_argument("--cache-analisis", metavar="DIRECTORIO",
+                        help="Guarda también en disco los resultados de /api/analizar, compartidos entre workers")
+    args = parser.parse_args()
+    if args.hilos < 1:
+        parser.error("--hilos debe ser al menos 1")
+    puerto = args.puerto
+
     local_ip = get_local_ip()
 
     print("=" * 60)
     print("SERVIDOR WEB DE PRUEBAS PARA FLUVI - SIMULADOR DE TRAFICO")
     print("=" * 60)
     print(f"\nSirviendo archivos desde: {os.path.abspath(DIRECTORY)}")
-    print(f"Puerto: {PORT}")
+    print(f"Puerto: {puerto}")
+    print(f"Conexiones simultáneas: {args.hilos} (HTTP/1.1 keep-alive)")
+
+    # Abrir el puerto antes de precargar archivos y arrancar los procesos de análisis
+    try:
+        # Escuchar en todas las interfaces de red (0.0.0.0)
+        httpd = ServidorConcurrente(("0.0.0.0", puerto), MyHTTPRequestHandler, hilos=args.hilos)
+    except OSError as e:
+        if puerto_en_uso(e):
+            print(f"\nERROR: El puerto {puerto} ya esta en uso.")
+            print(f"   Intenta cerrar otros servidores o usa otro puerto (--puerto).")
+        else:
+            print(f"\nERROR: {e}")
+        sys.exit(1)
+
+    archivos, original, comprimido = CACHE_ESTATICA.precargar(DIRECTORY)
+    print(f"Archivos en memoria: {archivos} ({original / 1e6:.1f} MB, {comprimido / 1e6:.1f} MB comprimidos"
+          f"{'' if BROTLI_AVAILABLE else '; instala brotli para variantes br'})")
+
+    if ANALISIS_WORKERS > 0:
+        print(f"\nPreparando {ANALISIS_WORKERS} procesos de análisis de métricas...")
+        POOL_ANALISIS.directorio_cache = args.cache_analisis
+        if POOL_ANALISIS.iniciar():
+            print(f"✅ API de análisis lista en /api/analizar (cola máxima: {ANALISIS_MAX_COLA})")
+            if args.cache_analisis:
+                print(f"   Resultados repetidos en caché: {os.path.abspath(args.cache_analisis)}")
+        else:
+            print(f"⚠️  API de análisis no disponible ({POOL_ANALISIS.error}); la página usará Pyodide")
+
     print(f"\nServidor iniciado correctamente!")
     print(f"\n📱 Abre tu navegador y ve a:")
     print(f"\n   💻 Desde esta PC:")
-    print(f"      http://localhost:{PORT}")
-    print(f"      http://127.0.0.1:{PORT}")
+    print(f"      http://localhost:{puerto}")
+    print(f"      http://127.0.0.1:{puerto}")
 
     if local_ip != "No disponible":
         print(f"\n   📱 Desde tu PC/celular/tablet (misma red WiFi):")
-        print(f"      http://{local_ip}:{PORT}")
+        print(f"      http://{local_ip}:{puerto}")
         print(f"\n   ⚠️  Si no funciona desde el celular:")
         print(f"      1. Verifica que estén en la misma red WiFi")
         print(f"      2. Permite el acceso en el Firewall de Windows")
-        print(f"      3. Comando: netsh advfirewall firewall add rule name=\"FLUVI Server\" dir=in action=allow protocol=TCP localport={PORT}")
+        print(f"      3. Comando: netsh advfirewall firewall add rule name=\"FLUVI Server\" dir=in action=allow protocol=TCP localport={puerto}")
 
     print(f"\n   Para detener el servidor, presiona Ctrl+C")
     print("=" * 60 + "\n")
 
     try:
-        # Escuchar en todas las interfaces de red (0.0.0.0)
-        with socketserver.TCPServer(("0.0.0.0", PORT), MyHTTPRequestHandler) as httpd:
-            httpd.serve_forever()
+        httpd.serve_forever()
     except KeyboardInterrupt:
-        print("\n\nServidor detenido por el usuario")
-        sys.exit(0)
-    except OSError as e:
-        if e.errno == 10048:  # Puerto en uso (Windows)
-            print(f"\nERROR: El puerto {PORT} ya esta en uso.")
-            print(f"   Intenta cerrar otros servidores o usa otro puerto.")
-        else:
-            print(f"\nERROR: {e}")
-        sys.exit(1)
+        print("\n\nDeteniendo servidor, esperando las respuestas en curso...")
+    finally:
+        httpd.cerrar()
+        POOL_ANALISIS.detener()
+    print("Servidor detenido por el usuario")
 
 if __name__ == "__main__":
     main()
@@ -515,6 +515,9 @@ function updateMetricsHistory(metrics) {
     completeMetricsHistory.speed.push(parseFloat(metrics.speed));
     completeMetricsHistory.entropy.push(parseFloat(metrics.entropy));
 
+    // Encolar la muestra para el monitoreo en vivo del servidor (si está disponible)
+    encolarMuestraVivo(timeStr, metrics);
+
     // Limitar el historial de gráficas al número máximo de puntos de datos
     if (metricsHistory.timestamps.length > metricsHistory.maxDataPoints) {
         metricsHistory.timestamps.shift();
@@ -1241,6 +1244,9 @@ function limpiarMetricas() {
             completeMetricsHistory.speed = [];
             completeMetricsHistory.entropy = [];
 
+            // La simulación limpia empieza una sesión nueva en el servidor
+            reiniciarSesionVivo();
+
             updateCharts();
 
             console.log('✅ Métricas limpiadas exitosamente (historial completo y gráficas)');
@@ -1255,6 +1261,119 @@ function limpiarMetricas() {
     );
 }
 
+// ==================== TRANSMISIÓN EN VIVO AL SERVIDOR ====================
+// Cuando la página la sirve servidor.py, las muestras se envían por lotes a
+// /api/vivo/<sesion> para monitorear corridas largas sin exportar el historial
+
+const transmisionVivo = {
+    disponible: false,
+    sesion: null,
+    pendientes: null,
+    enviando: false,
+    intervaloMs: 5000,     // un lote cada 5 segundos
+    maxPendientes: 20000   // si el servidor no responde se descartan las muestras más antiguas
+};
+
+function loteVivoVacio() {
+    return { timestamps: [], density: [], throughput: [], netGeneration: [], speed: [], entropy: [] };
+}
+
+function nuevaSesionVivo() {
+    return 'fluvi-' + Date.now().toString(36) + '-' + Math.random().toString(36).slice(2, 8);
+}
+
+/**
+ * Consulta /api/estado y, si el servidor ofrece monitoreo en vivo, empieza a enviar lotes
+ */
+async function iniciarTransmisionVivo() {
+    try {
+        const respuesta = await fetch('api/estado', { cache: 'no-store', signal: AbortSignal.timeout(2000) });
+        transmisionVivo.disponible = respuesta.ok && 'vivo' in (await respuesta.json());
+    } catch (error) {
+        transmisionVivo.disponible = false;
+    }
+    if (!transmisionVivo.disponible) {
+        return;
+    }
+
+    transmisionVivo.sesion = nuevaSesionVivo();
+    transmisionVivo.pendientes = loteVivoVacio();
+    setInterval(enviarLoteVivo, transmisionVivo.intervaloMs);
+    console.log(`📡 Monitoreo en vivo: api/vivo/${transmisionVivo.sesion}`);
+}
+
+/**
+ * Agrega una muestra al lote pendiente
+ */
+function encolarMuestraVivo(timeStr, metrics) {
+    if (!transmisionVivo.disponible) {
+        return;
+    }
+    const lote = transmisionVivo.pendientes;
+    lote.timestamps.push(timeStr);
+    lote.density.push(parseFloat(metrics.density));
+    lote.throughput.push(parseFloat(metrics.throughput));
+    lote.netGeneration.push(parseFloat(metrics.netGeneration));
+    lote.speed.push(parseFloat(metrics.speed));
+    lote.entropy.push(parseFloat(metrics.entropy));
+
+    const exceso = lote.timestamps.length - transmisionVivo.maxPendientes;
+    if (exceso > 0) {
+        Object.values(lote).forEach(serie => serie.splice(0, exceso));
+    }
+}
+
+/**
+ * Envía el lote pendiente; si el servidor no responde, las muestras vuelven a la cola
+ */
+async function enviarLoteVivo() {
+    if (transmisionVivo.enviando || transmisionVivo.pendientes.timestamps.length === 0) {
+        return;
+    }
+    const lote = transmisionVivo.pendientes;
+    const sesion = transmisionVivo.sesion;
+    transmisionVivo.pendientes = loteVivoVacio();
+    transmisionVivo.enviando = true;
+
+    try {
+        const respuesta = await fetch(`api/vivo/${sesion}`, {
+            method: 'POST',
+            headers: { 'Content-Type': 'application/json' },
+            body: JSON.stringify(lote)
+        });
+        // Los errores 4xx (lote inválido) no se reintentan
+        if (respuesta.status >= 500) {
+            throw new Error(`HTTP ${respuesta.status}`);
+        }
+    } catch (error) {
+        if (sesion === transmisionVivo.sesion) {
+            const pendientes = transmisionVivo.pendientes;
+            Object.keys(lote).forEach(clave => pendientes[clave].unshift(...lote[clave]));
+            const exceso = pendientes.timestamps.length - transmisionVivo.maxPendientes;
+            if (exceso > 0) {
+                Object.values(pendientes).forEach(serie => serie.splice(0, exceso));
+            }
+        }
+        console.warn('⚠️ No se pudo enviar el lote de métricas en vivo:', error.message);
+    } finally {
+        transmisionVivo.enviando = false;
+    }
+}
+
+/**
+ * Descarta la sesión actual del servidor y empieza una nueva
+ */
+function reiniciarSesionVivo() {
+    if (!transmisionVivo.disponible) {
+        return;
+    }
+    const anterior = transmisionVivo.sesion;
+    transmisionVivo.sesion = nuevaSesionVivo();
+    transmisionVivo.pendientes = loteVivoVacio();
+    fetch(`api/vivo/${anterior}`, { method: 'DELETE' }).catch(() => {});
+    console.log(`📡 Nueva sesión de monitoreo en vivo: api/vivo/${transmisionVivo.sesion}`);
+}
+
 // ==================== INICIALIZACIÓN AL CARGAR LA PÁGINA ====================
 
 window.addEventListener('load', () => {
@@ -1263,6 +1382,7 @@ window.addEventListener('load', () => {
     } else {
         console.error('Chart.js no se cargó correctamente');
     }
+    iniciarTransmisionVivo();
 });
 
 // ==================== EVENT LISTENERS PARA BOTONES DE EXPORTACIÓN ====================
@@ -1662,6 +1782,7 @@ window.updateCharts = updateCharts;
 window.descargarMetricasCSV = descargarMetricasCSV;
 window.descargarMetricasJSON = descargarMetricasJSON;
 window.limpiarMetricas = limpiarMetricas;
+window.obtenerSesionVivo = () => transmisionVivo.sesion;
 
 // Exponer funciones de gestión de calles en métricas
 window.inicializarCallesExcluidasPorDefecto = inicializarCallesExcluidasPorDefecto;
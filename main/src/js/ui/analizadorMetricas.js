@@ -6,8 +6,12 @@
 let pyodideInstance = null;
 let pyodideInitialized = false;
 let currentFileContent = null;
-let currentFileType = 'csv'; // 'csv' o 'json'
-let currentImagenes = null;
+let currentFileType = 'csv'; // 'csv', 'json' o 'npz'
+let currentImagenes = null; // Reporte PNG: solo se genera al descargar
+let currentDatosGraficas = null;
+let currentOrigenAnalisis = null; // 'servidor' o 'pyodide'
+let chartsAnalizador = [];
+let servidorAnalisisDisponible = null; // null: aún no se consulta /api/estado
 
 /**
  * Inicializa Pyodide (Python en el navegador)
@@ -29,24 +33,13 @@ async function inicializarPyodide() {
     });
 
     document.getElementById('progressBarPython').style.width = '30%';
-    document.getElementById('mensajeEstadoPython').textContent = 'Instalando paquetes Python básicos...';
+    document.getElementById('mensajeEstadoPython').textContent = 'Instalando NumPy...';
 
-    // Instalar paquetes esenciales
-    await pyodideInstance.loadPackage(['numpy', 'pandas', 'matplotlib', 'scipy', 'scikit-learn']);
+    // Solo numpy: el analizador importa pandas y matplotlib cuando una etapa los usa,
+    // y asegurarPaquetesPyodide descarga cada uno cuando se pide un formato que lo necesita
+    await pyodideInstance.loadPackage(['numpy']);
 
     document.getElementById('progressBarPython').style.width = '60%';
-    document.getElementById('mensajeEstadoPython').textContent = 'Configurando paquetes adicionales...';
-
-    // Intentar instalar seaborn, pero continuar si falla
-    try {
-      await pyodideInstance.loadPackage('seaborn');
-      console.log('✅ Seaborn instalado correctamente');
-    } catch (error) {
-      console.warn('⚠️ Seaborn no disponible, continuando sin él:', error);
-      // No es crítico, el script funcionará sin seaborn
-    }
-
-    document.getElementById('progressBarPython').style.width = '80%';
     document.getElementById('mensajeEstadoPython').textContent = 'Cargando script de análisis...';
 
     // Cargar el script del analizador
@@ -78,6 +71,47 @@ async function inicializarPyodide() {
   }
 }
 
+/**
+ * Carga en Pyodide los paquetes que necesita un formato de salida
+ * ('resumen', 'datos' o 'imagenes'; ver PAQUETES_PYODIDE en analizador.py).
+ * Los paquetes ya cargados no se vuelven a descargar.
+ */
+async function asegurarPaquetesPyodide(formato) {
+  const paquetes = pyodideInstance.runPython(`paquetes_pyodide('${formato}')`);
+  const [obligatorios, opcionales] = paquetes.toJs();
+  paquetes.destroy();
+
+  await pyodideInstance.loadPackage(obligatorios);
+  for (const paquete of opcionales) {
+    try {
+      await pyodideInstance.loadPackage(paquete);
+    } catch (error) {
+      // No es crítico: el analizador dibuja con matplotlib puro
+      console.warn(`⚠️ ${paquete} no disponible, continuando sin él:`, error);
+    }
+  }
+}
+
+/**
+ * Pasa el archivo actual a Python como contenido_actual y tipo_actual
+ * (texto tal cual, NPZ como bytes), sin escaparlo dentro del código
+ */
+async function publicarContenidoPyodide() {
+  const esNpz = currentFileType === 'npz';
+  pyodideInstance.globals.set('contenido_actual', esNpz ? new Uint8Array(currentFileContent) : currentFileContent);
+  pyodideInstance.globals.set('tipo_actual', currentFileType);
+  if (esNpz) {
+    await pyodideInstance.runPythonAsync('contenido_actual = contenido_actual.to_bytes()');
+  }
+}
+
+/**
+ * Resumen del archivo con el núcleo NumPy del analizador (no necesita pandas)
+ */
+async function resumenConPyodide() {
+  return JSON.parse(await pyodideInstance.runPythonAsync('analizar_resumen_web(contenido_actual, tipo_actual)'));
+}
+
 /**
  * Carga un archivo CSV o JSON para análisis
  */
@@ -91,13 +125,15 @@ async function cargarArchivoParaAnalisis(event) {
     currentFileType = 'csv';
   } else if (extension === 'json') {
     currentFileType = 'json';
+  } else if (extension === 'npz') {
+    currentFileType = 'npz';
   } else {
-    alert('⚠️ Formato de archivo no soportado. Use .csv o .json');
+    alert('⚠️ Formato de archivo no soportado. Use .csv, .json o .npz');
     return;
   }
 
   // Actualizar nombre del archivo
-  const iconoArchivo = currentFileType === 'json' ? '📋' : '📄';
+  const iconoArchivo = currentFileType === 'json' ? '📋' : (currentFileType === 'npz' ? '📦' : '📄');
   document.getElementById('nombreArchivoCSV').textContent = `${iconoArchivo} ${file.name}`;
 
   try {
@@ -109,7 +145,12 @@ async function cargarArchivoParaAnalisis(event) {
       // Ejecutar análisis automáticamente
       await ejecutarAnalisis();
     };
-    reader.readAsText(file);
+    // El formato NPZ es binario; CSV y JSON se leen como texto
+    if (currentFileType === 'npz') {
+      reader.readAsArrayBuffer(file);
+    } else {
+      reader.readAsText(file);
+    }
 
   } catch (error) {
     console.error('❌ Error al cargar archivo:', error);
@@ -139,67 +180,39 @@ async function ejecutarAnalisis() {
     document.getElementById('mensajeEstadoPython').textContent = `Procesando ${currentFileType.toUpperCase()}...`;
     document.getElementById('progressBarPython').style.width = '20%';
 
-    // Inicializar Pyodide si no está inicializado
-    if (!pyodideInitialized) {
-      await inicializarPyodide();
+    // Usar el servidor si ofrece la API de análisis; si no, Python en el navegador
+    let datos = null;
+    if (await consultarServidorAnalisis()) {
+      try {
+        document.getElementById('progressBarPython').style.width = '50%';
+        document.getElementById('mensajeEstadoPython').textContent = 'Analizando métricas en el servidor...';
+        datos = await analizarEnServidor('datos');
+        currentOrigenAnalisis = 'servidor';
+      } catch (error) {
+        console.warn('⚠️ Análisis en servidor no disponible, usando Pyodide:', error.message);
+      }
     }
-
-    document.getElementById('progressBarPython').style.width = '40%';
-    document.getElementById('mensajeEstadoPython').textContent = 'Analizando métricas...';
-
-    document.getElementById('progressBarPython').style.width = '60%';
-    document.getElementById('mensajeEstadoPython').textContent = 'Generando visualizaciones...';
-
-    // Escapar el contenido para Python
-    const contenidoEscapado = currentFileContent
-      .replace(/\\/g, '\\\\')
-      .replace(/"/g, '\\"')
-      .replace(/\n/g, '\\n')
-      .replace(/\r/g, '');
-
-    // Ejecutar el análisis según el tipo de archivo
-    let pythonCode;
-    if (currentFileType === 'json') {
-      pythonCode = `
-import json
-
-# Parsear el contenido JSON
-contenido_json = """${contenidoEscapado}"""
-analizador = AnalizadorTraficoFLUVI(contenido_json, tipo='json')
-resultados = analizador.ejecutar_analisis_completo()
-resultados['imagenes']
-      `;
-    } else {
-      pythonCode = `
-import io
-
-# Leer el CSV desde el contenido
-contenido_csv = """${contenidoEscapado}"""
-archivo = io.StringIO(contenido_csv)
-analizador = AnalizadorTraficoFLUVI(archivo, tipo='csv')
-resultados = analizador.ejecutar_analisis_completo()
-resultados['imagenes']
-      `;
+    if (!datos) {
+      datos = JSON.parse(await analizarConPyodide());
+      currentOrigenAnalisis = 'pyodide';
     }
 
-    const resultado = await pyodideInstance.runPythonAsync(pythonCode);
-
     document.getElementById('progressBarPython').style.width = '90%';
-    document.getElementById('mensajeEstadoPython').textContent = 'Renderizando imágenes...';
+    document.getElementById('mensajeEstadoPython').textContent = 'Dibujando gráficas...';
 
-    // Convertir el resultado de Python a JavaScript
-    currentImagenes = resultado.toJs();
+    currentDatosGraficas = datos;
+    currentImagenes = null;
 
-    // Mostrar las imágenes
-    mostrarImagenes(currentImagenes);
+    // Mostrar los resultados antes de dibujar para que Chart.js mida los contenedores
+    document.getElementById('resultadosAnalisis').style.display = 'block';
+    mostrarGraficas(currentDatosGraficas);
 
     document.getElementById('progressBarPython').style.width = '100%';
     document.getElementById('mensajeEstadoPython').textContent = '¡Análisis completado! ✓';
 
-    // Ocultar barra de progreso y mostrar resultados
+    // Ocultar barra de progreso
     setTimeout(() => {
       document.getElementById('estadoCargaPython').style.display = 'none';
-      document.getElementById('resultadosAnalisis').style.display = 'block';
     }, 1000);
 
     console.log(`✅ Análisis de ${currentFileType.toUpperCase()} completado exitosamente`);
@@ -212,54 +225,346 @@ resultados['imagenes']
   }
 }
 
+/**
+ * Consulta una sola vez si servidor.py ofrece la API de análisis
+ */
+async function consultarServidorAnalisis() {
+  if (servidorAnalisisDisponible !== null) {
+    return servidorAnalisisDisponible;
+  }
+  try {
+    const respuesta = await fetch('api/estado', { cache: 'no-store', signal: AbortSignal.timeout(2000) });
+    servidorAnalisisDisponible = respuesta.ok && (await respuesta.json()).disponible === true;
+  } catch (error) {
+    servidorAnalisisDisponible = false;
+  }
+  console.log(servidorAnalisisDisponible ? '✅ Análisis en servidor disponible' : 'ℹ️ Análisis con Pyodide');
+  return servidorAnalisisDisponible;
+}
+
+/**
+ * Envía el archivo cargado a /api/analizar y devuelve el resultado ya parseado
+ * (misma estructura que _resultado_web en Pyodide)
+ */
+async function analizarEnServidor(formato) {
+  const respuesta = await fetch(`api/analizar?tipo=${currentFileType}&formato=${formato}`, {
+    method: 'POST',
+    headers: { 'Content-Type': 'application/octet-stream' },
+    body: currentFileContent
+  });
+  const cola = respuesta.headers.get('X-Cola-Analisis');
+  if (cola && cola !== '0') {
+    console.log(`ℹ️ Solicitudes en cola de análisis: ${cola}`);
+  }
+  if (!respuesta.ok) {
+    let mensaje = `HTTP ${respuesta.status}`;
+    try { mensaje = (await respuesta.json()).error || mensaje; } catch (e) { /* cuerpo no JSON */ }
+    throw new Error(mensaje);
+  }
+  return respuesta.json();
+}
+
+/**
+ * Ejecuta el análisis en Pyodide. El analizador queda en memoria por si se pide el reporte PNG
+ */
+async function analizarConPyodide() {
+  // Inicializar Pyodide si no está inicializado
+  if (!pyodideInitialized) {
+    await inicializarPyodide();
+  }
+
+  document.getElementById('progressBarPython').style.width = '40%';
+  document.getElementById('mensajeEstadoPython').textContent = 'Analizando métricas...';
+
+  await publicarContenidoPyodide();
+
+  // Primer resultado solo con numpy, mientras se descarga pandas para las gráficas
+  const resumen = await resumenConPyodide();
+  const estadoFrecuente = Object.keys(resumen.estados.distribucion)[0];
+  document.getElementById('mensajeEstadoPython').textContent =
+    `📊 ${resumen.filas} mediciones en ${resumen.total_dias} día(s) · ` +
+    `capacidad ${resumen.capacidad.capacidad_maxima.toFixed(2)} veh/s ` +
+    `a ${resumen.capacidad.densidad_critica.toFixed(1)}% · ${estadoFrecuente} · cargando gráficas...`;
+  await asegurarPaquetesPyodide('datos');
+
+  document.getElementById('progressBarPython').style.width = '60%';
+
+  // Python devuelve un JSON compacto. analizar_archivo_web guarda el resultado en
+  // CACHE_RESULTADOS (volver a subir el mismo archivo no repite el análisis) y
+  // conserva el analizador hasta que se pide el reporte PNG
+  return pyodideInstance.runPythonAsync(
+    "analizar_archivo_web(contenido_actual, tipo_actual, formato='datos', conservar_analizador=True)");
+}
+
 // Mantener compatibilidad con código anterior
 async function ejecutarAnalisisCSV() {
   return ejecutarAnalisis();
 }
 
+// Paletas de color (equivalentes a las de matplotlib en el reporte PNG)
+const PALETA_PLASMA = ['#0d0887', '#7e03a8', '#cc4778', '#f89540', '#f0f921'];
+const PALETA_YLORRD = ['#ffffcc', '#fed976', '#feb24c', '#fd8d3c', '#fc4e2a', '#e31a1c', '#b10026'];
+
 /**
- * Muestra las imágenes generadas en el modal
+ * Interpola un color de una paleta para t entre 0 y 1
  */
-function mostrarImagenes(imagenes) {
-  // Convertir el Map de Python a objeto JavaScript
-  const imagenesObj = {};
-  for (let [key, value] of imagenes.entries()) {
-    imagenesObj[key] = value;
+function colorEnPaleta(paleta, t) {
+  const pos = Math.min(Math.max(t, 0), 1) * (paleta.length - 1);
+  const i = Math.min(Math.floor(pos), paleta.length - 2);
+  const f = pos - i;
+  const a = parseInt(paleta[i].slice(1), 16);
+  const b = parseInt(paleta[i + 1].slice(1), 16);
+  const canal = (desplazamiento) => Math.round(((a >> desplazamiento) & 255) * (1 - f) + ((b >> desplazamiento) & 255) * f);
+  return `rgb(${canal(16)}, ${canal(8)}, ${canal(0)})`;
+}
+
+/**
+ * Convierte dos listas x, y en puntos {x, y} para Chart.js
+ */
+function puntosXY(xs, ys) {
+  return xs.map((x, i) => ({ x, y: ys[i] }));
+}
+
+/**
+ * Opciones comunes de las gráficas del analizador
+ */
+function opcionesAnalizador(titulo, etiquetaX, etiquetaY, extra = {}) {
+  return {
+    responsive: true,
+    maintainAspectRatio: false,
+    animation: false,
+    parsing: false,
+    plugins: {
+      title: { display: true, text: titulo, font: { size: 13, weight: 'bold' } },
+      legend: { display: false },
+      ...(extra.plugins || {})
+    },
+    scales: {
+      x: { type: 'linear', title: { display: !!etiquetaX, text: etiquetaX } },
+      y: { title: { display: !!etiquetaY, text: etiquetaY } },
+      ...(extra.scales || {})
+    }
+  };
+}
+
+/**
+ * Crea una gráfica del analizador y la registra para poder destruirla después
+ */
+function crearGraficaAnalizador(idCanvas, configuracion) {
+  const chart = new Chart(document.getElementById(idCanvas), configuracion);
+  chartsAnalizador.push(chart);
+  return chart;
+}
+
+/**
+ * Dibuja con Chart.js los datos de las gráficas que devuelve Python
+ */
+function mostrarGraficas(datos) {
+  chartsAnalizador.forEach(chart => chart.destroy());
+  chartsAnalizador = [];
+
+  // IMAGEN 1: series temporales (decimadas a mínimo/máximo por cubeta)
+  const series = [
+    ['canvasAnalisisDensidad', 'densidad', 'Densidad vs Tiempo', 'Densidad (%)', '#1f77b4'],
+    ['canvasAnalisisFlujo', 'flujo', 'Flujo vs Tiempo', 'Flujo (veh/s)', 'orange'],
+    ['canvasAnalisisVelocidad', 'velocidad', 'Velocidad vs Tiempo', 'Velocidad (% movimiento)', 'green']
+  ];
+  for (const [idCanvas, clave, titulo, etiquetaY, color] of series) {
+    const serie = datos.temporal[clave];
+    crearGraficaAnalizador(idCanvas, {
+      type: 'scatter',
+      data: {
+        datasets: [{
+          data: puntosXY(serie.x, serie.y),
+          showLine: true,
+          borderColor: color,
+          borderWidth: 0.8,
+          pointRadius: 0
+        }]
+      },
+      options: opcionesAnalizador(titulo, 'Tiempo (minutos)', etiquetaY)
+    });
   }
 
-  // Asignar las imágenes a los elementos img
-  document.getElementById('imgAnalisisTemporal').src = imagenesObj.temporal || '';
-  document.getElementById('imgDiagramaFundamental').src = imagenesObj.fundamentales || '';
-  document.getElementById('imgDistribuciones').src = imagenesObj.distribuciones || '';
+  // Estados: estado dominante en cada celda tiempo × densidad
+  crearGraficaAnalizador('canvasAnalisisEstados', {
+    type: 'scatter',
+    data: {
+      datasets: datos.estados.map(estado => ({
+        label: estado.nombre,
+        data: puntosXY(estado.x, estado.y),
+        backgroundColor: estado.color,
+        pointRadius: 1.5
+      }))
+    },
+    options: opcionesAnalizador('Estados de Tráfico (Clasificación FLUVI)', 'Tiempo (minutos)', 'Densidad (%)', {
+      plugins: { legend: { display: true, labels: { boxWidth: 10, font: { size: 10 } } } }
+    })
+  });
+
+  // IMAGEN 2: Entropía vs Densidad por celdas, coloreada por flujo promedio
+  const fundamental = datos.fundamental;
+  const flujoMax = Math.max(...fundamental.flujo, 1e-9);
+  crearGraficaAnalizador('canvasAnalisisFundamental', {
+    type: 'scatter',
+    data: {
+      datasets: [{
+        data: puntosXY(fundamental.densidad, fundamental.entropia),
+        pointBackgroundColor: fundamental.flujo.map(f => colorEnPaleta(PALETA_PLASMA, f / flujoMax)),
+        pointBorderWidth: 0,
+        pointRadius: 3
+      }]
+    },
+    options: opcionesAnalizador('Entropía vs Densidad (color=Flujo)', 'Densidad (%)', 'Entropía (bits)', {
+      plugins: {
+        tooltip: {
+          callbacks: {
+            label: (ctx) => `Densidad ${ctx.parsed.x}% · Entropía ${ctx.parsed.y} · Flujo ${fundamental.flujo[ctx.dataIndex]} veh/s`
+          }
+        }
+      }
+    })
+  });
+
+  mostrarMapaCalor(datos.mapa_calor);
+
+  // IMAGEN 3: histogramas y boxplots
+  const histogramas = [
+    ['canvasAnalisisHistDensidad', 'densidad', 'Distribución de Densidad', 'Densidad (%)', 'steelblue'],
+    ['canvasAnalisisHistFlujo', 'flujo', 'Distribución de Flujo', 'Flujo (veh/s)', 'orange']
+  ];
+  for (const [idCanvas, clave, titulo, etiquetaX, color] of histogramas) {
+    const histograma = datos.histogramas[clave];
+    const centros = histograma.conteos.map((_, i) => (histograma.bordes[i] + histograma.bordes[i + 1]) / 2);
+    crearGraficaAnalizador(idCanvas, {
+      type: 'bar',
+      data: {
+        datasets: [{
+          data: puntosXY(centros, histograma.conteos),
+          backgroundColor: color,
+          borderColor: 'black',
+          borderWidth: 0.5,
+          barPercentage: 1,
+          categoryPercentage: 1
+        }]
+      },
+      options: opcionesAnalizador(titulo, etiquetaX, 'Frecuencia')
+    });
+  }
+
+  const boxplots = [
+    ['canvasAnalisisBoxDensidad', 'densidad', 'Densidad', 'Densidad (%)', 'steelblue'],
+    ['canvasAnalisisBoxFlujo', 'flujo', 'Flujo', 'Flujo (veh/s)', 'orange']
+  ];
+  for (const [idCanvas, clave, etiqueta, etiquetaY, color] of boxplots) {
+    crearGraficaBoxplot(idCanvas, datos.boxplots[clave], etiqueta, etiquetaY, color);
+  }
 
-  console.log('📊 Imágenes cargadas en el modal');
+  console.log(`📊 Gráficas dibujadas (${datos.filas} filas analizadas)`);
 }
 
 /**
- * Descarga la imagen actualmente visible
+ * Boxplot con barras flotantes: bigotes, caja Q1-Q3, mediana y atípicos
  */
-function descargarImagenActual() {
-  // Determinar qué tab está activo
-  const tabTemporal = document.getElementById('tab-temporal');
-  const tabFundamental = document.getElementById('tab-fundamental');
-  const tabDistribuciones = document.getElementById('tab-distribuciones');
-
-  let imgSrc = '';
-  let nombreArchivo = '';
-
-  if (tabTemporal.classList.contains('active')) {
-    imgSrc = document.getElementById('imgAnalisisTemporal').src;
-    nombreArchivo = 'analisis_temporal.png';
-  } else if (tabFundamental.classList.contains('active')) {
-    imgSrc = document.getElementById('imgDiagramaFundamental').src;
-    nombreArchivo = 'diagrama_fundamental.png';
-  } else if (tabDistribuciones.classList.contains('active')) {
-    imgSrc = document.getElementById('imgDistribuciones').src;
-    nombreArchivo = 'distribuciones_correlaciones.png';
+function crearGraficaBoxplot(idCanvas, caja, etiqueta, etiquetaY, color) {
+  crearGraficaAnalizador(idCanvas, {
+    type: 'bar',
+    data: {
+      labels: [etiqueta],
+      datasets: [
+        { data: [[caja.bigote_inf, caja.bigote_sup]], backgroundColor: 'black', barPercentage: 0.02, grouped: false },
+        { data: [[caja.q1, caja.q3]], backgroundColor: color, borderColor: 'black', borderWidth: 1, barPercentage: 0.4, grouped: false },
+        { type: 'scatter', data: [{ x: etiqueta, y: caja.mediana }], pointStyle: 'line', pointRadius: 40, borderColor: '#ff7f0e', borderWidth: 2 },
+        { type: 'scatter', data: caja.atipicos.map(y => ({ x: etiqueta, y })), pointRadius: 3, borderColor: 'black', backgroundColor: 'transparent' }
+      ]
+    },
+    options: {
+      responsive: true,
+      maintainAspectRatio: false,
+      animation: false,
+      plugins: {
+        title: { display: true, text: `Boxplot ${etiqueta}`, font: { size: 13, weight: 'bold' } },
+        legend: { display: false },
+        tooltip: {
+          callbacks: {
+            label: () => `Q1 ${caja.q1} · Mediana ${caja.mediana} · Q3 ${caja.q3}`
+          }
+        }
+      },
+      scales: {
+        x: { type: 'category' },
+        y: { title: { display: true, text: etiquetaY } }
+      }
+    }
+  });
+}
+
+/**
+ * Mapa de calor Día × Hora como tabla coloreada (escala fija 0-100%)
+ */
+function mostrarMapaCalor(mapa) {
+  let html = '<table class="table table-sm table-bordered mb-0" style="font-size: 0.7rem;"><thead><tr><th></th>';
+  for (const hora of mapa.horas) {
+    html += `<th class="text-center p-0">${hora}</th>`;
   }
+  html += '</tr></thead><tbody>';
+  mapa.dias.forEach((dia, i) => {
+    html += `<tr><th class="p-1">${dia}</th>`;
+    for (const valor of mapa.densidad[i]) {
+      const fondo = valor === null ? 'transparent' : colorEnPaleta(PALETA_YLORRD, valor / 100);
+      const titulo = valor === null ? 'Sin datos' : `${dia}: ${valor}%`;
+      html += `<td class="p-0" style="background: ${fondo}; min-width: 18px; height: 22px;" title="${titulo}"></td>`;
+    }
+    html += '</tr>';
+  });
+  html += '</tbody></table>';
+  document.getElementById('tablaMapaCalorAnalisis').innerHTML = html;
+}
 
-  if (imgSrc) {
-    descargarImagenBase64(imgSrc, nombreArchivo);
+/**
+ * Genera el reporte estático (PNG) solo cuando se pide una descarga
+ */
+async function obtenerImagenesReporte() {
+  if (currentImagenes) {
+    return currentImagenes;
+  }
+  if (!currentDatosGraficas) {
+    alert('Por favor, analiza un archivo primero.');
+    return null;
+  }
+
+  document.getElementById('estadoCargaPython').style.display = 'block';
+  document.getElementById('mensajeEstadoPython').textContent = 'Generando reporte en PNG...';
+  document.getElementById('progressBarPython').style.width = '50%';
+
+  if (currentOrigenAnalisis === 'servidor') {
+    currentImagenes = await analizarEnServidor('imagenes');
+  } else {
+    await asegurarPaquetesPyodide('imagenes');
+    const resultado = await pyodideInstance.runPythonAsync(
+      "analizar_archivo_web(contenido_actual, tipo_actual, formato='imagenes')");
+    currentImagenes = Object.fromEntries(resultado.toJs());
+  }
+
+  document.getElementById('progressBarPython').style.width = '100%';
+  document.getElementById('estadoCargaPython').style.display = 'none';
+  return currentImagenes;
+}
+
+/**
+ * Descarga la imagen actualmente visible
+ */
+async function descargarImagenActual() {
+  const imagenes = await obtenerImagenesReporte();
+  if (!imagenes) return;
+
+  // Determinar qué tab está activo
+  if (document.getElementById('tab-temporal').classList.contains('active')) {
+    descargarImagenBase64(imagenes.temporal, 'analisis_temporal.png');
+  } else if (document.getElementById('tab-fundamental').classList.contains('active')) {
+    descargarImagenBase64(imagenes.fundamentales, 'diagrama_fundamental.png');
+  } else if (document.getElementById('tab-distribuciones').classList.contains('active')) {
+    descargarImagenBase64(imagenes.distribuciones, 'distribuciones_correlaciones.png');
   }
 }
 
@@ -267,23 +572,15 @@ function descargarImagenActual() {
  * Descarga todas las imágenes en un ZIP
  */
 async function descargarTodasImagenes() {
-  if (!currentImagenes) {
-    alert('No hay imágenes para descargar');
-    return;
-  }
+  const imagenes = await obtenerImagenesReporte();
+  if (!imagenes) return;
 
   // Usar JSZip para crear el archivo ZIP
   // Nota: Necesitarás incluir la librería JSZip en tu HTML
   if (typeof JSZip === 'undefined') {
     // Si no está disponible JSZip, descargar una por una
     alert('Descargando imágenes individualmente...');
-    descargarImagenBase64(document.getElementById('imgAnalisisTemporal').src, 'analisis_temporal.png');
-    setTimeout(() => {
-      descargarImagenBase64(document.getElementById('imgDiagramaFundamental').src, 'diagrama_fundamental.png');
-    }, 500);
-    setTimeout(() => {
-      descargarImagenBase64(document.getElementById('imgDistribuciones').src, 'distribuciones_correlaciones.png');
-    }, 1000);
+    descargarTodasImagenesSeparadas();
     return;
   }
 
@@ -291,20 +588,14 @@ async function descargarTodasImagenes() {
     const zip = new JSZip();
     const folder = zip.folder("analisis_metricas");
 
-    // Convertir las imágenes base64 a blobs
-    const imagenesObj = {};
-    for (let [key, value] of currentImagenes.entries()) {
-      imagenesObj[key] = value;
-    }
-
     // Agregar cada imagen al ZIP
-    const imgTemporal = await fetch(imagenesObj.temporal).then(r => r.blob());
+    const imgTemporal = await fetch(imagenes.temporal).then(r => r.blob());
     folder.file('analisis_temporal.png', imgTemporal);
 
-    const imgFundamental = await fetch(imagenesObj.fundamentales).then(r => r.blob());
+    const imgFundamental = await fetch(imagenes.fundamentales).then(r => r.blob());
     folder.file('diagrama_fundamental.png', imgFundamental);
 
-    const imgDistribuciones = await fetch(imagenesObj.distribuciones).then(r => r.blob());
+    const imgDistribuciones = await fetch(imagenes.distribuciones).then(r => r.blob());
     folder.file('distribuciones_correlaciones.png', imgDistribuciones);
 
     // Generar y descargar el ZIP
@@ -326,12 +617,12 @@ async function descargarTodasImagenes() {
  * Descarga todas las imágenes por separado (fallback)
  */
 function descargarTodasImagenesSeparadas() {
-  descargarImagenBase64(document.getElementById('imgAnalisisTemporal').src, 'analisis_temporal.png');
+  descargarImagenBase64(currentImagenes.temporal, 'analisis_temporal.png');
   setTimeout(() => {
-    descargarImagenBase64(document.getElementById('imgDiagramaFundamental').src, 'diagrama_fundamental.png');
+    descargarImagenBase64(currentImagenes.fundamentales, 'diagrama_fundamental.png');
   }, 500);
   setTimeout(() => {
-    descargarImagenBase64(document.getElementById('imgDistribuciones').src, 'distribuciones_correlaciones.png');
+    descargarImagenBase64(currentImagenes.distribuciones, 'distribuciones_correlaciones.png');
   }, 1000);
 }
 
@@ -0,0 +1,258 @@
+"""
+Análisis por lotes de exportaciones de métricas FLUVI
+
+Analiza muchas exportaciones (CSV, JSON o NPZ) en procesos en paralelo y
+reúne estadísticas, capacidad, eventos críticos y distribución de estados
+en una sola tabla comparativa, con una figura opcional que superpone el
+perfil por hora del día de cada corrida.
+
+Uso (CPython, no Pyodide):
+    python analisis_lote.py "exportaciones/*.csv" --salida comparacion.csv --figura comparacion.png
+    python analisis_lote.py exportaciones/ --workers 8
+"""
+
+import argparse
+import glob
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+import pandas as pd
+import matplotlib
+matplotlib.use('Agg')
+import matplotlib.pyplot as plt
+
+from analizador import (AnalizadorTraficoFLUVI, ESTADOS_TRAFICO, NOMBRES_ESTADOS,
+                        DPI_IMAGENES, MULTIPROCESO_AVAILABLE)
+
+EXTENSIONES_EXPORTACION = {'.csv': 'csv', '.json': 'json', '.npz': 'npz'}
+METRICAS_LOTE = ['Densidad', 'Flujo', 'Generacion', 'Velocidad', 'Entropia']
+METRICAS_PERFIL = ['Densidad', 'Flujo', 'Velocidad']
+HORAS_PERFIL = 25                 # Hora_Dia redondeada va de 0 a 24
+TAM_BLOQUE_LOTE = 200000          # filas por bloque al leer CSV (acota la memoria de cada proceso)
+MAX_TAREAS_POR_PROCESO = 25       # cada proceso se reinicia tras este número de archivos
+MAX_LEYENDA_FIGURA = 12           # con más corridas la figura comparativa omite la leyenda
+
+
+def buscar_exportaciones(patrones):
+    """Expande directorios y patrones glob a la lista de exportaciones
+
+    Args:
+        patrones: Ruta, directorio o patrón glob (o lista de ellos); en un
+            directorio se buscan .csv, .json y .npz de forma recursiva
+
+    Returns:
+        Lista ordenada y sin duplicados de rutas
+
+    Raises:
+        ValueError: Si no se encontró ninguna exportación
+    """
+    if isinstance(patrones, str):
+        patrones = [patrones]
+
+    rutas = set()
+    for patron in patrones:
+        if os.path.isdir(patron):
+            for extension in EXTENSIONES_EXPORTACION:
+                rutas.update(glob.glob(os.path.join(patron, '**', '*' + extension), recursive=True))
+        else:
+            rutas.update(glob.glob(patron, recursive=True))
+
+    rutas = sorted(r for r in rutas
+                   if os.path.isfile(r) and os.path.splitext(r)[1].lower() in EXTENSIONES_EXPORTACION)
+    if not rutas:
+        raise ValueError(f"No se encontraron exportaciones CSV/JSON/NPZ en: {', '.join(patrones)}")
+    return rutas
+
+
+def resumir_exportacion(ruta, umbrales=None):
+    """Analiza una exportación y devuelve solo su resumen
+
+    Corre en un proceso del pool: el DataFrame se descarta al terminar y al
+    proceso principal solo regresan números.
+
+    Returns:
+        Tupla (fila de la tabla comparativa, perfil por hora del día). Si el
+        archivo no se pudo analizar, la fila trae 'error' y el perfil es None.
+    """
+    fila = {'archivo': ruta}
+    try:
+        tipo = EXTENSIONES_EXPORTACION[os.path.splitext(ruta)[1].lower()]
+        if tipo == 'json':
+            # El cargador JSON interpreta un str como contenido, no como ruta
+            with open(ruta, 'rb') as f:
+                analizador = AnalizadorTraficoFLUVI(f, tipo='json', umbrales=umbrales, compacto=True)
+        else:
+            analizador = AnalizadorTraficoFLUVI(ruta, tipo=tipo, umbrales=umbrales, compacto=True,
+                                                tam_bloque=TAM_BLOQUE_LOTE if tipo == 'csv' else None)
+        resultados = analizador.calcular('estadisticas', 'capacidad', 'eventos_criticos', 'clustering')
+    except Exception as e:
+        fila['error'] = f"{type(e).__name__}: {e}"
+        return fila, None
+
+    df = analizador.df
+    fila['filas'] = len(df)
+    fila['dias'] = int(df['Dia_Numero'].max())
+
+    estadisticas = resultados['estadisticas']
+    for metrica in METRICAS_LOTE:
+        for estadistico in ['mean', 'std', 'min', '50%', 'max']:
+            fila[f"{metrica}_{estadistico.replace('50%', 'mediana')}"] = float(estadisticas.loc[estadistico, metrica])
+
+    capacidad = resultados['capacidad']
+    for clave in ['capacidad_maxima', 'densidad_critica', 'velocidad_critica',
+                  'dia_numero_critico', 'tiempo_critico']:
+        fila[clave] = capacidad[clave]
+
+    for tipo_evento, conteo in resultados['eventos_criticos'].items():
+        fila[f"eventos_{tipo_evento}"] = int(conteo)
+
+    porcentajes = resultados['clustering']['porcentajes']
+    for nombre in NOMBRES_ESTADOS:
+        fila[f"pct_{nombre}"] = float(porcentajes.get(nombre, 0.0))
+
+    # Perfil medio por hora del día (todas las corridas tienen el mismo tamaño)
+    horas = np.round(df['Tiempo_seg'].to_numpy() / 3600).astype(np.int64)
+    conteo = np.bincount(horas, minlength=HORAS_PERFIL)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        perfil = {metrica: np.bincount(horas, weights=df[metrica].to_numpy(dtype=np.float64),
+                                       minlength=HORAS_PERFIL) / conteo
+                  for metrica in METRICAS_PERFIL}
+    return fila, perfil
+
+
+def analizar_lote(patrones, workers=None, umbrales=None, max_tareas_por_proceso=MAX_TAREAS_POR_PROCESO):
+    """Analiza todas las exportaciones que coinciden con `patrones`
+
+    Args:
+        patrones: Ruta, directorio o patrón glob (o lista de ellos)
+        workers: Procesos en paralelo (por defecto os.cpu_count(); 1 = secuencial)
+        umbrales: Diccionario que sobrescribe parte de UMBRALES_ESTADO
+        max_tareas_por_proceso: Archivos que analiza cada proceso antes de
+            reiniciarse, para que la memoria no se acumule en lotes grandes
+            (requiere Python 3.11; en versiones anteriores se ignora)
+
+    Returns:
+        Tupla (tabla comparativa, perfiles): DataFrame con una fila por
+        archivo (los que fallaron traen la columna 'error') y diccionario
+        archivo -> perfil por hora del día de METRICAS_PERFIL
+    """
+    rutas = buscar_exportaciones(patrones)
+    workers = min(workers or os.cpu_count() or 1, len(rutas))
+    print(f"📂 {len(rutas)} exportaciones, {workers} proceso(s)")
+
+    filas, perfiles = [], {}
+    inicio = time.time()
+
+    def registrar(fila, perfil):
+        filas.append(fila)
+        if perfil is not None:
+            perfiles[fila['archivo']] = perfil
+        estado = f"❌ {fila['error']}" if 'error' in fila else '✅'
+        print(f"   [{len(filas)}/{len(rutas)}] {estado} {fila['archivo']}")
+
+    if workers > 1 and MULTIPROCESO_AVAILABLE:
+        opciones = {}
+        if sys.version_info >= (3, 11):
+            opciones['max_tasks_per_child'] = max_tareas_por_proceso
+        with ProcessPoolExecutor(max_workers=workers, **opciones) as ejecutor:
+            futuros = [ejecutor.submit(resumir_exportacion, ruta, umbrales) for ruta in rutas]
+            for futuro in as_completed(futuros):
+                registrar(*futuro.result())
+    else:
+        for ruta in rutas:
+            registrar(*resumir_exportacion(ruta, umbrales))
+
+    print(f"⏱️  Lote completado en {time.time() - inicio:.1f} s")
+    tabla = pd.DataFrame(filas).set_index('archivo').loc[rutas]
+    return tabla, {ruta: perfiles[ruta] for ruta in rutas if ruta in perfiles}
+
+
+def figura_comparativa(tabla, perfiles, destino=None, dpi=DPI_IMAGENES):
+    """Superpone los perfiles por hora de cada corrida y compara sus estados
+
+    Args:
+        tabla: Tabla comparativa de analizar_lote
+        perfiles: Perfiles de analizar_lote
+        destino: Ruta del PNG (None devuelve la figura sin guardarla)
+
+    Returns:
+        Figura de matplotlib
+    """
+    fig, ejes = plt.subplots(2, 2, figsize=(16, 10))
+    horas = np.arange(HORAS_PERFIL)
+    etiquetas = {archivo: os.path.splitext(os.path.basename(archivo))[0] for archivo in perfiles}
+    colores = plt.cm.viridis(np.linspace(0, 1, max(len(perfiles), 1)))
+
+    for ax, metrica in zip(ejes.flat, METRICAS_PERFIL):
+        for color, (archivo, perfil) in zip(colores, perfiles.items()):
+            ax.plot(horas, perfil[metrica], color=color, linewidth=1.2, alpha=0.8, label=etiquetas[archivo])
+        ax.set_title(f'{metrica} media por hora del día', fontweight='bold')
+        ax.set_xlabel('Hora del día')
+        ax.set_ylabel(metrica)
+        ax.set_xticks(range(0, HORAS_PERFIL, 2))
+        ax.grid(True, alpha=0.3)
+    if 0 < len(perfiles) <= MAX_LEYENDA_FIGURA:
+        ejes.flat[0].legend(fontsize=8)
+
+    # Distribución de estados por corrida (barras apiladas)
+    ax = ejes.flat[3]
+    validas = tabla.loc[list(perfiles)]
+    posiciones = np.arange(len(validas))
+    acumulado = np.zeros(len(validas))
+    for nombre, _, color in ESTADOS_TRAFICO:
+        valores = validas[f"pct_{nombre}"].to_numpy()
+        ax.barh(posiciones, valores, left=acumulado, color=color, label=nombre)
+        acumulado += valores
+    ax.set_yticks(posiciones)
+    ax.set_yticklabels([etiquetas[a] for a in validas.index] if len(validas) <= 40 else [])
+    ax.invert_yaxis()
+    ax.set_xlim(0, 100)
+    ax.set_xlabel('% del tiempo')
+    ax.set_title('Distribución de estados por corrida', fontweight='bold')
+    ax.legend(fontsize=8, loc='lower right')
+
+    plt.tight_layout()
+    if destino:
+        fig.savefig(destino, dpi=dpi, bbox_inches='tight')
+        plt.close(fig)
+    return fig
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Análisis comparativo de exportaciones de métricas FLUVI")
+    parser.add_argument("patrones", nargs="+", help="Directorios, archivos o patrones glob (entre comillas)")
+    parser.add_argument("--salida", default="comparacion_lote.csv",
+                        help="Tabla comparativa (.csv o .json; por defecto comparacion_lote.csv)")
+    parser.add_argument("--figura", help="PNG con los perfiles superpuestos y los estados por corrida")
+    parser.add_argument("--workers", type=int, help="Procesos en paralelo (por defecto, todos los núcleos)")
+    args = parser.parse_args()
+
+    try:
+        tabla, perfiles = analizar_lote(args.patrones, workers=args.workers)
+    except ValueError as e:
+        print(f"\nERROR: {e}")
+        sys.exit(1)
+
+    if args.salida.lower().endswith('.json'):
+        tabla.to_json(args.salida, orient='index', indent=2, force_ascii=False)
+    else:
+        tabla.to_csv(args.salida, encoding='utf-8')
+    print(f"📊 Tabla comparativa: {args.salida}")
+
+    if args.figura:
+        if perfiles:
+            figura_comparativa(tabla, perfiles, args.figura)
+            print(f"🖼️  Figura comparativa: {args.figura}")
+        else:
+            print("⚠️  Ninguna exportación se pudo analizar; no se generó la figura")
+
+    fallidas = int(tabla['error'].notna().sum()) if 'error' in tabla.columns else 0
+    if fallidas:
+        print(f"⚠️  {fallidas} exportación(es) con error")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,53 +1,914 @@
-import pandas as pd
 import numpy as np
-import matplotlib.pyplot as plt
-from scipy import stats, signal
 from datetime import datetime, timedelta
 import warnings
 warnings.filterwarnings('ignore')
+import importlib
 import io
+import os
 import base64
 import json
+import hashlib
+import shutil
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+from functools import wraps
+
+
+class _ModuloDiferido:
+    """Módulo que se importa la primera vez que se usa uno de sus atributos
+
+    pd.DataFrame, plt.subplots o signal.find_peaks se escriben como siempre,
+    pero la importación (y en Pyodide la descarga del paquete) solo ocurre
+    cuando una etapa lo necesita: el núcleo NumPy no toca pandas ni
+    matplotlib.
+    """
 
-# Importar seaborn solo si está disponible
-try:
-    import seaborn as sns
-    SEABORN_AVAILABLE = True
-except ImportError:
-    SEABORN_AVAILABLE = False
-    print("⚠️ Seaborn no disponible, usando matplotlib por defecto")
+    def __init__(self, nombre):
+        self._nombre = nombre
+
+    def __getattr__(self, atributo):
+        return getattr(importlib.import_module(self._nombre), atributo)
+
+
+pd = _ModuloDiferido('pandas')
+plt = _ModuloDiferido('matplotlib.pyplot')
+signal = _ModuloDiferido('scipy.signal')
+
+# seaborn es opcional: se busca al dibujar el primer mapa de calor (None = aún no se busca)
+_SEABORN = None
 
-# Importar sklearn solo si está disponible
+
+def _seaborn():
+    """Devuelve seaborn si está instalado, o None para dibujar con matplotlib puro"""
+    global _SEABORN
+    if _SEABORN is None:
+        try:
+            import seaborn
+            _SEABORN = seaborn
+        except ImportError:
+            _SEABORN = False
+            print("⚠️ Seaborn no disponible, usando matplotlib por defecto")
+    return _SEABORN or None
+
+
+# Procesos paralelos para las figuras (no existen en Pyodide)
 try:
-    from sklearn.cluster import KMeans
-    SKLEARN_AVAILABLE = True
+    from multiprocessing import shared_memory
+    from concurrent.futures import ProcessPoolExecutor
+    MULTIPROCESO_AVAILABLE = sys.platform != 'emscripten'
 except ImportError:
-    SKLEARN_AVAILABLE = False
-    print("⚠️ Scikit-learn no disponible")
+    MULTIPROCESO_AVAILABLE = False
+
+# Días de la semana en el orden en que avanza la simulación
+DIAS_SEMANA = ['Lunes', 'Martes', 'Miércoles', 'Jueves', 'Viernes', 'Sábado', 'Domingo']
+
+# Fecha/hora de referencia para el primer registro de la exportación
+FECHA_INICIO = datetime(2024, 1, 1, 7, 0, 10)
+
+# Estados de tráfico FLUVI: el índice es el código guardado en el DataFrame
+# (de menor a mayor congestión); nombre, emoji y color solo se consultan al graficar
+ESTADOS_TRAFICO = [
+    ('🔵 Sub-utilizado', '🔵', '#0d6efd'),
+    ('🟡 Moderado', '🟡', '#ffc107'),
+    ('🟢 Óptimo', '🟢', '#198754'),
+    ('🟠 Congestionado', '🟠', '#fd7e14'),
+    ('🔴 Colapso', '🔴', '#dc3545'),
+]
+ESTADO_SUBUTILIZADO, ESTADO_MODERADO, ESTADO_OPTIMO, ESTADO_CONGESTIONADO, ESTADO_COLAPSO = range(5)
+NOMBRES_ESTADOS = [nombre for nombre, _, _ in ESTADOS_TRAFICO]
+
+# Umbrales de clasificación por defecto (se pueden ajustar por corredor)
+UMBRALES_ESTADO = {
+    'colapso_densidad': 80,         # densidad > x
+    'colapso_velocidad': 15,        # velocidad < x
+    'optimo_flujo': 2.5,            # flujo >= x
+    'optimo_densidad_min': 25,      # x <= densidad
+    'optimo_densidad_max': 60,      # densidad <= x
+    'optimo_velocidad': 50,         # velocidad >= x
+    'congestion_densidad': 65,      # densidad > x
+    'congestion_velocidad': 35,     # velocidad < x
+    'subutilizado_densidad': 25,    # densidad < x
+    'subutilizado_flujo': 1.5,      # flujo < x
+}
+
+# Tipos del modo compacto de memoria (las columnas ausentes se dejan igual)
+TIPOS_COMPACTOS = {
+    'Densidad': np.float32,
+    'Flujo': np.float32,
+    'Generacion': np.float32,
+    'Velocidad': np.float32,
+    'Entropia': np.float32,
+    'Dia_Numero': np.int16,
+}
+
+# Columnas redundantes que el modo compacto elimina: se derivan de
+# Tiempo_seg / Tiempo_Acumulado_seg / Dia_Numero cuando se necesitan
+COLUMNAS_DERIVABLES = ['Marca_Tiempo', 'Cambio_Dia', 'Dia_Semana_Num',
+                       'Fecha_Hora', 'Hora_Dia', 'Minuto']
+
+# Grafo de etapas del análisis: salida -> (método que la produce, salidas de las que depende)
+ETAPAS_ANALISIS = {
+    'estadisticas': ('analisis_estadistico_basico', []),
+    'piramide': ('construir_piramide', []),
+    'analisis_dias': ('analisis_por_dia', ['piramide']),
+    'correlaciones': ('analisis_correlaciones', []),
+    'capacidad': ('analisis_capacidad', []),
+    'eventos_criticos': ('detectar_eventos_criticos', []),
+    'clustering': ('clustering_estados', []),
+    'temporal': ('analisis_temporal', ['piramide']),
+    'imagen_temporal': ('figura_temporal', ['clustering']),
+    'imagen_fundamentales': ('figura_fundamentales', ['piramide']),
+    'imagen_distribuciones': ('figura_distribuciones', []),
+    'imagenes': ('generar_visualizaciones', ['clustering', 'piramide']),
+    'datos_graficas': ('generar_datos_graficas', ['clustering', 'piramide']),
+}
+
+# Figuras del reporte estático; generar_visualizaciones las produce (en paralelo si se pide)
+FIGURAS = ['imagen_temporal', 'imagen_fundamentales', 'imagen_distribuciones']
+
+# Columnas que necesitan las figuras; las demás se derivan con _columna()
+COLUMNAS_FIGURAS = ['Densidad', 'Flujo', 'Generacion', 'Velocidad', 'Entropia',
+                    'Tiempo_seg', 'Dia_Numero', 'Tiempo_Acumulado_seg']
+
+# Columnas de métricas en el orden del CSV exportado
+COLUMNAS_CSV = ['Marca_Tiempo', 'Densidad', 'Flujo',
+                'Generacion', 'Velocidad', 'Entropia']
+
+# Formato binario NPZ: arreglo del archivo -> columna del DataFrame
+COLUMNAS_NPZ = {
+    'density': 'Densidad',
+    'throughput': 'Flujo',
+    'netGeneration': 'Generacion',
+    'speed': 'Velocidad',
+    'entropy': 'Entropia',
+}
+
+
+# Versión de la lógica de carga; cambiarla invalida las entradas de CacheMetricas
+VERSION_CARGADOR = 1
+
+# Resolución de las imágenes generadas
+DPI_IMAGENES = 300
+
+# Caché de resultados web (CacheResultados). Cambiar VERSION_RESULTADOS cuando
+# cambie el contenido de 'datos' o 'imagenes' invalida las entradas guardadas
+VERSION_RESULTADOS = 1
+CACHE_RESULTADOS_BYTES = 64 * 1024 * 1024           # memoria del proceso (Pyodide o worker)
+CACHE_RESULTADOS_DISCO_BYTES = 1024 * 1024 * 1024   # nivel opcional en disco
+
+# Modo decimado de las gráficas: con más filas que esto (modo automático) las
+# series se reducen a mínimo/máximo por cubeta y las dispersiones se agrupan
+# en celdas, para que el tiempo de dibujo y el tamaño del PNG no crezcan con
+# la exportación
+MAX_FILAS_SIN_DECIMAR = 50000
+CUBETAS_DECIMACION = 2000       # cubetas por serie temporal (2 puntos cada una)
+CELDAS_HEXBIN = 80              # celdas del hexbin Densidad × Entropía
+CELDAS_ESTADOS = (600, 150)     # celdas tiempo × densidad del panel de estados
+MAX_ATIPICOS_BOXPLOT = 1000     # atípicos dibujados por boxplot
+
+# Datos numéricos para dibujar las gráficas en el navegador (Chart.js)
+CUBETAS_GRAFICAS_WEB = 1000     # cubetas por serie temporal
+CELDAS_ESTADOS_WEB = (300, 60)  # celdas tiempo × densidad del panel de estados
+CELDAS_FUNDAMENTAL_WEB = 60     # celdas por eje de Densidad × Entropía
+BINS_HISTOGRAMA = 50
+MAX_ATIPICOS_WEB = 200
+
+# Monitoreo en vivo (SesionEnVivo)
+CAPACIDAD_BUFFER_VIVO = 86400   # muestras recientes por sesión (un día a una muestra por segundo)
+MAX_EVENTOS_RECIENTES = 100     # eventos críticos que se conservan para el resumen
+HORAS_RESUMEN_VIVO = 48         # horas más recientes en el agregado por hora
+
+# Rangos de densidad del análisis de capacidad (el último llega hasta el máximo + 0.1)
+LIMITES_RANGO_DENSIDAD = [0, 0.5, 1.0, 1.5, 2.0, 3.0]
+ETIQUETAS_RANGO_DENSIDAD = ['Muy Baja', 'Baja', 'Media', 'Alta', 'Muy Alta', 'Crítica']
+
+# Núcleo NumPy (cargar_columnas, resumen_nucleo): métricas y estadísticas de describe()
+METRICAS_NUCLEO = ['Densidad', 'Flujo', 'Generacion', 'Velocidad', 'Entropia']
+ESTADISTICAS_DESCRIBE = ['count', 'mean', 'std', 'min', '25%', '50%', '75%', 'max']
+
+# Paquetes de Pyodide que necesita cada formato de salida (numpy se carga siempre primero)
+PAQUETES_PYODIDE = {
+    'resumen': ['numpy'],
+    'datos': ['numpy', 'pandas'],
+    'imagenes': ['numpy', 'pandas', 'matplotlib'],
+}
+PAQUETES_OPCIONALES_PYODIDE = {'imagenes': ['seaborn']}
+
+# Instrumentación por etapa (instrumentar=True)
+ETAPAS_CARGA = ['cargar_datos', '_calcular_dias_semana']
+LINEAS_PERFIL = 30              # funciones del reporte de cProfile (ordenadas por tiempo acumulado)
+
+
+def _formatear_marca_tiempo(segundos):
+    """Convierte segundos del día al formato HH:MM:SS de las exportaciones"""
+    segundos = int(round(segundos))
+    return f"{segundos // 3600:02d}:{segundos % 3600 // 60:02d}:{segundos % 60:02d}"
+
+
+def _detectar_cambios_dia(tiempo_seg, tiempo_previo=None):
+    """Marca con 1 las filas donde Tiempo_seg retrocede (inicio de un nuevo día)
+
+    Args:
+        tiempo_seg: Arreglo float64 con los segundos del día de cada fila
+        tiempo_previo: Tiempo_seg de la fila anterior al arreglo, o None
+    """
+    cambio_dia = np.zeros(len(tiempo_seg), dtype=np.int64)
+    if len(tiempo_seg) > 1:
+        cambio_dia[1:] = np.diff(tiempo_seg) < 0
+    if tiempo_previo is not None and len(tiempo_seg) > 0:
+        cambio_dia[0] = tiempo_seg[0] < tiempo_previo
+    return cambio_dia
+
+
+class _LectorSinEstadisticas:
+    """Envuelve un archivo de texto y lo corta al llegar al pie ESTADISTICAS
+
+    Permite que pandas lea el CSV por bloques sin ver las filas de
+    resumen finales, que de otro modo convertirían las columnas numéricas
+    en columnas de texto.
+    """
+
+    def __init__(self, archivo):
+        self.archivo = archivo
+        self.terminado = False
+        self.pendiente = ''
+
+    def read(self, n=-1):
+        lineas = [self.pendiente]
+        leidos = len(self.pendiente)
+        while not self.terminado and (n < 0 or leidos < n):
+            linea = self.archivo.readline()
+            if isinstance(linea, bytes):
+                linea = linea.decode('utf-8')
+            if not linea or linea.lstrip().upper().startswith('ESTADISTICAS'):
+                self.terminado = True
+                break
+            lineas.append(linea)
+            leidos += len(linea)
+
+        texto = ''.join(lineas)
+        if n < 0:
+            n = len(texto)
+        self.pendiente = texto[n:]
+        return texto[:n]
+
+    def __iter__(self):
+        return iter(lambda: self.read(1 << 16), '')
+
+
+class CacheMetricas:
+    """Caché en disco de exportaciones ya procesadas
+
+    Cada entrada es un directorio con un archivo .npy por columna limpia o
+    derivada; se abre con memoria mapeada (mmap_mode='r'), por lo que
+    varios procesos que analizan la misma exportación comparten las mismas
+    páginas. La clave es un hash del contenido de entrada, del tipo y de
+    VERSION_CARGADOR; las entradas menos usadas se eliminan cuando el
+    tamaño total supera max_bytes.
+    """
+
+    def __init__(self, directorio, max_bytes=512 * 1024 * 1024):
+        self.directorio = directorio
+        self.max_bytes = max_bytes
+        os.makedirs(directorio, exist_ok=True)
+
+    def clave(self, contenido, tipo):
+        """Calcula la clave de una exportación a partir de sus bytes"""
+        h = hashlib.sha256(f"v{VERSION_CARGADOR}:{tipo}:".encode('utf-8'))
+        h.update(contenido)
+        return h.hexdigest()
+
+    def obtener(self, clave):
+        """Devuelve el DataFrame guardado (columnas mapeadas) o None"""
+        ruta = os.path.join(self.directorio, clave)
+        ruta_meta = os.path.join(ruta, 'meta.json')
+        try:
+            with open(ruta_meta, 'r', encoding='utf-8') as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            return None
+
+        if meta.get('version') != VERSION_CARGADOR:
+            shutil.rmtree(ruta, ignore_errors=True)
+            return None
+
+        datos = {}
+        for columna in meta['columnas']:
+            if columna == 'Dia_Semana':
+                datos[columna] = pd.Categorical.from_codes(datos['Dia_Semana_Num'],
+                                                           categories=DIAS_SEMANA, ordered=True)
+            else:
+                # np.asarray conserva el mapeo pero entrega un ndarray normal a pandas
+                datos[columna] = np.asarray(np.load(os.path.join(ruta, f"{columna}.npy"), mmap_mode='r'))
+
+        # Marcar la entrada como usada recientemente
+        os.utime(ruta_meta)
+        return pd.DataFrame(datos, copy=False)
+
+    def guardar(self, clave, df):
+        """Guarda las columnas numéricas del DataFrame bajo la clave dada"""
+        destino = os.path.join(self.directorio, clave)
+        if os.path.isdir(destino):
+            return
+
+        temporal = tempfile.mkdtemp(dir=self.directorio, prefix='.tmp-')
+        columnas = [columna for columna in df.columns if columna != 'Marca_Tiempo']
+        for columna in columnas:
+            if columna != 'Dia_Semana':
+                np.save(os.path.join(temporal, f"{columna}.npy"), df[columna].to_numpy())
+        with open(os.path.join(temporal, 'meta.json'), 'w', encoding='utf-8') as f:
+            json.dump({'version': VERSION_CARGADOR, 'columnas': columnas, 'filas': len(df)}, f)
+
+        try:
+            os.rename(temporal, destino)
+        except OSError:
+            # Otro proceso guardó la misma entrada primero
+            shutil.rmtree(temporal, ignore_errors=True)
+
+        self._desalojar()
+
+    def _desalojar(self):
+        """Elimina las entradas menos usadas hasta respetar max_bytes"""
+        entradas = []
+        total = 0
+        for nombre in os.listdir(self.directorio):
+            ruta = os.path.join(self.directorio, nombre)
+            ruta_meta = os.path.join(ruta, 'meta.json')
+            if nombre.startswith('.') or not os.path.isfile(ruta_meta):
+                continue
+            tam = sum(entrada.stat().st_size for entrada in os.scandir(ruta))
+            entradas.append((os.path.getmtime(ruta_meta), tam, ruta))
+            total += tam
+
+        for _, tam, ruta in sorted(entradas):
+            if total <= self.max_bytes:
+                break
+            shutil.rmtree(ruta, ignore_errors=True)
+            total -= tam
+
+
+def huella_contenido(contenido, tipo):
+    """Hash SHA-256 de una exportación (texto o bytes) y su tipo"""
+    h = hashlib.sha256(f"{tipo}:".encode('utf-8'))
+    h.update(contenido.encode('utf-8') if isinstance(contenido, str) else bytes(contenido))
+    return h.hexdigest()
+
+
+def _tamano_resultado(valor):
+    """Bytes aproximados de un resultado web (string JSON o diccionario de imágenes)"""
+    if isinstance(valor, str):
+        return len(valor.encode('utf-8'))
+    return sum(len(str(k)) + len(str(v)) for k, v in valor.items())
+
+
+class CacheResultados:
+    """Caché LRU de resultados web, direccionada por contenido
+
+    Guarda lo que devuelve analizar_archivo_web: el JSON de 'datos' o el
+    diccionario de imágenes PNG en base64. La clave combina la huella de la
+    exportación con los parámetros que cambian el resultado (formato,
+    umbrales, dpi) y VERSION_RESULTADOS, así que volver a subir el mismo
+    archivo o cambiar de vista no repite la carga, la clasificación ni el
+    dibujo. Las entradas viven en memoria hasta max_bytes; con `directorio`
+    se guardan además como JSON en disco (compartido entre procesos), con
+    el desalojo por fecha de uso de CacheMetricas.
+    """
+
+    def __init__(self, max_bytes=CACHE_RESULTADOS_BYTES, directorio=None,
+                 max_bytes_disco=CACHE_RESULTADOS_DISCO_BYTES):
+        self.max_bytes = max_bytes
+        self.directorio = directorio
+        self.max_bytes_disco = max_bytes_disco
+        self.entradas = OrderedDict()
+        self.bytes_totales = 0
+        self.aciertos = 0
+        self.fallos = 0
+        self.lock = threading.Lock()
+        if directorio is not None:
+            os.makedirs(directorio, exist_ok=True)
+
+    @staticmethod
+    def clave(huella, **parametros):
+        """Clave de un resultado a partir de la huella del contenido y sus parámetros"""
+        parametros = json.dumps(parametros, sort_keys=True, default=str)
+        return hashlib.sha256(f"v{VERSION_RESULTADOS}:{huella}:{parametros}".encode('utf-8')).hexdigest()
+
+    def obtener(self, clave):
+        """Devuelve el resultado guardado (memoria primero, luego disco) o None"""
+        with self.lock:
+            entrada = self.entradas.get(clave)
+            if entrada is not None:
+                self.entradas.move_to_end(clave)
+                self.aciertos += 1
+                return self._copia(entrada[0])
+
+        valor = self._leer_disco(clave)
+        with self.lock:
+            if valor is None:
+                self.fallos += 1
+                return None
+            self.aciertos += 1
+        self._guardar_memoria(clave, valor)
+        return self._copia(valor)
+
+    def guardar(self, clave, valor):
+        """Guarda un resultado en memoria y, si hay directorio, en disco"""
+        self._guardar_memoria(clave, valor)
+        if self.directorio is not None:
+            self._escribir_disco(clave, valor)
+
+    def limpiar(self):
+        """Vacía el nivel en memoria (el de disco se conserva)"""
+        with self.lock:
+            self.entradas.clear()
+            self.bytes_totales = 0
+
+    @staticmethod
+    def _copia(valor):
+        # Los diccionarios de imágenes se entregan como copia para que el llamador no altere la entrada
+        return valor if isinstance(valor, str) else dict(valor)
+
+    def _guardar_memoria(self, clave, valor):
+        tamano = _tamano_resultado(valor)
+        if tamano > self.max_bytes:
+            return
+        with self.lock:
+            anterior = self.entradas.pop(clave, None)
+            if anterior is not None:
+                self.bytes_totales -= anterior[1]
+            self.entradas[clave] = (self._copia(valor), tamano)
+            self.bytes_totales += tamano
+            while self.bytes_totales > self.max_bytes:
+                _, (_, expulsada) = self.entradas.popitem(last=False)
+                self.bytes_totales -= expulsada
+
+    def _ruta(self, clave):
+        return os.path.join(self.directorio, f"{clave}.json")
+
+    def _leer_disco(self, clave):
+        if self.directorio is None:
+            return None
+        ruta = self._ruta(clave)
+        try:
+            with open(ruta, 'r', encoding='utf-8') as f:
+                valor = json.load(f)['valor']
+            # Marcar la entrada como usada recientemente
+            os.utime(ruta)
+        except (OSError, ValueError, KeyError):
+            return None
+        return valor
+
+    def _escribir_disco(self, clave, valor):
+        ruta = self._ruta(clave)
+        if os.path.isfile(ruta):
+            return
+        descriptor, temporal = tempfile.mkstemp(dir=self.directorio, prefix='.tmp-', suffix='.json')
+        try:
+            with os.fdopen(descriptor, 'w', encoding='utf-8') as f:
+                json.dump({'version': VERSION_RESULTADOS, 'valor': valor}, f, ensure_ascii=False)
+            os.replace(temporal, ruta)
+        except OSError:
+            if os.path.exists(temporal):
+                os.remove(temporal)
+            return
+        self._desalojar_disco()
+
+    def _desalojar_disco(self):
+        """Elimina los resultados en disco menos usados hasta respetar max_bytes_disco"""
+        entradas = []
+        total = 0
+        for entrada in os.scandir(self.directorio):
+            if entrada.name.startswith('.') or not entrada.name.endswith('.json'):
+                continue
+            try:
+                info = entrada.stat()
+            except OSError:
+                continue
+            entradas.append((info.st_mtime, info.st_size, entrada.path))
+            total += info.st_size
+
+        for _, tam, ruta in sorted(entradas):
+            if total <= self.max_bytes_disco:
+                break
+            try:
+                os.remove(ruta)
+            except OSError:
+                pass
+            total -= tam
+
+
+# Caché de resultados del proceso (Pyodide o worker del servidor); ver analizar_archivo_web
+CACHE_RESULTADOS = CacheResultados()
+
+
+class InstrumentacionEtapas:
+    """Tiempo de pared, tiempo de CPU, memoria pico y filas de cada etapa
+
+    Las mediciones se anidan: una figura guarda dentro su fig_to_base64 y la
+    carga guarda _calcular_dias_semana (una sola entrada aunque se llame por
+    bloque, con el número de llamadas). La memoria pico es la asignada por
+    encima de la que había al entrar a la etapa, según tracemalloc; con
+    tracemalloc activo las etapas con mucho trabajo en Python (la carga del
+    CSV) tardan varias veces más, así que memoria=False da tiempos fieles.
+    'resumen' es el diccionario que se publica en resultados['instrumentacion']
+    y se actualiza al terminar cada etapa.
+    """
+
+    def __init__(self, perfilar=None, memoria=True):
+        """
+        Args:
+            perfilar: Etapa que se ejecuta bajo cProfile (None = ninguna)
+            memoria: Si es False no se usa tracemalloc y pico_mb queda en None
+        """
+        self.perfilar = perfilar
+        self.memoria = memoria
+        self.resumen = {'etapas': [], 'perfil': None}
+        self._registros = {}
+        self._pila = []
+        self._tracemalloc_propio = False
+
+    @contextmanager
+    def medir(self, etapa, tipo='etapa', filas=None):
+        """Mide el bloque como la etapa `etapa`
+
+        Args:
+            etapa: Nombre de la etapa
+            tipo: 'carga', 'etapa', 'figura' o 'subetapa'
+            filas: Filas procesadas (entero o función que las devuelve al terminar)
+        """
+        padre = self._pila[-1]['etapa'] if self._pila else None
+        self._entrada(etapa, tipo, padre)
+        marco = {'etapa': etapa, 'base': 0, 'pico': 0}
+        if self.memoria:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+                self._tracemalloc_propio = True
+            actual, pico = tracemalloc.get_traced_memory()
+            # Los niveles de arriba conservan su pico antes de reiniciarlo para este bloque
+            for abierta in self._pila:
+                abierta['pico'] = max(abierta['pico'], pico)
+            tracemalloc.reset_peak()
+            marco['base'] = marco['pico'] = actual
+        self._pila.append(marco)
+
+        perfil = None
+        if etapa == self.perfilar and self.resumen['perfil'] is None:
+            import cProfile
+            perfil = cProfile.Profile()
+            perfil.enable()
+
+        inicio, inicio_cpu = time.perf_counter(), time.process_time()
+        try:
+            yield
+        finally:
+            segundos = time.perf_counter() - inicio
+            cpu = time.process_time() - inicio_cpu
+            if perfil is not None:
+                perfil.disable()
+                self.resumen['perfil'] = {'etapa': etapa, 'reporte': self._reporte_perfil(perfil)}
+
+            self._pila.pop()
+            if self.memoria:
+                marco['pico'] = max(marco['pico'], tracemalloc.get_traced_memory()[1])
+                for abierta in self._pila:
+                    abierta['pico'] = max(abierta['pico'], marco['pico'])
+                if not self._pila and self._tracemalloc_propio:
+                    tracemalloc.stop()
+                    self._tracemalloc_propio = False
+
+            filas = filas() if callable(filas) else filas
+            self._registrar(etapa, padre, segundos, cpu, marco['pico'] - marco['base'], filas)
+
+    def _entrada(self, etapa, tipo, padre):
+        """Crea el registro de la etapa bajo `padre` (en orden de ejecución) si no existe"""
+        clave = (padre, etapa)
+        if clave not in self._registros:
+            registro = {'etapa': etapa, 'tipo': tipo, 'padre': padre, 'llamadas': 0, 'segundos': 0.0,
+                        'cpu_segundos': 0.0, 'pico_mb': None, 'filas': None}
+            self._registros[clave] = (registro, {'segundos': 0.0, 'cpu': 0.0, 'pico': 0})
+            self.resumen['etapas'].append(registro)
+
+    def _registrar(self, etapa, padre, segundos, cpu, pico, filas):
+        """Agrega una medición (acumula si la etapa ya se midió bajo el mismo padre)"""
+        registro, crudo = self._registros[(padre, etapa)]
+        crudo['segundos'] += segundos
+        crudo['cpu'] += cpu
+        crudo['pico'] = max(crudo['pico'], pico)
+        # Una subetapa llamada por bloque suma las filas de todos los bloques
+        if filas is not None and registro['tipo'] == 'subetapa' and registro['filas']:
+            filas += registro['filas']
+        registro.update({
+            'llamadas': registro['llamadas'] + 1,
+            'segundos': round(crudo['segundos'], 6),
+            'cpu_segundos': round(crudo['cpu'], 6),
+            'pico_mb': round(crudo['pico'] / 1e6, 3) if self.memoria else None,
+            'filas': filas if filas is not None else registro['filas'],
+        })
+
+    @staticmethod
+    def _reporte_perfil(perfil):
+        """Texto de pstats con las funciones de mayor tiempo acumulado"""
+        import pstats
+        salida = io.StringIO()
+        pstats.Stats(perfil, stream=salida).sort_stats('cumulative').print_stats(LINEAS_PERFIL)
+        return salida.getvalue()
+
+
+def _instrumentada(tipo, cuenta_filas=False):
+    """Decorador: mide el método con la instrumentación del analizador, si está activa
+
+    Args:
+        tipo: Tipo de la medición (ver InstrumentacionEtapas.medir)
+        cuenta_filas: Si es True las filas son las del DataFrame que recibe el método
+    """
+    def decorador(metodo):
+        @wraps(metodo)
+        def envoltura(self, *args, **kwargs):
+            if self._instrumentacion is None:
+                return metodo(self, *args, **kwargs)
+            filas = len(args[0]) if cuenta_filas else None
+            with self._instrumentacion.medir(metodo.__name__, tipo, filas):
+                return metodo(self, *args, **kwargs)
+        return envoltura
+    return decorador
+
+
+def _decimar_min_max(x, y, n_cubetas=CUBETAS_DECIMACION):
+    """Reduce una serie al mínimo y máximo de cada cubeta de filas consecutivas
+
+    Conserva picos y valles (la forma que se ve al dibujar la línea) con a lo
+    más 2 * n_cubetas puntos.
+
+    Args:
+        x: Arreglo de abscisas (ordenado)
+        y: Arreglo de valores
+        n_cubetas: Número de cubetas
+
+    Returns:
+        Tupla (x, y) decimada
+    """
+    x, y = np.asarray(x), np.asarray(y)
+    n = len(y)
+    if n <= 2 * n_cubetas:
+        return x, y
+
+    tam = -(-n // n_cubetas)
+    n_cubetas = -(-n // tam)
+    # La última cubeta incompleta se rellena repitiendo la última fila
+    indices = np.minimum(np.arange(n_cubetas * tam), n - 1).reshape(n_cubetas, tam)
+    bloques = y[indices]
+    filas = np.arange(n_cubetas)
+    seleccion = np.unique(np.concatenate([indices[filas, bloques.argmin(axis=1)],
+                                          indices[filas, bloques.argmax(axis=1)]]))
+    return x[seleccion], y[seleccion]
+
+
+def _limitar_atipicos(atipicos, maximo):
+    """Reduce los atípicos de un boxplot a `maximo` valores repartidos por
+    cuantiles (se conservan los extremos)"""
+    atipicos = np.sort(atipicos)
+    if len(atipicos) > maximo:
+        atipicos = np.quantile(atipicos, np.linspace(0, 1, maximo))
+    return atipicos
+
+
+def _estadisticas_caja(valores, bigote=1.5):
+    """Cuartiles, bigotes y atípicos de un boxplot, como matplotlib.cbook.boxplot_stats
+
+    Solo NumPy, para que los datos de las gráficas web no necesiten matplotlib.
+
+    Returns:
+        Diccionario con q1, med, q3, whislo, whishi y fliers
+    """
+    valores = np.asarray(valores, dtype=np.float64)
+    q1, mediana, q3 = np.percentile(valores, [25, 50, 75])
+    rango = q3 - q1
+    dentro_inf = valores[valores >= q1 - bigote * rango]
+    dentro_sup = valores[valores <= q3 + bigote * rango]
+    bigote_inf = dentro_inf.min() if len(dentro_inf) and dentro_inf.min() <= q1 else q1
+    bigote_sup = dentro_sup.max() if len(dentro_sup) and dentro_sup.max() >= q3 else q3
+    return {
+        'q1': q1, 'med': mediana, 'q3': q3, 'whislo': bigote_inf, 'whishi': bigote_sup,
+        'fliers': np.concatenate([valores[valores < bigote_inf], valores[valores > bigote_sup]]),
+    }
+
+
+def _celdas_estados(x, y, codigos, celdas):
+    """Estado más frecuente en cada celda de una grilla x × y
+
+    Returns:
+        Tupla (estado dominante, filas por celda, bordes x, bordes y); las
+        matrices tienen forma (celdas x, celdas y)
+    """
+    n_estados = len(ESTADOS_TRAFICO)
+    conteos, (bordes_x, bordes_y, _) = np.histogramdd(
+        (x, y, codigos), bins=(*celdas, n_estados),
+        range=[(x.min(), x.max()), (y.min(), y.max()), (-0.5, n_estados - 0.5)])
+    return conteos.argmax(axis=2), conteos.sum(axis=2), bordes_x, bordes_y
+
+
+def _lista_json(valores, decimales=4):
+    """Lista redondeada apta para JSON (NaN -> None)"""
+    valores = np.round(np.asarray(valores, dtype=np.float64), decimales).tolist()
+    return [None if v != v else v for v in valores]
+
+
+def _combinar_umbrales(umbrales):
+    """UMBRALES_ESTADO con los valores de `umbrales` sobrescritos
+
+    Raises:
+        ValueError: Si `umbrales` trae claves que no existen en UMBRALES_ESTADO
+    """
+    desconocidos = set(umbrales or {}) - set(UMBRALES_ESTADO)
+    if desconocidos:
+        raise ValueError(f"Umbrales desconocidos: {', '.join(sorted(desconocidos))}")
+    return {**UMBRALES_ESTADO, **(umbrales or {})}
+
+
+def _clasificar_estados(densidad, flujo, velocidad, umbrales):
+    """Clasifica arreglos completos de métricas en códigos de estado
+
+    Las reglas se evalúan como máscaras sobre todo el arreglo, en el
+    mismo orden de prioridad que los criterios FLUVI: la primera regla
+    que se cumple gana y lo que no cumple ninguna es Moderado.
+
+    Args:
+        densidad: Arreglo (o escalar) de densidad (%)
+        flujo: Arreglo (o escalar) de flujo (veh/s)
+        velocidad: Arreglo (o escalar) de velocidad (% movimiento)
+        umbrales: Umbrales completos (UMBRALES_ESTADO con los ajustes del corredor)
+
+    Returns:
+        Arreglo int8 con el índice en ESTADOS_TRAFICO de cada fila
+    """
+    u = umbrales
+    densidad = np.atleast_1d(np.asarray(densidad, dtype=np.float64))
+    flujo = np.atleast_1d(np.asarray(flujo, dtype=np.float64))
+    velocidad = np.atleast_1d(np.asarray(velocidad, dtype=np.float64))
+
+    reglas = [
+        # COLAPSO CRÍTICO
+        ((densidad > u['colapso_densidad']) & (velocidad < u['colapso_velocidad']),
+         ESTADO_COLAPSO),
+        # ÓPTIMO
+        ((flujo >= u['optimo_flujo'])
+         & (densidad >= u['optimo_densidad_min']) & (densidad <= u['optimo_densidad_max'])
+         & (velocidad >= u['optimo_velocidad']),
+         ESTADO_OPTIMO),
+        # CONGESTIONADO
+        ((densidad > u['congestion_densidad']) & (velocidad < u['congestion_velocidad']),
+         ESTADO_CONGESTIONADO),
+        # SUB-UTILIZADO
+        ((densidad < u['subutilizado_densidad']) & (flujo < u['subutilizado_flujo']),
+         ESTADO_SUBUTILIZADO),
+    ]
+
+    # MODERADO
+    return np.select([mascara for mascara, _ in reglas],
+                     [codigo for _, codigo in reglas],
+                     default=ESTADO_MODERADO).astype(np.int8)
+
+
+def _leer_bytes(archivo):
+    """Obtiene los bytes crudos de una ruta, archivo o contenido
+
+    Returns:
+        bytes, o None si la entrada no se puede leer como bytes (p. ej. un dict)
+    """
+    if isinstance(archivo, (bytes, bytearray, memoryview)):
+        return bytes(archivo)
+    if isinstance(archivo, str):
+        if os.path.isfile(archivo):
+            with open(archivo, 'rb') as f:
+                return f.read()
+        return archivo.encode('utf-8')
+    if hasattr(archivo, 'read'):
+        contenido = archivo.read()
+        return contenido.encode('utf-8') if isinstance(contenido, str) else contenido
+    return None
+
 
 class AnalizadorTraficoFLUVI:
-    def __init__(self, archivo, tipo='csv'):
+    def __init__(self, archivo, tipo='csv', tam_bloque=None, umbrales=None, cache=None,
+                 compacto=False, dpi=DPI_IMAGENES, decimar=None, paralelo=False,
+                 instrumentar=False, perfilar=None):
         """Inicializa el analizador y carga los datos
 
         Args:
-            archivo: Archivo o contenido a procesar (CSV o JSON)
-            tipo: 'csv' o 'json' - tipo de archivo a procesar
+            archivo: Archivo o contenido a procesar (CSV, JSON o NPZ)
+            tipo: 'csv', 'json' o 'npz' - tipo de archivo a procesar
+            tam_bloque: Filas por bloque para leer el CSV en modo streaming
+                (None lee el archivo completo de una vez)
+            umbrales: Diccionario que sobrescribe parte de UMBRALES_ESTADO
+            cache: CacheMetricas o directorio donde reutilizar datos ya
+                procesados de la misma exportación
+            compacto: Si es True, reduce el DataFrame con compactar_memoria()
+            dpi: Resolución de las imágenes generadas
+            decimar: True dibuja las gráficas en modo decimado, False dibuja
+                todas las filas y None lo decide según MAX_FILAS_SIN_DECIMAR
+            paralelo: True dibuja las figuras del reporte en procesos aparte
+                (solo CPython); también acepta un ProcessPoolExecutor ya creado
+            instrumentar: Si es True mide tiempo, CPU, memoria pico y filas de
+                la carga, de cada etapa y de cada figura en
+                resultados['instrumentacion']; 'tiempo' omite la memoria
+                (tracemalloc hace más lenta la carga y distorsiona los tiempos)
+            perfilar: Etapa (de ETAPAS_ANALISIS o ETAPAS_CARGA) que se ejecuta
+                bajo cProfile; implica instrumentar
+
+        Raises:
+            ValueError: Si `perfilar` no es una etapa conocida
         """
-        self.df = self.cargar_datos(archivo, tipo)
+        if perfilar is not None and perfilar not in ETAPAS_ANALISIS and perfilar not in ETAPAS_CARGA:
+            raise ValueError(f"Etapa a perfilar desconocida: '{perfilar}'")
+        instrumentacion = None
+        if instrumentar or perfilar:
+            instrumentacion = InstrumentacionEtapas(perfilar, memoria=instrumentar != 'tiempo')
+        self._configurar(umbrales, dpi, decimar, paralelo, instrumentacion)
+
+        if self._instrumentacion is not None:
+            with self._instrumentacion.medir('cargar_datos', 'carga', lambda: len(self.df)):
+                self.df = self._cargar(archivo, tipo, tam_bloque, cache)
+        else:
+            self.df = self._cargar(archivo, tipo, tam_bloque, cache)
+
+        if compacto:
+            self.compactar_memoria()
+
+        self._resolver_decimado()
+
+    def _configurar(self, umbrales, dpi, decimar, paralelo=False, instrumentacion=None):
+        """Estado inicial común a __init__ y _sobre_df (todo menos self.df)"""
+        self.umbrales = _combinar_umbrales(umbrales)
+        self.dpi = dpi
+        self.paralelo = paralelo
+        # decimar tal como se pidió (None = automático); self.decimar es el valor resuelto
+        self._decimar_pedido = decimar
+        self._instrumentacion = instrumentacion
         self.resultados = {}
+        if instrumentacion is not None:
+            self.resultados['instrumentacion'] = instrumentacion.resumen
+        self._etapas_ejecutadas = set()
+        self.piramide = None
+        self._indice = None
+
+    def _resolver_decimado(self):
+        """Fija self.decimar: el valor pedido o, en modo automático, según las filas de self.df"""
+        pedido = self._decimar_pedido
+        self.decimar = pedido if pedido is not None else len(self.df) > MAX_FILAS_SIN_DECIMAR
+
+    @classmethod
+    def _sobre_df(cls, df, umbrales=None, dpi=DPI_IMAGENES, decimar=None):
+        """Analizador sobre un DataFrame ya cargado, con el mismo estado inicial que __init__"""
+        analizador = cls.__new__(cls)
+        analizador._configurar(umbrales, dpi, decimar)
+        analizador.df = df
+        analizador._resolver_decimado()
+        return analizador
+
+    def _cargar(self, archivo, tipo, tam_bloque, cache):
+        """Carga los datos, pasando por la caché si se indicó una"""
+        if cache is not None:
+            return self._cargar_con_cache(archivo, tipo, tam_bloque, cache)
+        return self.cargar_datos(archivo, tipo, tam_bloque)
+
+    def _cargar_con_cache(self, archivo, tipo, tam_bloque, cache):
+        """Carga los datos pasando por la caché en disco de CacheMetricas"""
+        if not isinstance(cache, CacheMetricas):
+            cache = CacheMetricas(cache)
+
+        contenido = _leer_bytes(archivo)
+        if contenido is None:
+            return self.cargar_datos(archivo, tipo, tam_bloque)
+
+        clave = cache.clave(contenido, tipo)
+        df = cache.obtener(clave)
+        if df is None:
+            df = self.cargar_datos(io.BytesIO(contenido), tipo, tam_bloque)
+            cache.guardar(clave, df)
+        return df
 
-    def cargar_datos(self, archivo, tipo='csv'):
-        """Carga y limpia los datos desde CSV o JSON
+    def cargar_datos(self, archivo, tipo='csv', tam_bloque=None):
+        """Carga y limpia los datos desde CSV, JSON o NPZ
 
         Args:
             archivo: Archivo o contenido a procesar
-            tipo: 'csv' o 'json' - tipo de archivo
+            tipo: 'csv', 'json' o 'npz' - tipo de archivo
+            tam_bloque: Filas por bloque para el CSV (None = sin bloques)
 
         Returns:
             DataFrame de pandas con los datos procesados
         """
         if tipo == 'json':
             return self._cargar_desde_json(archivo)
+        elif tipo == 'npz':
+            return self._cargar_desde_npz(archivo)
+        elif tam_bloque:
+            return self._cargar_desde_csv_por_bloques(archivo, tam_bloque)
         else:
             return self._cargar_desde_csv(archivo)
 
@@ -154,8 +1015,7 @@ class AnalizadorTraficoFLUVI:
         df = pd.read_csv(archivo, skiprows=6)
 
         # Renombrar columnas para facilitar el trabajo
-        df.columns = ['Marca_Tiempo', 'Densidad', 'Flujo',
-                      'Generacion', 'Velocidad', 'Entropia']
+        df.columns = COLUMNAS_CSV
 
         # Filtrar filas que no son datos
         df = df[df['Marca_Tiempo'].notna()]
@@ -196,41 +1056,200 @@ class AnalizadorTraficoFLUVI:
 
         return df
 
-    def _calcular_dias_semana(self, df):
-        """Calcula el día de la semana detectando cambios de día correctamente"""
-        dias_semana = ['Lunes', 'Martes', 'Miércoles', 'Jueves', 'Viernes', 'Sábado', 'Domingo']
+    def _cargar_desde_csv_por_bloques(self, archivo, tam_bloque):
+        """Carga un CSV largo por bloques de tamaño fijo
 
-        # Detectar cambios de día
-        df['Cambio_Dia'] = 0
+        El pie de estadísticas se descarta a nivel de línea, antes de que
+        pandas lo vea, y el estado de cambio de día (último Tiempo_seg y
+        día actual) se arrastra de un bloque al siguiente.
+
+        Args:
+            archivo: Ruta o archivo CSV
+            tam_bloque: Número de filas por bloque
 
-        for i in range(1, len(df)):
-            if df.loc[i, 'Tiempo_seg'] < df.loc[i-1, 'Tiempo_seg']:
-                df.loc[i, 'Cambio_Dia'] = 1
+        Returns:
+            DataFrame de pandas
+        """
+        abierto = None
+        if isinstance(archivo, str):
+            archivo = abierto = open(archivo, 'r', encoding='utf-8')
+
+        try:
+            # Saltar las filas de metadata y el encabezado
+            for _ in range(7):
+                archivo.readline()
+
+            lector = pd.read_csv(_LectorSinEstadisticas(archivo), header=None,
+                                 names=COLUMNAS_CSV, chunksize=tam_bloque)
+
+            columnas = None
+            tiempo_previo = None
+            dia_inicial = 1
+            for df in lector:
+                df = df[df['Marca_Tiempo'].notna()]
+
+                # Convertir columnas numéricas (no-op si pandas ya las leyó como float)
+                for columna in COLUMNAS_CSV[1:]:
+                    df[columna] = pd.to_numeric(df[columna], errors='coerce')
+                df = df.dropna()
+                if df.empty:
+                    continue
+
+                df['Tiempo_seg'] = pd.to_timedelta(df['Marca_Tiempo']).dt.total_seconds()
+                df = self._calcular_dias_semana(df, tiempo_previo, dia_inicial)
+                df['Minuto'] = df['Tiempo_Acumulado_seg'] / 60
+
+                tiempo_previo = df['Tiempo_seg'].iat[-1]
+                dia_inicial = df['Dia_Numero'].iat[-1]
+
+                # Guardar solo los arreglos por columna; el DataFrame del bloque se libera
+                if columnas is None:
+                    orden = list(df.columns)
+                    columnas = {columna: [] for columna in orden if columna != 'Dia_Semana'}
+                for columna in columnas:
+                    columnas[columna].append(df[columna].to_numpy())
+        finally:
+            if abierto is not None:
+                abierto.close()
+
+        if columnas is None:
+            raise ValueError("El archivo CSV no contiene filas de datos")
+
+        # Unir columna por columna para no duplicar todo el DataFrame en memoria
+        datos = {}
+        for columna in orden:
+            if columna == 'Dia_Semana':
+                datos[columna] = pd.Categorical.from_codes(datos['Dia_Semana_Num'],
+                                                           categories=DIAS_SEMANA, ordered=True)
+            else:
+                datos[columna] = np.concatenate(columnas.pop(columna))
+
+        return pd.DataFrame(datos, copy=False)
+
+    def _cargar_desde_npz(self, archivo):
+        """Carga datos desde el formato binario columnar NPZ
+
+        El archivo contiene un arreglo por métrica (density, throughput,
+        netGeneration, speed, entropy) y un arreglo entero 'seconds' con los
+        segundos del día de cada medición; no hay texto que interpretar.
+
+        Args:
+            archivo: Ruta, bytes o archivo binario NPZ
+
+        Returns:
+            DataFrame de pandas
+        """
+        if isinstance(archivo, (bytes, bytearray, memoryview)):
+            archivo = io.BytesIO(archivo)
+
+        with np.load(archivo, allow_pickle=False) as datos:
+            for clave in ['seconds', *COLUMNAS_NPZ]:
+                if clave not in datos:
+                    raise ValueError(f"Arreglo requerido '{clave}' no encontrado en el archivo NPZ")
+
+            df = pd.DataFrame({columna: datos[clave].astype(np.float64, copy=False)
+                               for clave, columna in COLUMNAS_NPZ.items()})
+            df['Tiempo_seg'] = datos['seconds'].astype(np.float64)
+
+        # Calcular día de la semana correctamente
+        df = self._calcular_dias_semana(df)
+
+        # Calcular tiempo en minutos
+        df['Minuto'] = df['Tiempo_Acumulado_seg'] / 60
+
+        return df
+
+    def guardar_npz(self, destino):
+        """Guarda los datos cargados en el formato binario columnar NPZ
+
+        Args:
+            destino: Ruta o archivo binario de salida
+        """
+        arreglos = {clave: self.df[columna].to_numpy(dtype=np.float64)
+                    for clave, columna in COLUMNAS_NPZ.items()}
+        arreglos['seconds'] = self.df['Tiempo_seg'].to_numpy().round().astype(np.int32)
+        np.savez_compressed(destino, **arreglos)
+
+    def compactar_memoria(self):
+        """Reduce el DataFrame a un formato compacto para exportaciones largas
+
+        Las métricas pasan a float32, los números de día a enteros pequeños,
+        los tiempos enteros a int32 y se eliminan las representaciones
+        duplicadas del tiempo (COLUMNAS_DERIVABLES), que se recalculan bajo
+        demanda con _columna().
+
+        Returns:
+            Diccionario con los bytes por fila antes y después; también se
+            guarda en resultados['memoria']
+        """
+        filas = max(len(self.df), 1)
+        antes = self.df.memory_usage(deep=True).sum() / filas
+
+        df = self.df.drop(columns=[c for c in COLUMNAS_DERIVABLES if c in self.df.columns])
+        tipos = {c: t for c, t in TIPOS_COMPACTOS.items() if c in df.columns}
+
+        # Los segundos solo se guardan como enteros si no pierden precisión
+        for columna in ['Tiempo_seg', 'Tiempo_Acumulado_seg']:
+            valores = df[columna].to_numpy()
+            if np.array_equal(valores, np.round(valores)) and valores.max(initial=0) < 2**31:
+                tipos[columna] = np.int32
+
+        self.df = df.astype(tipos)
+
+        despues = self.df.memory_usage(deep=True).sum() / filas
+        self.resultados['memoria'] = {
+            'bytes_por_fila_antes': round(float(antes), 1),
+            'bytes_por_fila_despues': round(float(despues), 1),
+        }
+        return self.resultados['memoria']
+
+    def _columna(self, nombre):
+        """Devuelve una columna del DataFrame, derivándola si fue compactada"""
+        if nombre in self.df.columns:
+            return self.df[nombre]
+        if nombre == 'Minuto':
+            return (self.df['Tiempo_Acumulado_seg'] / 60).rename(nombre)
+        if nombre == 'Hora_Dia':
+            return (self.df['Tiempo_seg'] / 3600).rename(nombre)
+        if nombre == 'Fecha_Hora':
+            return (pd.Timestamp(FECHA_INICIO)
+                    + pd.to_timedelta(self.df['Tiempo_Acumulado_seg'], unit='s')).rename(nombre)
+        raise KeyError(nombre)
+
+    @_instrumentada('subetapa', cuenta_filas=True)
+    def _calcular_dias_semana(self, df, tiempo_previo=None, dia_inicial=1):
+        """Calcula el día de la semana detectando cambios de día correctamente
+
+        Todo el cálculo es columnar: un cambio de día ocurre cuando
+        Tiempo_seg retrocede respecto a la fila anterior (diff < 0).
+
+        Args:
+            df: DataFrame con la columna Tiempo_seg
+            tiempo_previo: Tiempo_seg de la fila anterior al DataFrame (al
+                procesar por bloques); None si es el inicio de los datos
+            dia_inicial: Dia_Numero de la fila anterior al DataFrame
+        """
+        tiempo_seg = df['Tiempo_seg'].to_numpy(dtype=np.float64)
+
+        # Detectar cambios de día
+        cambio_dia = _detectar_cambios_dia(tiempo_seg, tiempo_previo)
+        df['Cambio_Dia'] = cambio_dia
 
         # Calcular el número de día acumulado
-        df['Dia_Numero'] = df['Cambio_Dia'].cumsum() + 1
+        dia_numero = np.cumsum(cambio_dia) + dia_inicial
+        df['Dia_Numero'] = dia_numero
 
         # Calcular el día de la semana
-        df['Dia_Semana_Num'] = (df['Dia_Numero'] - 1) % 7
-        df['Dia_Semana'] = df['Dia_Semana_Num'].apply(lambda x: dias_semana[x])
+        dia_semana_num = (dia_numero - 1) % 7
+        df['Dia_Semana_Num'] = dia_semana_num
+        df['Dia_Semana'] = pd.Categorical.from_codes(dia_semana_num, categories=DIAS_SEMANA, ordered=True)
 
         # Calcular tiempo acumulado en segundos
-        df['Tiempo_Acumulado_seg'] = 0.0
-        tiempo_acum = 0.0
-        dia_actual = 1
-
-        for i in range(len(df)):
-            if df.loc[i, 'Dia_Numero'] > dia_actual:
-                dia_actual = df.loc[i, 'Dia_Numero']
-
-            tiempo_acum = (df.loc[i, 'Dia_Numero'] - 1) * 86400 + df.loc[i, 'Tiempo_seg']
-            df.loc[i, 'Tiempo_Acumulado_seg'] = tiempo_acum
+        tiempo_acumulado = (dia_numero - 1) * 86400 + tiempo_seg
+        df['Tiempo_Acumulado_seg'] = tiempo_acumulado
 
         # Crear fecha/hora real
-        fecha_inicio = datetime(2024, 1, 1, 7, 0, 10)
-        df['Fecha_Hora'] = df['Tiempo_Acumulado_seg'].apply(
-            lambda x: fecha_inicio + timedelta(seconds=x)
-        )
+        df['Fecha_Hora'] = pd.Timestamp(FECHA_INICIO) + pd.to_timedelta(tiempo_acumulado, unit='s')
 
         # Hora del día
         df['Hora_Dia'] = df['Tiempo_seg'] / 3600
@@ -239,25 +1258,16 @@ class AnalizadorTraficoFLUVI:
 
     def clasificar_estado_trafico(self, densidad, flujo, velocidad):
         """Clasifica el estado del tráfico según los criterios del sistema FLUVI"""
-        # COLAPSO CRÍTICO
-        if densidad > 80 and velocidad < 15:
-            return '🔴 Colapso', '🔴', '#dc3545'
-
-        # ÓPTIMO
-        elif flujo >= 2.5 and 25 <= densidad <= 60 and velocidad >= 50:
-            return '🟢 Óptimo', '🟢', '#198754'
-
-        # CONGESTIONADO
-        elif densidad > 65 and velocidad < 35:
-            return '🟠 Congestionado', '🟠', '#fd7e14'
+        codigo = self.clasificar_estados(densidad, flujo, velocidad)[0]
+        return ESTADOS_TRAFICO[codigo]
 
-        # SUB-UTILIZADO
-        elif densidad < 25 and flujo < 1.5:
-            return '🔵 Sub-utilizado', '🔵', '#0d6efd'
+    def clasificar_estados(self, densidad, flujo, velocidad):
+        """Clasifica arreglos completos de métricas en códigos de estado (ver _clasificar_estados)
 
-        # MODERADO
-        else:
-            return '🟡 Moderado', '🟡', '#ffc107'
+        Returns:
+            Arreglo int8 con el índice en ESTADOS_TRAFICO de cada fila
+        """
+        return _clasificar_estados(densidad, flujo, velocidad, self.umbrales)
 
     def analisis_estadistico_basico(self):
         """Genera estadísticas descriptivas completas"""
@@ -266,30 +1276,30 @@ class AnalizadorTraficoFLUVI:
         self.resultados['estadisticas'] = stats_df
         return stats_df
 
+    def construir_piramide(self):
+        """Agrega los datos una sola vez en la pirámide minuto/hora/día/día×hora
+
+        Las tablas por día, el análisis temporal y los mapas de calor se leen
+        de aquí en lugar de reagrupar todas las filas.
+        """
+        self.piramide = PiramideAgregados.desde_dataframe(self.df)
+        return self.piramide
+
+    def _obtener_piramide(self):
+        """Devuelve la pirámide, construyéndola si ningún paso lo hizo antes"""
+        self.calcular('piramide')
+        return self.piramide
+
     def analisis_por_dia(self):
         """Analiza las métricas agrupadas por día de la semana"""
-        stats_por_dia = self.df.groupby('Dia_Semana').agg({
-            'Densidad': ['mean', 'std', 'min', 'max', 'count'],
-            'Flujo': ['mean', 'std', 'min', 'max'],
-            'Velocidad': ['mean', 'std'],
-            'Entropia': ['mean', 'std']
-        }).round(3)
-
-        conteo_dias = self.df['Dia_Semana'].value_counts()
-
-        stats_por_dia_num = self.df.groupby('Dia_Numero').agg({
-            'Dia_Semana': 'first',
-            'Densidad': ['mean', 'count'],
-            'Flujo': 'mean',
-            'Velocidad': 'mean',
-            'Entropia': 'mean'
-        }).round(3)
+        piramide = self._obtener_piramide()
+        stats_por_dia = piramide.stats_dia_semana()
 
         self.resultados['analisis_dias'] = {
             'stats_dia_semana': stats_por_dia,
-            'stats_dia_numero': stats_por_dia_num,
-            'conteo_dias': conteo_dias,
-            'total_dias': self.df['Dia_Numero'].max()
+            'stats_dia_numero': piramide.stats_dia_numero(),
+            'conteo_dias': piramide.conteo_dias(),
+            'total_dias': piramide.total_dias()
         }
 
         return stats_por_dia
@@ -307,17 +1317,24 @@ class AnalizadorTraficoFLUVI:
         capacidad = self.df.loc[idx_max, 'Flujo']
         densidad_critica = self.df.loc[idx_max, 'Densidad']
         velocidad_critica = self.df.loc[idx_max, 'Velocidad']
-        tiempo_critico = self.df.loc[idx_max, 'Marca_Tiempo']
+        if 'Marca_Tiempo' in self.df.columns:
+            tiempo_critico = self.df.loc[idx_max, 'Marca_Tiempo']
+        else:
+            tiempo_critico = _formatear_marca_tiempo(self.df.loc[idx_max, 'Tiempo_seg'])
         dia_critico = self.df.loc[idx_max, 'Dia_Semana']
         dia_numero_critico = self.df.loc[idx_max, 'Dia_Numero']
-        fecha_critica = self.df.loc[idx_max, 'Fecha_Hora']
+        if 'Fecha_Hora' in self.df.columns:
+            fecha_critica = self.df.loc[idx_max, 'Fecha_Hora']
+        else:
+            fecha_critica = pd.Timestamp(FECHA_INICIO) + pd.Timedelta(
+                seconds=float(self.df.loc[idx_max, 'Tiempo_Acumulado_seg']))
 
         max_densidad = self.df['Densidad'].max()
-        bins = [0, 0.5, 1.0, 1.5, 2.0, 3.0, max_densidad + 0.1]
-        labels = ['Muy Baja', 'Baja', 'Media', 'Alta', 'Muy Alta', 'Crítica']
-        self.df['Rango_Densidad'] = pd.cut(self.df['Densidad'], bins=bins, labels=labels)
+        bins = LIMITES_RANGO_DENSIDAD + [max_densidad + 0.1]
+        rango_densidad = pd.cut(self.df['Densidad'], bins=bins,
+                                labels=ETIQUETAS_RANGO_DENSIDAD).rename('Rango_Densidad')
 
-        flujo_por_rango = self.df.groupby('Rango_Densidad', observed=True)['Flujo'].agg(['mean', 'count'])
+        flujo_por_rango = self.df['Flujo'].groupby(rango_densidad, observed=True).agg(['mean', 'count'])
 
         self.resultados['capacidad'] = {
             'capacidad_maxima': capacidad,
@@ -326,7 +1343,8 @@ class AnalizadorTraficoFLUVI:
             'tiempo_critico': tiempo_critico,
             'dia_critico': dia_critico,
             'dia_numero_critico': int(dia_numero_critico),
-            'fecha_critica': str(fecha_critica)
+            'fecha_critica': str(fecha_critica),
+            'flujo_por_rango': flujo_por_rango
         }
 
         return self.resultados['capacidad']
@@ -356,28 +1374,30 @@ class AnalizadorTraficoFLUVI:
 
     def clustering_estados(self):
         """Identifica estados de tráfico mediante los criterios FLUVI"""
-        clasificacion = self.df.apply(
-            lambda row: self.clasificar_estado_trafico(
-                row['Densidad'],
-                row['Flujo'],
-                row['Velocidad']
-            ),
-            axis=1
-        )
-
-        self.df['Estado_Nombre'] = clasificacion.apply(lambda x: x[0])
-        self.df['Estado_Emoji'] = clasificacion.apply(lambda x: x[1])
-        self.df['Estado_Color'] = clasificacion.apply(lambda x: x[2])
-
-        distribucion = self.df['Estado_Nombre'].value_counts()
-        porcentajes = self.df['Estado_Nombre'].value_counts(normalize=True) * 100
-
-        stats_estados = self.df.groupby('Estado_Nombre').agg({
+        codigos = self.clasificar_estados(self.df['Densidad'].to_numpy(),
+                                          self.df['Flujo'].to_numpy(),
+                                          self.df['Velocidad'].to_numpy())
+
+        # Un solo código por fila; nombre, emoji y color se buscan al graficar
+        self.df['Estado_Nombre'] = pd.Categorical.from_codes(codigos, categories=NOMBRES_ESTADOS)
+
+        # Las tablas llevan índice de texto, como value_counts sobre los nombres:
+        # de mayor a menor conteo y los empates en orden de aparición
+        conteos = np.bincount(codigos, minlength=len(NOMBRES_ESTADOS))
+        presentes, primera = np.unique(codigos, return_index=True)
+        orden = presentes[np.lexsort((primera, -conteos[presentes]))]
+        indice = pd.Index([NOMBRES_ESTADOS[c] for c in orden], name='Estado_Nombre')
+        distribucion = pd.Series(conteos[orden], index=indice, name='count')
+        porcentajes = pd.Series(conteos[orden] / len(codigos) * 100, index=indice, name='proportion')
+
+        stats_estados = self.df.groupby('Estado_Nombre', observed=True).agg({
             'Densidad': 'mean',
             'Flujo': 'mean',
             'Velocidad': 'mean',
             'Entropia': 'mean'
         }).round(2)
+        stats_estados.index = stats_estados.index.astype(str)
+        stats_estados = stats_estados.sort_index()
 
         self.resultados['clustering'] = {
             'distribucion': distribucion,
@@ -389,80 +1409,152 @@ class AnalizadorTraficoFLUVI:
 
     def analisis_temporal(self):
         """Analiza evolución temporal y tendencias"""
-        self.df['Minuto_Redondeado'] = self.df['Minuto'].round()
-        temporal = self.df.groupby('Minuto_Redondeado').agg({
-            'Densidad': 'mean',
-            'Flujo': 'mean',
-            'Velocidad': 'mean',
-            'Entropia': 'mean'
-        })
-
-        slope_densidad, _, _, _, _ = stats.linregress(self.df['Tiempo_Acumulado_seg'], self.df['Densidad'])
+        temporal = self._obtener_piramide().temporal()
 
         self.resultados['temporal'] = temporal
         return temporal
 
+    @_instrumentada('subetapa')
     def fig_to_base64(self, fig):
         """Convierte una figura de matplotlib a base64 para mostrar en web"""
         buf = io.BytesIO()
-        fig.savefig(buf, format='png', dpi=300, bbox_inches='tight')
+        fig.savefig(buf, format='png', dpi=self.dpi, bbox_inches='tight')
         buf.seek(0)
         img_base64 = base64.b64encode(buf.read()).decode('utf-8')
         buf.close()
         plt.close(fig)
         return f"data:image/png;base64,{img_base64}"
 
-    def generar_visualizaciones(self):
-        """Genera las 3 visualizaciones y las retorna como base64"""
+    def _preparar_estilo(self):
+        """Configura el estilo de matplotlib antes de cada figura"""
         plt.style.use('default')
 
         # Configurar paleta de colores (con o sin seaborn)
-        if SEABORN_AVAILABLE:
+        sns = _seaborn()
+        if sns is not None:
             sns.set_palette("husl")
 
-        imagenes = {}
+    def _guardar_imagen(self, nombre, imagen):
+        """Registra una imagen base64 en resultados['imagenes']"""
+        self.resultados.setdefault('imagenes', {})[nombre] = imagen
+        return imagen
+
+    def generar_visualizaciones(self):
+        """Genera las 3 visualizaciones y las retorna como base64
+
+        Con paralelo=True cada figura se dibuja en su propio proceso; si no
+        hay procesos disponibles (Pyodide) o alguno falla, las figuras
+        pendientes se dibujan aquí mismo, una tras otra.
+        """
+        pendientes = [salida for salida in FIGURAS if salida not in self._etapas_ejecutadas]
+        if self.paralelo and MULTIPROCESO_AVAILABLE and len(pendientes) > 1:
+            try:
+                self._dibujar_en_paralelo(pendientes)
+            except Exception as error:
+                print(f"⚠️ Dibujo en paralelo no disponible, continuando en secuencia: {error}")
+
+        self.calcular(*FIGURAS)
+        return self.resultados['imagenes']
+
+    def _dibujar_en_paralelo(self, salidas):
+        """Dibuja las figuras pedidas en procesos aparte
+
+        Las columnas se copian una sola vez a un bloque de memoria compartida
+        y cada proceso las lee de ahí sin deserializar el DataFrame.
+        """
+        columnas = {c: np.ascontiguousarray(self.df[c].to_numpy()) for c in COLUMNAS_FIGURAS}
+        columnas['Dia_Semana'] = self.df['Dia_Semana'].cat.codes.to_numpy()
+        if 'Estado_Nombre' in self.df.columns:
+            columnas['Estado_Nombre'] = self.df['Estado_Nombre'].cat.codes.to_numpy()
+
+        bloque = shared_memory.SharedMemory(create=True, size=max(sum(a.nbytes for a in columnas.values()), 1))
+        ejecutor = self.paralelo if isinstance(self.paralelo, ProcessPoolExecutor) \
+            else ProcessPoolExecutor(max_workers=len(salidas))
+        try:
+            esquema, inicio = [], 0
+            for nombre, arreglo in columnas.items():
+                np.ndarray(arreglo.shape, arreglo.dtype, buffer=bloque.buf, offset=inicio)[:] = arreglo
+                esquema.append((nombre, arreglo.dtype.str, len(arreglo), inicio))
+                inicio += arreglo.nbytes
+
+            opciones = {'umbrales': self.umbrales, 'dpi': self.dpi, 'decimar': self.decimar}
+            futuros = {
+                salida: ejecutor.submit(_dibujar_figura_en_proceso, ETAPAS_ANALISIS[salida][0],
+                                        bloque.name, esquema, opciones,
+                                        self._obtener_piramide() if salida == 'imagen_fundamentales' else None)
+                for salida in salidas
+            }
+            for salida, futuro in futuros.items():
+                nombre, imagen = futuro.result()
+                self._guardar_imagen(nombre, imagen)
+                self._etapas_ejecutadas.add(salida)
+        finally:
+            if ejecutor is not self.paralelo:
+                ejecutor.shutdown()
+            bloque.close()
+            bloque.unlink()
+
+    @classmethod
+    def _desde_columnas(cls, columnas, umbrales=None, dpi=DPI_IMAGENES, decimar=None):
+        """Analizador sobre columnas ya procesadas (sin volver a cargar el archivo)
+
+        Lo usan los procesos de dibujo: Dia_Semana y Estado_Nombre llegan
+        como códigos y se reconstruyen como categorías.
+        """
+        columnas = dict(columnas)
+        columnas['Dia_Semana'] = pd.Categorical.from_codes(columnas['Dia_Semana'], categories=DIAS_SEMANA,
+                                                           ordered=True)
+        if 'Estado_Nombre' in columnas:
+            columnas['Estado_Nombre'] = pd.Categorical.from_codes(columnas['Estado_Nombre'],
+                                                                  categories=NOMBRES_ESTADOS)
+        return cls._sobre_df(pd.DataFrame(columnas, copy=False), umbrales, dpi, decimar)
+
+    def figura_temporal(self):
+        """IMAGEN 1: analisis_temporal.png"""
+        self._preparar_estilo()
+
+        minuto = self._columna('Minuto')
+
+        # En modo decimado cada línea se reduce a mínimo/máximo por cubeta
+        def serie(columna):
+            if self.decimar:
+                return _decimar_min_max(minuto.to_numpy(), self.df[columna].to_numpy())
+            return minuto, self.df[columna]
 
-        # IMAGEN 1: analisis_temporal.png
         fig1, axes = plt.subplots(2, 2, figsize=(18, 10))
         fig1.suptitle('Análisis Temporal de Métricas de Tráfico', fontsize=16, fontweight='bold')
 
-        axes[0,0].plot(self.df['Minuto'], self.df['Densidad'], linewidth=0.5, alpha=0.7)
+        axes[0,0].plot(*serie('Densidad'), linewidth=0.5, alpha=0.7, rasterized=self.decimar)
         axes[0,0].set_title('Densidad vs Tiempo', fontsize=12, fontweight='bold')
         axes[0,0].set_ylabel('Densidad (%)', fontsize=11)
         axes[0,0].grid(True, alpha=0.3)
 
-        axes[0,1].plot(self.df['Minuto'], self.df['Flujo'], linewidth=0.5, alpha=0.7, color='orange')
+        axes[0,1].plot(*serie('Flujo'), linewidth=0.5, alpha=0.7, color='orange', rasterized=self.decimar)
         axes[0,1].set_title('Flujo vs Tiempo', fontsize=12, fontweight='bold')
         axes[0,1].set_ylabel('Flujo (veh/s)', fontsize=11)
         axes[0,1].grid(True, alpha=0.3)
 
-        axes[1,0].plot(self.df['Minuto'], self.df['Velocidad'], linewidth=0.5, alpha=0.7, color='green')
+        axes[1,0].plot(*serie('Velocidad'), linewidth=0.5, alpha=0.7, color='green', rasterized=self.decimar)
         axes[1,0].set_title('Velocidad vs Tiempo', fontsize=12, fontweight='bold')
         axes[1,0].set_ylabel('Velocidad (% movimiento)', fontsize=11)
         axes[1,0].set_xlabel('Tiempo (minutos)', fontsize=11)
         axes[1,0].grid(True, alpha=0.3)
 
         if 'Estado_Nombre' in self.df.columns:
-            orden_estados = ['🔵 Sub-utilizado', '🟡 Moderado', '🟢 Óptimo',
-                           '🟠 Congestionado', '🔴 Colapso']
-
-            colores_estados = {
-                '🔵 Sub-utilizado': '#0d6efd',
-                '🟡 Moderado': '#ffc107',
-                '🟢 Óptimo': '#198754',
-                '🟠 Congestionado': '#fd7e14',
-                '🔴 Colapso': '#dc3545'
-            }
-
-            for estado in orden_estados:
-                if estado in self.df['Estado_Nombre'].values:
-                    mask = self.df['Estado_Nombre'] == estado
-                    axes[1,1].scatter(self.df.loc[mask, 'Minuto'],
-                                    self.df.loc[mask, 'Densidad'],
-                                    label=estado,
-                                    s=3,
-                                    alpha=0.6,
-                                    color=colores_estados[estado])
+            codigos = self.df['Estado_Nombre'].cat.codes.to_numpy()
+
+            if self.decimar:
+                self._mapa_estados(axes[1,1], minuto.to_numpy(), self.df['Densidad'].to_numpy(), codigos)
+            else:
+                for codigo, (estado, _, color) in enumerate(ESTADOS_TRAFICO):
+                    mask = codigos == codigo
+                    if mask.any():
+                        axes[1,1].scatter(minuto.to_numpy()[mask],
+                                        self.df['Densidad'].to_numpy()[mask],
+                                        label=estado,
+                                        s=3,
+                                        alpha=0.6,
+                                        color=color)
 
             axes[1,1].set_title('Estados de Tráfico (Clasificación FLUVI)', fontsize=12, fontweight='bold')
             axes[1,1].set_xlabel('Tiempo (minutos)', fontsize=11)
@@ -473,40 +1565,68 @@ class AnalizadorTraficoFLUVI:
             axes[1,1].axis('off')
 
         plt.tight_layout()
-        imagenes['temporal'] = self.fig_to_base64(fig1)
+        return self._guardar_imagen('temporal', self.fig_to_base64(fig1))
+
+    def _mapa_estados(self, ax, x, y, codigos):
+        """Panel de estados en modo decimado: cada celda tiempo × densidad se
+        pinta con el color del estado más frecuente en ella"""
+        dominante, total, bordes_x, bordes_y = _celdas_estados(x, y, codigos, CELDAS_ESTADOS)
+
+        from matplotlib.colors import to_rgb
+        colores = np.array([to_rgb(color) for _, _, color in ESTADOS_TRAFICO])
+        imagen = np.zeros(total.T.shape + (4,))
+        imagen[..., :3] = colores[dominante.T]
+        imagen[..., 3] = np.where(total.T > 0, 0.6, 0.0)
+        ax.imshow(imagen, origin='lower', aspect='auto', interpolation='nearest', rasterized=True,
+                  extent=(bordes_x[0], bordes_x[-1], bordes_y[0], bordes_y[-1]))
+
+        # Leyenda con un marcador por estado presente, como en el modo completo
+        for codigo in np.unique(codigos):
+            estado, _, color = ESTADOS_TRAFICO[codigo]
+            ax.scatter([], [], label=estado, s=3, alpha=0.6, color=color)
+
+    def _boxplot(self, ax, valores, etiqueta):
+        """Boxplot que en modo decimado limita los atípicos dibujados a
+        MAX_ATIPICOS_BOXPLOT (repartidos por cuantiles, incluidos los extremos)"""
+        if not self.decimar:
+            return ax.boxplot([valores], labels=[etiqueta], patch_artist=True)
+
+        from matplotlib.cbook import boxplot_stats
+        estadisticas = boxplot_stats(np.asarray(valores), labels=[etiqueta])
+        estadisticas[0]['fliers'] = _limitar_atipicos(estadisticas[0]['fliers'], MAX_ATIPICOS_BOXPLOT)
+        return ax.bxp(estadisticas, patch_artist=True)
+
+    def figura_fundamentales(self):
+        """IMAGEN 2: diagramas_fundamentales.png (CON MAPAS DE CALOR)"""
+        self._preparar_estilo()
 
-        # IMAGEN 2: diagramas_fundamentales.png (CON MAPAS DE CALOR)
         fig2, axes = plt.subplots(1, 3, figsize=(24, 6))
         fig2.suptitle('Diagrama Fundamental del Tráfico', fontsize=16, fontweight='bold')
 
         # Subplot 1: Entropía vs Densidad
-        scatter = axes[0].scatter(self.df['Densidad'], self.df['Entropia'],
-                             c=self.df['Flujo'], cmap='plasma',
-                             s=5, alpha=0.6)
+        if self.decimar:
+            # Densidad por celdas hexagonales con el flujo promedio de cada una
+            scatter = axes[0].hexbin(self.df['Densidad'], self.df['Entropia'],
+                                     C=self.df['Flujo'], reduce_C_function=np.mean,
+                                     gridsize=CELDAS_HEXBIN, cmap='plasma', mincnt=1,
+                                     rasterized=True)
+        else:
+            scatter = axes[0].scatter(self.df['Densidad'], self.df['Entropia'],
+                                 c=self.df['Flujo'], cmap='plasma',
+                                 s=5, alpha=0.6)
         axes[0].set_xlabel('Densidad (%)', fontsize=12)
         axes[0].set_ylabel('Entropía (bits)', fontsize=12)
         axes[0].set_title('Entropía vs Densidad (color=Flujo)', fontsize=13, fontweight='bold')
         plt.colorbar(scatter, ax=axes[0], label='Flujo (veh/s)')
         axes[0].grid(True, alpha=0.3)
 
-        # Preparar datos para los mapas de calor
-        # Redondear hora del día a enteros
-        self.df['Hora_Redondeada'] = self.df['Hora_Dia'].round().astype(int)
-
-        # Crear tabla pivote para el heatmap
-        orden_dias = ['Lunes', 'Martes', 'Miércoles', 'Jueves', 'Viernes', 'Sábado', 'Domingo']
-        heatmap_data = self.df.pivot_table(
-            values='Densidad',
-            index='Dia_Semana',
-            columns='Hora_Redondeada',
-            aggfunc='mean'
-        )
-
-        # Reordenar filas según el orden de días de la semana
-        heatmap_data = heatmap_data.reindex([dia for dia in orden_dias if dia in heatmap_data.index])
+        # Preparar datos para los mapas de calor: promedio por día de la semana
+        # y hora redondeada, leído del nivel día×hora de la pirámide
+        heatmap_data = self._obtener_piramide().mapa_calor('Densidad')
+        sns = _seaborn()
 
         # Subplot 2: Mapa de Calor - Densidad con escala fija (0-100%)
-        if SEABORN_AVAILABLE:
+        if sns is not None:
             sns.heatmap(heatmap_data,
                        cmap='YlOrRd',
                        cbar_kws={'label': 'Densidad (%)'},
@@ -533,7 +1653,7 @@ class AnalizadorTraficoFLUVI:
         # Calcular el máximo valor de densidad en los datos
         max_densidad = heatmap_data.max().max()
 
-        if SEABORN_AVAILABLE:
+        if sns is not None:
             sns.heatmap(heatmap_data,
                        cmap='YlOrRd',
                        cbar_kws={'label': 'Densidad (%)'},
@@ -557,9 +1677,12 @@ class AnalizadorTraficoFLUVI:
         axes[2].set_yticklabels(axes[2].get_yticklabels(), rotation=0)
 
         plt.tight_layout()
-        imagenes['fundamentales'] = self.fig_to_base64(fig2)
+        return self._guardar_imagen('fundamentales', self.fig_to_base64(fig2))
+
+    def figura_distribuciones(self):
+        """IMAGEN 3: distribuciones_correlaciones.png"""
+        self._preparar_estilo()
 
-        # IMAGEN 3: distribuciones_correlaciones.png
         fig3, axes = plt.subplots(2, 2, figsize=(14, 10))
         fig3.suptitle('Distribuciones de Densidad y Flujo', fontsize=16, fontweight='bold')
 
@@ -575,14 +1698,14 @@ class AnalizadorTraficoFLUVI:
         axes[0,1].set_ylabel('Frecuencia', fontsize=11)
         axes[0,1].grid(True, alpha=0.3, axis='y')
 
-        bp1 = axes[1,0].boxplot([self.df['Densidad']], labels=['Densidad'], patch_artist=True)
+        bp1 = self._boxplot(axes[1,0], self.df['Densidad'], 'Densidad')
         bp1['boxes'][0].set_facecolor('steelblue')
         bp1['boxes'][0].set_alpha(0.7)
         axes[1,0].set_title('Boxplot Densidad', fontsize=12, fontweight='bold')
         axes[1,0].set_ylabel('Densidad (%)', fontsize=11)
         axes[1,0].grid(True, alpha=0.3, axis='y')
 
-        bp2 = axes[1,1].boxplot([self.df['Flujo']], labels=['Flujo'], patch_artist=True)
+        bp2 = self._boxplot(axes[1,1], self.df['Flujo'], 'Flujo')
         bp2['boxes'][0].set_facecolor('orange')
         bp2['boxes'][0].set_alpha(0.7)
         axes[1,1].set_title('Boxplot Flujo', fontsize=12, fontweight='bold')
@@ -590,50 +1713,1547 @@ class AnalizadorTraficoFLUVI:
         axes[1,1].grid(True, alpha=0.3, axis='y')
 
         plt.tight_layout()
-        imagenes['distribuciones'] = self.fig_to_base64(fig3)
-
-        return imagenes
-
-    def ejecutar_analisis_completo(self):
-        """Ejecuta todos los análisis en secuencia"""
-        self.analisis_estadistico_basico()
-        self.analisis_por_dia()
-        self.analisis_correlaciones()
-        self.analisis_capacidad()
-        self.detectar_eventos_criticos()
-        self.clustering_estados()
-        self.analisis_temporal()
-        imagenes = self.generar_visualizaciones()
-        self.resultados['imagenes'] = imagenes
+        return self._guardar_imagen('distribuciones', self.fig_to_base64(fig3))
+
+    def generar_datos_graficas(self):
+        """Datos numéricos compactos de las 3 visualizaciones para dibujarlas en el navegador
+
+        Contiene las series temporales decimadas, el estado dominante por
+        celda, el diagrama fundamental por celdas, la matriz día × hora, los
+        conteos de los histogramas y los cuartiles de los boxplots. Su tamaño
+        no depende del número de filas, y evita rasterizar PNGs en Pyodide.
+
+        Returns:
+            Diccionario serializable a JSON (también en resultados['datos_graficas'])
+        """
+        minuto = self._columna('Minuto').to_numpy()
+        densidad = self.df['Densidad'].to_numpy()
+        flujo = self.df['Flujo'].to_numpy()
+        entropia = self.df['Entropia'].to_numpy()
+
+        # Imagen 1: series temporales y estados
+        temporal = {}
+        for columna in ['Densidad', 'Flujo', 'Velocidad']:
+            x, y = _decimar_min_max(minuto, self.df[columna].to_numpy(), CUBETAS_GRAFICAS_WEB)
+            temporal[columna.lower()] = {'x': _lista_json(x, 2), 'y': _lista_json(y)}
+
+        codigos = self.df['Estado_Nombre'].cat.codes.to_numpy()
+        dominante, total, bordes_x, bordes_y = _celdas_estados(minuto, densidad, codigos, CELDAS_ESTADOS_WEB)
+        centros_x = (bordes_x[:-1] + bordes_x[1:]) / 2
+        centros_y = (bordes_y[:-1] + bordes_y[1:]) / 2
+        estados = []
+        for codigo, (nombre, _, color) in enumerate(ESTADOS_TRAFICO):
+            ix, iy = np.nonzero((dominante == codigo) & (total > 0))
+            if len(ix):
+                estados.append({'nombre': nombre, 'color': color,
+                                'x': _lista_json(centros_x[ix], 2), 'y': _lista_json(centros_y[iy], 2)})
+
+        # Imagen 2: Entropía vs Densidad por celdas (color = flujo promedio) y mapa de calor
+        conteo, bordes_x, bordes_y = np.histogram2d(densidad, entropia, bins=CELDAS_FUNDAMENTAL_WEB)
+        suma_flujo, _, _ = np.histogram2d(densidad, entropia, bins=[bordes_x, bordes_y], weights=flujo)
+        ix, iy = np.nonzero(conteo)
+        fundamental = {
+            'densidad': _lista_json((bordes_x[ix] + bordes_x[ix + 1]) / 2, 2),
+            'entropia': _lista_json((bordes_y[iy] + bordes_y[iy + 1]) / 2),
+            'flujo': _lista_json(suma_flujo[ix, iy] / conteo[ix, iy]),
+            'conteo': conteo[ix, iy].astype(int).tolist()
+        }
+
+        heatmap_data = self._obtener_piramide().mapa_calor('Densidad')
+        mapa_calor = {
+            'dias': heatmap_data.index.tolist(),
+            'horas': heatmap_data.columns.tolist(),
+            'densidad': [_lista_json(fila, 2) for fila in heatmap_data.to_numpy()]
+        }
+
+        # Imagen 3: histogramas y boxplots
+        histogramas, boxplots = {}, {}
+        for columna, valores in [('densidad', densidad), ('flujo', flujo)]:
+            conteos, bordes = np.histogram(valores, bins=BINS_HISTOGRAMA)
+            histogramas[columna] = {'bordes': _lista_json(bordes), 'conteos': conteos.tolist()}
+
+            estadisticas = _estadisticas_caja(valores)
+            boxplots[columna] = {
+                'q1': float(estadisticas['q1']),
+                'mediana': float(estadisticas['med']),
+                'q3': float(estadisticas['q3']),
+                'bigote_inf': float(estadisticas['whislo']),
+                'bigote_sup': float(estadisticas['whishi']),
+                'atipicos': _lista_json(_limitar_atipicos(estadisticas['fliers'], MAX_ATIPICOS_WEB))
+            }
+
+        self.resultados['datos_graficas'] = {
+            'filas': len(self.df),
+            'temporal': temporal,
+            'estados': estados,
+            'fundamental': fundamental,
+            'mapa_calor': mapa_calor,
+            'histogramas': histogramas,
+            'boxplots': boxplots
+        }
+        return self.resultados['datos_graficas']
+
+    def calcular(self, *salidas):
+        """Ejecuta solo las etapas necesarias para producir las salidas pedidas
+
+        Cada etapa de ETAPAS_ANALISIS corre a lo más una vez por analizador;
+        sus dependencias se resuelven antes que ella.
+
+        Args:
+            *salidas: Nombres de salida de ETAPAS_ANALISIS (p. ej. 'capacidad',
+                'imagen_fundamentales', 'imagenes')
+
+        Returns:
+            Diccionario de resultados
+        """
+        for salida in salidas:
+            if salida not in ETAPAS_ANALISIS:
+                raise ValueError(f"Salida de análisis desconocida: '{salida}'")
+            if salida in self._etapas_ejecutadas:
+                continue
+
+            metodo, dependencias = ETAPAS_ANALISIS[salida]
+            self.calcular(*dependencias)
+            if self._instrumentacion is None:
+                getattr(self, metodo)()
+            else:
+                tipo = 'figura' if salida in FIGURAS else 'etapa'
+                with self._instrumentacion.medir(salida, tipo, lambda: len(self.df)):
+                    getattr(self, metodo)()
+            self._etapas_ejecutadas.add(salida)
+
         return self.resultados
 
+    def ejecutar_analisis_completo(self, salidas=None):
+        """Ejecuta los análisis pedidos (por defecto todos) en orden de dependencias
+
+        Args:
+            salidas: Lista de salidas de ETAPAS_ANALISIS; None ejecuta todas
+        """
+        return self.calcular(*(salidas if salidas is not None else ETAPAS_ANALISIS))
+
+    def _indice_tiempo(self):
+        """Tiempo_Acumulado_seg ordenado para búsquedas binarias (se construye una vez)
+
+        Returns:
+            Tupla (tiempos ordenados, permutación); la permutación es None
+            cuando el DataFrame ya está en orden, que es el caso normal
+        """
+        if self._indice is None:
+            tiempos = self.df['Tiempo_Acumulado_seg'].to_numpy(dtype=np.float64)
+            if len(tiempos) > 1 and (tiempos[1:] < tiempos[:-1]).any():
+                orden = np.argsort(tiempos, kind='stable')
+                self._indice = (tiempos[orden], orden)
+            else:
+                self._indice = (tiempos, None)
+        return self._indice
+
+    def _filas_ventana(self, desde=None, hasta=None, dias=None, dia_semana=None,
+                       hora_inicio=None, hora_fin=None):
+        """Rangos de filas [inicio, fin) del índice que caen en la ventana
+
+        El costo es una búsqueda binaria por día candidato, independiente
+        del número de filas de la exportación.
+        """
+        tiempos, _ = self._indice_tiempo()
+        if len(tiempos) == 0:
+            return []
+
+        inicio = -np.inf if desde is None else float(desde)
+        fin = np.inf if hasta is None else float(hasta)
+        filtra_dias = dias is not None or dia_semana is not None or hora_inicio is not None or hora_fin is not None
+
+        if not filtra_dias:
+            intervalos = [(inicio, fin)]
+        else:
+            h0 = 0.0 if hora_inicio is None else float(hora_inicio)
+            h1 = 24.0 if hora_fin is None else float(hora_fin)
+            if not 0 <= h0 < h1 <= 24:
+                raise ValueError("Se requiere 0 <= hora_inicio < hora_fin <= 24")
+
+            primero = int(tiempos[0] // 86400) + 1
+            ultimo = int(tiempos[-1] // 86400) + 1
+            candidatos = range(primero, ultimo + 1)
+            if dias is not None:
+                d0, d1 = (dias, dias) if np.isscalar(dias) else dias
+                candidatos = range(max(primero, int(d0)), min(ultimo, int(d1)) + 1)
+
+            semana = None
+            if dia_semana is not None:
+                semana = set()
+                for d in ([dia_semana] if isinstance(dia_semana, (str, int)) else dia_semana):
+                    if isinstance(d, str):
+                        if d not in DIAS_SEMANA:
+                            raise ValueError(f"Día de la semana desconocido: '{d}'. Use uno de {DIAS_SEMANA}")
+                        d = DIAS_SEMANA.index(d)
+                    semana.add(int(d) % 7)
+
+            intervalos = []
+            for dia in candidatos:
+                if semana is not None and (dia - 1) % 7 not in semana:
+                    continue
+                base = (dia - 1) * 86400
+                a, b = max(base + h0 * 3600, inicio), min(base + h1 * 3600, fin)
+                if a < b:
+                    intervalos.append((a, b))
+
+        rangos = []
+        for a, b in intervalos:
+            i0 = int(np.searchsorted(tiempos, a, side='left'))
+            i1 = int(np.searchsorted(tiempos, b, side='left'))
+            if i0 >= i1:
+                continue
+            if rangos and rangos[-1][1] == i0:
+                rangos[-1] = (rangos[-1][0], i1)
+            else:
+                rangos.append((i0, i1))
+        return rangos
+
+    def ventana(self, desde=None, hasta=None, dias=None, dia_semana=None, hora_inicio=None, hora_fin=None):
+        """Analizador sobre solo las filas de una ventana de tiempo, sin recargar el archivo
+
+        Los filtros se combinan (intersección). Una ventana contigua es una
+        vista del DataFrame (sin copiar filas); varias franjas (p. ej. todos
+        los martes de 07:00 a 09:00) se copian, pero solo sus filas.
+
+        Args:
+            desde: Tiempo_Acumulado_seg inicial (incluido)
+            hasta: Tiempo_Acumulado_seg final (excluido)
+            dias: Dia_Numero o tupla (primero, último), ambos incluidos
+            dia_semana: Nombre de DIAS_SEMANA, índice 0-6 (0 = Lunes) o lista de ellos
+            hora_inicio: Hora del día inicial (incluida), p. ej. 7 o 7.5
+            hora_fin: Hora del día final (excluida)
+
+        Returns:
+            AnalizadorTraficoFLUVI con los mismos umbrales, dpi y decimar
+
+        Raises:
+            ValueError: Si la ventana no contiene filas o los filtros son inválidos
+        """
+        rangos = self._filas_ventana(desde, hasta, dias, dia_semana, hora_inicio, hora_fin)
+        if not rangos:
+            raise ValueError("La ventana de tiempo no contiene mediciones")
+
+        _, orden = self._indice_tiempo()
+        if orden is None and len(rangos) == 1:
+            df = self.df.iloc[rangos[0][0]:rangos[0][1]]
+        else:
+            posiciones = np.concatenate([np.arange(i0, i1) for i0, i1 in rangos])
+            df = self.df.take(posiciones if orden is None else orden[posiciones])
+
+        # Hereda umbrales, dpi y decimar; en modo automático el decimado se decide por las filas de la ventana
+        return self._sobre_df(df, self.umbrales, self.dpi, self._decimar_pedido)
+
+    def analizar_ventana(self, *salidas, **filtros):
+        """Ejecuta etapas de ETAPAS_ANALISIS sobre una ventana de tiempo
+
+        Ejemplo: analizar_ventana('estadisticas', 'capacidad', dia_semana='Martes',
+        hora_inicio=7, hora_fin=9)
+
+        Args:
+            *salidas: Salidas a calcular (por defecto estadisticas, capacidad,
+                eventos_criticos y clustering)
+            **filtros: Argumentos de ventana()
+
+        Returns:
+            Diccionario de resultados de la ventana
+        """
+        salidas = salidas or ('estadisticas', 'capacidad', 'eventos_criticos', 'clustering')
+        return self.ventana(**filtros).calcular(*salidas)
+
+
+def _normalizar_lote(datos):
+    """Convierte un lote de mediciones (DataFrame o dict 'metrics' del JSON) a DataFrame
+
+    El resultado siempre trae Tiempo_seg, calculado desde Marca_Tiempo si falta.
+    """
+    if isinstance(datos, dict) and 'timestamps' in datos:
+        datos = pd.DataFrame({'Marca_Tiempo': datos['timestamps'],
+                              **{columna: datos[clave] for clave, columna in COLUMNAS_NPZ.items()}})
+    elif not isinstance(datos, pd.DataFrame):
+        datos = pd.DataFrame(datos)
+
+    if 'Tiempo_seg' not in datos.columns:
+        datos = datos.assign(Tiempo_seg=pd.to_timedelta(datos['Marca_Tiempo']).dt.total_seconds())
+    return datos
+
+
+class _AcumuladorGrupos:
+    """Conteo, media, M2, mínimo y máximo por grupo, combinables por lotes
+
+    Cada lote se resume por grupo y se fusiona con lo acumulado usando
+    la fórmula de Chan para medias y varianzas, por lo que el costo es
+    proporcional al tamaño del lote y no al historial.
+    """
+
+    def __init__(self, n_metricas, n_grupos=1):
+        self.n = np.zeros(n_grupos, dtype=np.int64)
+        self.media = np.zeros((n_grupos, n_metricas))
+        self.m2 = np.zeros((n_grupos, n_metricas))
+        self.minimo = np.full((n_grupos, n_metricas), np.inf)
+        self.maximo = np.full((n_grupos, n_metricas), -np.inf)
+
+    def _crecer(self, n_grupos):
+        if n_grupos <= len(self.n):
+            return
+        # Crecimiento geométrico: los grupos nuevos llegan de a poco (minutos, días)
+        extra = max(n_grupos, 2 * len(self.n)) - len(self.n)
+        n_metricas = self.media.shape[1]
+        self.n = np.concatenate([self.n, np.zeros(extra, dtype=np.int64)])
+        self.media = np.vstack([self.media, np.zeros((extra, n_metricas))])
+        self.m2 = np.vstack([self.m2, np.zeros((extra, n_metricas))])
+        self.minimo = np.vstack([self.minimo, np.full((extra, n_metricas), np.inf)])
+        self.maximo = np.vstack([self.maximo, np.full((extra, n_metricas), -np.inf)])
+
+    def _fusionar(self, claves, n_b, media_b, m2_b, minimo_b, maximo_b):
+        """Fusiona resúmenes de grupos (claves únicas) con lo acumulado"""
+        self._crecer(int(claves[-1]) + 1)
+        self.minimo[claves] = np.minimum(self.minimo[claves], minimo_b)
+        self.maximo[claves] = np.maximum(self.maximo[claves], maximo_b)
+
+        # Fusión de Chan: (n_a, media_a, M2_a) + (n_b, media_b, M2_b)
+        n_a = self.n[claves][:, None]
+        n_nuevo = n_a + n_b
+        delta = media_b - self.media[claves]
+        self.media[claves] += delta * n_b / n_nuevo
+        self.m2[claves] += m2_b + delta ** 2 * n_a * n_b / n_nuevo
+        self.n[claves] = n_nuevo[:, 0]
+
+    def agregar(self, grupos, valores):
+        """Agrega un lote
+
+        El lote se ordena por grupo (si no lo está ya, como ocurre con las
+        claves de tiempo) y se resume con reduceat, así que el costo depende
+        solo del tamaño del lote y no de cuántos grupos haya acumulados.
+
+        Args:
+            grupos: Arreglo entero (k,) con el grupo de cada fila
+            valores: Arreglo (k, n_metricas) con las métricas de cada fila
+        """
+        if np.any(grupos[1:] < grupos[:-1]):
+            orden = np.argsort(grupos, kind='stable')
+            grupos, valores = grupos[orden], valores[orden]
+
+        inicios = np.flatnonzero(np.r_[True, grupos[1:] != grupos[:-1]])
+        n_b = np.diff(np.r_[inicios, len(grupos)])[:, None]
+        media_b = np.add.reduceat(valores, inicios, axis=0) / n_b
+        m2_b = np.add.reduceat((valores - np.repeat(media_b, n_b[:, 0], axis=0)) ** 2, inicios, axis=0)
+
+        self._fusionar(grupos[inicios], n_b, media_b, m2_b,
+                       np.minimum.reduceat(valores, inicios, axis=0),
+                       np.maximum.reduceat(valores, inicios, axis=0))
+
+    def reagrupar(self, destino):
+        """Combina los grupos en otros más gruesos (p. ej. horas -> días)
+
+        Args:
+            destino: Función que recibe los índices de grupo y devuelve el
+                grupo grueso de cada uno
+
+        Returns:
+            Nuevo _AcumuladorGrupos con los grupos combinados
+        """
+        observados = np.flatnonzero(self.n)
+        grupos = destino(observados)
+        orden = np.argsort(grupos, kind='stable')
+        observados, grupos = observados[orden], grupos[orden]
+
+        inicios = np.flatnonzero(np.r_[True, grupos[1:] != grupos[:-1]])
+        n = self.n[observados][:, None]
+        media = self.media[observados]
+        n_b = np.add.reduceat(n, inicios, axis=0)
+        media_b = np.add.reduceat(n * media, inicios, axis=0) / n_b
+        desviacion = media - np.repeat(media_b, np.diff(np.r_[inicios, len(grupos)]), axis=0)
+        m2_b = np.add.reduceat(self.m2[observados] + n * desviacion ** 2, inicios, axis=0)
+
+        combinado = _AcumuladorGrupos(self.media.shape[1])
+        combinado._fusionar(grupos[inicios], n_b, media_b, m2_b,
+                            np.minimum.reduceat(self.minimo[observados], inicios, axis=0),
+                            np.maximum.reduceat(self.maximo[observados], inicios, axis=0))
+        return combinado
+
+    def std(self):
+        """Desviación estándar muestral (ddof=1, como pandas)"""
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return np.sqrt(self.m2 / (self.n[:, None] - 1))
+
+
+class PiramideAgregados:
+    """Resúmenes pre-agregados de las métricas a varias resoluciones
+
+    Cada nivel guarda conteo, media, M2 (suma de cuadrados centrada),
+    mínimo y máximo por grupo. Solo los niveles por minuto y por día×hora
+    se llenan desde las filas (una vez, o lote a lote); como las claves de
+    tiempo ya vienen ordenadas, ninguno necesita reordenar los datos. Los
+    demás niveles se combinan desde dia_hora al consultarlos. Las tablas temporales, por día y los
+    mapas de calor cuestan así lo proporcional al tamaño de la salida y no
+    al número de filas.
+
+    Niveles:
+        minuto: Tiempo_Acumulado_seg / 60 redondeado (como analisis_temporal)
+        dia_hora: (Dia_Numero - 1) * HORAS_DIA + Hora_Dia redondeada
+        hora: Hora acumulada redondeada, (Dia_Numero - 1) * 24 + Hora_Dia redondeada
+        dia: Dia_Numero - 1
+        dia_semana: Dia_Semana_Num
+        dia_semana_hora: Dia_Semana_Num * HORAS_DIA + Hora_Dia redondeada
+    """
+
+    METRICAS = ['Densidad', 'Flujo', 'Generacion', 'Velocidad', 'Entropia']
+    METRICAS_TEMPORAL = ['Densidad', 'Flujo', 'Velocidad', 'Entropia']
+
+    # Hora_Dia redondeada va de 0 a 24
+    HORAS_DIA = 25
+
+    # Niveles que se combinan desde dia_hora al consultarlos
+    NIVELES_DERIVADOS = ['hora', 'dia', 'dia_semana', 'dia_semana_hora']
+
+    def __init__(self):
+        n = len(self.METRICAS)
+        self.niveles = {
+            'minuto': _AcumuladorGrupos(n),
+            'dia_hora': _AcumuladorGrupos(n),
+        }
+
+    def _clave_derivada(self, nombre, dia_hora):
+        """Convierte claves de dia_hora en las del nivel derivado"""
+        dia, hora = np.divmod(dia_hora, self.HORAS_DIA)
+        if nombre == 'hora':
+            return dia * 24 + hora
+        if nombre == 'dia':
+            return dia
+        if nombre == 'dia_semana':
+            return dia % 7
+        return (dia % 7) * self.HORAS_DIA + hora
+
+    def nivel(self, nombre):
+        """Acumulador de un nivel (los derivados se combinan desde dia_hora)"""
+        if nombre in self.niveles:
+            return self.niveles[nombre]
+        if nombre not in self.NIVELES_DERIVADOS:
+            raise ValueError(f"Nivel de agregación desconocido: '{nombre}'")
+        return self.niveles['dia_hora'].reagrupar(lambda claves: self._clave_derivada(nombre, claves))
+
+    @classmethod
+    def desde_dataframe(cls, df):
+        """Construye la pirámide a partir de un DataFrame ya cargado
+
+        Args:
+            df: DataFrame con METRICAS, Tiempo_seg y Dia_Numero
+        """
+        piramide = cls()
+        piramide.agregar(df[cls.METRICAS].to_numpy(dtype=np.float64),
+                         df['Tiempo_seg'].to_numpy(dtype=np.float64),
+                         df['Dia_Numero'].to_numpy(dtype=np.int64))
+        return piramide
+
+    def agregar(self, valores, tiempo_seg, dia_numero):
+        """Agrega filas a todos los niveles
+
+        Args:
+            valores: Arreglo (k, len(METRICAS))
+            tiempo_seg: Segundos del día de cada fila
+            dia_numero: Dia_Numero (desde 1) de cada fila
+        """
+        if len(valores) == 0:
+            return
+        tiempo_acumulado = (dia_numero - 1) * 86400 + tiempo_seg
+        claves = {
+            'minuto': np.round(tiempo_acumulado / 60),
+            'dia_hora': (dia_numero - 1) * self.HORAS_DIA + np.round(tiempo_seg / 3600),
+        }
+        for nivel, grupos in claves.items():
+            self.niveles[nivel].agregar(grupos.astype(np.int64), valores)
+
+    def tabla(self, nivel, metricas=None):
+        """Tabla de mean/std/min/max/count por métrica de los grupos observados
+
+        Args:
+            nivel: Nombre del nivel
+            metricas: Lista de métricas (por defecto METRICAS)
+
+        Returns:
+            DataFrame con columnas (métrica, estadístico) indexado por la clave del nivel
+        """
+        acumulador = self.nivel(nivel)
+        observados = np.flatnonzero(acumulador.n)
+        std = acumulador.std()
+
+        columnas = {}
+        for metrica in metricas or self.METRICAS:
+            j = self.METRICAS.index(metrica)
+            columnas[(metrica, 'mean')] = acumulador.media[observados, j]
+            columnas[(metrica, 'std')] = std[observados, j]
+            columnas[(metrica, 'min')] = acumulador.minimo[observados, j]
+            columnas[(metrica, 'max')] = acumulador.maximo[observados, j]
+            columnas[(metrica, 'count')] = acumulador.n[observados]
+        return pd.DataFrame(columnas, index=pd.Index(observados, name=nivel))
+
+    def stats_dia_semana(self):
+        """Equivalente a analisis_por_dia()['stats_dia_semana']"""
+        tabla = self.tabla('dia_semana')
+        columnas = [('Densidad', c) for c in ['mean', 'std', 'min', 'max', 'count']] \
+            + [('Flujo', c) for c in ['mean', 'std', 'min', 'max']] \
+            + [('Velocidad', c) for c in ['mean', 'std']] \
+            + [('Entropia', c) for c in ['mean', 'std']]
+        stats_por_dia = tabla[columnas].round(3)
+        # Índice de texto en orden alfabético, como groupby('Dia_Semana') sobre nombres de día
+        stats_por_dia.index = pd.Index([DIAS_SEMANA[i] for i in tabla.index], name='Dia_Semana')
+        stats_por_dia.columns = pd.MultiIndex.from_tuples(columnas)
+        return stats_por_dia.sort_index()
+
+    def conteo_dias(self):
+        """Filas por día de la semana, de mayor a menor (como value_counts)"""
+        n = self.nivel('dia_semana').n
+        observados = np.flatnonzero(n)
+        conteo = pd.Series(n[observados], name='count',
+                           index=pd.Index([DIAS_SEMANA[i] for i in observados], name='Dia_Semana'))
+        return conteo.sort_values(ascending=False, kind='stable')
+
+    def stats_dia_numero(self):
+        """Equivalente a analisis_por_dia()['stats_dia_numero']"""
+        tabla = self.tabla('dia', ['Densidad', 'Flujo', 'Velocidad', 'Entropia'])
+        dias = tabla.index.to_numpy()
+        return pd.DataFrame({
+            ('Dia_Semana', 'first'): [DIAS_SEMANA[d % 7] for d in dias],
+            ('Densidad', 'mean'): tabla[('Densidad', 'mean')].to_numpy(),
+            ('Densidad', 'count'): tabla[('Densidad', 'count')].to_numpy(),
+            ('Flujo', 'mean'): tabla[('Flujo', 'mean')].to_numpy(),
+            ('Velocidad', 'mean'): tabla[('Velocidad', 'mean')].to_numpy(),
+            ('Entropia', 'mean'): tabla[('Entropia', 'mean')].to_numpy(),
+        }, index=pd.Index(dias + 1, name='Dia_Numero')).round(3)
+
+    def total_dias(self):
+        """Último Dia_Numero observado"""
+        return int(np.flatnonzero(self.niveles['dia_hora'].n).max()) // self.HORAS_DIA + 1
+
+    def temporal(self, nivel='minuto'):
+        """Promedio de las métricas temporales por minuto (o por hora)
+
+        Returns:
+            DataFrame indexado por Minuto_Redondeado (u Hora), como analisis_temporal
+        """
+        tabla = self.tabla(nivel, self.METRICAS_TEMPORAL)
+        temporal = pd.DataFrame({m: tabla[(m, 'mean')].to_numpy() for m in self.METRICAS_TEMPORAL},
+                                index=tabla.index.astype(np.float64))
+        temporal.index.name = 'Minuto_Redondeado' if nivel == 'minuto' else 'Hora'
+        return temporal
+
+    def mapa_calor(self, metrica='Densidad'):
+        """Promedio de una métrica por día de la semana (filas) y hora redondeada (columnas)
+
+        Equivale al pivot de Dia_Semana × Hora_Redondeada de figura_fundamentales:
+        solo aparecen los días y horas con datos.
+        """
+        acumulador = self.nivel('dia_semana_hora')
+        j = self.METRICAS.index(metrica)
+        observados = np.flatnonzero(acumulador.n)
+        n = np.zeros((len(DIAS_SEMANA), self.HORAS_DIA), dtype=np.int64)
+        medias = np.full(n.shape, np.nan)
+        n.flat[observados] = acumulador.n[observados]
+        medias.flat[observados] = acumulador.media[observados, j]
+
+        filas = np.flatnonzero(n.any(axis=1))
+        columnas = np.flatnonzero(n.any(axis=0))
+        return pd.DataFrame(medias[np.ix_(filas, columnas)],
+                            index=pd.Index([DIAS_SEMANA[i] for i in filas], name='Dia_Semana'),
+                            columns=pd.Index(columnas, name='Hora_Redondeada'))
+
+
+class AnalizadorIncremental:
+    """Analizador que absorbe métricas nuevas sin recalcular el historial
+
+    Mantiene acumuladores de media/varianza/mínimo/máximo globales, una
+    PiramideAgregados (por minuto, hora, día y día de la semana), los
+    co-momentos para la matriz de correlación y el máximo de flujo con su
+    instante. Cada llamada a agregar() cuesta O(filas nuevas) y el estado
+    de cambio de día se arrastra entre llamadas. Los resultados coinciden
+    con los de AnalizadorTraficoFLUVI (estadisticas, analisis_dias,
+    correlaciones, capacidad y temporal) dentro de la tolerancia de punto
+    flotante.
+    """
+
+    METRICAS = ['Densidad', 'Flujo', 'Generacion', 'Velocidad', 'Entropia']
+    METRICAS_CORRELACION = ['Densidad', 'Flujo', 'Velocidad', 'Entropia']
+
+    def __init__(self):
+        n = len(self.METRICAS)
+        self.total = _AcumuladorGrupos(n)
+        self.piramide = PiramideAgregados()
+
+        # Co-momentos para la matriz de correlación
+        k = len(self.METRICAS_CORRELACION)
+        self.n_corr = 0
+        self.media_corr = np.zeros(k)
+        self.comomento = np.zeros((k, k))
+
+        # Estado de cambio de día entre lotes
+        self.tiempo_previo = None
+        self.dia_actual = 1
+
+        self.maximo_flujo = None
+        self.resultados = {}
+
+    def agregar(self, datos):
+        """Agrega un lote de mediciones nuevas
+
+        Args:
+            datos: DataFrame con las columnas de METRICAS y Tiempo_seg (o
+                Marca_Tiempo), o un dict con el formato de 'metrics' del JSON
+                exportado (timestamps, density, throughput, ...)
+
+        Returns:
+            Número de filas agregadas
+        """
+        datos = _normalizar_lote(datos)
+        valores = datos[self.METRICAS].to_numpy(dtype=np.float64)
+        tiempo_seg = datos['Tiempo_seg'].to_numpy(dtype=np.float64)
+
+        # Descartar filas incompletas, igual que los cargadores
+        validas = ~np.isnan(valores).any(axis=1) & ~np.isnan(tiempo_seg)
+        valores, tiempo_seg = valores[validas], tiempo_seg[validas]
+        if len(valores) == 0:
+            return 0
+
+        dia_numero = np.cumsum(_detectar_cambios_dia(tiempo_seg, self.tiempo_previo)) + self.dia_actual
+
+        self.total.agregar(np.zeros(len(valores), dtype=np.int64), valores)
+        self.piramide.agregar(valores, tiempo_seg, dia_numero)
+        self._agregar_correlacion(valores[:, [self.METRICAS.index(m) for m in self.METRICAS_CORRELACION]])
+
+        # Máximo de flujo: solo cambia si el lote lo supera (idxmax se queda con el primero)
+        i_flujo = self.METRICAS.index('Flujo')
+        i_max = int(np.argmax(valores[:, i_flujo]))
+        if self.maximo_flujo is None or valores[i_max, i_flujo] > self.maximo_flujo['capacidad_maxima']:
+            self.maximo_flujo = {
+                'capacidad_maxima': valores[i_max, i_flujo],
+                'densidad_critica': valores[i_max, self.METRICAS.index('Densidad')],
+                'velocidad_critica': valores[i_max, self.METRICAS.index('Velocidad')],
+                'tiempo_seg': tiempo_seg[i_max],
+                'dia_numero': int(dia_numero[i_max]),
+            }
+
+        self.tiempo_previo = tiempo_seg[-1]
+        self.dia_actual = int(dia_numero[-1])
+        return len(valores)
+
+    def _agregar_correlacion(self, x):
+        """Fusiona los co-momentos del lote con los acumulados"""
+        n_b = len(x)
+        media_b = x.mean(axis=0)
+        centrado = x - media_b
+        comomento_b = centrado.T @ centrado
+
+        n = self.n_corr + n_b
+        delta = media_b - self.media_corr
+        self.comomento += comomento_b + np.outer(delta, delta) * self.n_corr * n_b / n
+        self.media_corr += delta * n_b / n
+        self.n_corr = n
+
+    def calcular(self):
+        """Actualiza resultados con el estado actual de los acumuladores
+
+        Returns:
+            Diccionario con estadisticas, analisis_dias, temporal, correlaciones y capacidad
+        """
+        if self.total.n[0] == 0:
+            raise ValueError("El analizador incremental todavía no tiene mediciones")
+
+        # Estadísticas básicas (sin cuartiles, que no se pueden acumular exactamente)
+        total, std = self.total, self.total.std()
+        self.resultados['estadisticas'] = pd.DataFrame(
+            {metrica: [total.n[0], total.media[0, j], std[0, j], total.minimo[0, j], total.maximo[0, j]]
+             for j, metrica in enumerate(self.METRICAS)},
+            index=['count', 'mean', 'std', 'min', 'max'])
+
+        self.resultados['analisis_dias'] = {
+            'stats_dia_semana': self.piramide.stats_dia_semana(),
+            'stats_dia_numero': self.piramide.stats_dia_numero(),
+            'conteo_dias': self.piramide.conteo_dias(),
+            'total_dias': self.dia_actual
+        }
+        self.resultados['temporal'] = self.piramide.temporal()
+
+        # Correlaciones
+        escala = np.sqrt(np.diag(self.comomento))
+        with np.errstate(invalid='ignore', divide='ignore'):
+            corr = self.comomento / np.outer(escala, escala)
+        self.resultados['correlaciones'] = pd.DataFrame(corr, index=self.METRICAS_CORRELACION,
+                                                        columns=self.METRICAS_CORRELACION)
+
+        # Capacidad
+        m = self.maximo_flujo
+        tiempo_acumulado = (m['dia_numero'] - 1) * 86400 + m['tiempo_seg']
+        self.resultados['capacidad'] = {
+            'capacidad_maxima': m['capacidad_maxima'],
+            'densidad_critica': m['densidad_critica'],
+            'velocidad_critica': m['velocidad_critica'],
+            'tiempo_critico': _formatear_marca_tiempo(m['tiempo_seg']),
+            'dia_critico': DIAS_SEMANA[(m['dia_numero'] - 1) % 7],
+            'dia_numero_critico': m['dia_numero'],
+            'fecha_critica': str(pd.Timestamp(FECHA_INICIO) + pd.Timedelta(seconds=float(tiempo_acumulado)))
+        }
+
+        return self.resultados
+
+
+class _CuantilP2:
+    """Estimador de cuantil en memoria constante (algoritmo P² de Jain y Chlamtac)
+
+    Mantiene solo cinco marcadores, sin guardar las observaciones. Cuenta
+    además las repeticiones del mínimo y del máximo: en series recortadas
+    (la entropía satura en su máximo) el cuantil exacto cae justo en el
+    extremo y P² lo interpolaría un poco por dentro, con lo que `x > cuantil`
+    contaría todas las muestras del extremo.
+    """
+
+    def __init__(self, p):
+        self.p = p
+        self.n = 0
+        self.minimo = self.maximo = None
+        self.en_minimo = self.en_maximo = 0
+        self.alturas = []
+        self.posiciones = [1, 2, 3, 4, 5]
+        self.deseadas = [1, 1 + 2 * p, 1 + 4 * p, 3 + 2 * p, 5]
+        self.incrementos = [0, p / 2, p, (1 + p) / 2, 1]
+
+    def _contar_extremos(self, x):
+        self.n += 1
+        if self.minimo is None or x < self.minimo:
+            self.minimo, self.en_minimo = x, 1
+        elif x == self.minimo:
+            self.en_minimo += 1
+        if self.maximo is None or x > self.maximo:
+            self.maximo, self.en_maximo = x, 1
+        elif x == self.maximo:
+            self.en_maximo += 1
+
+    def agregar(self, x):
+        self._contar_extremos(x)
+        q = self.alturas
+        if len(q) < 5:
+            q.append(x)
+            q.sort()
+            return
+
+        # Ubicar la celda de x y ajustar los extremos
+        if x < q[0]:
+            q[0] = x
+            k = 0
+        elif x >= q[4]:
+            q[4] = x
+            k = 3
+        else:
+            k = 0
+            while k < 3 and x >= q[k + 1]:
+                k += 1
+
+        n = self.posiciones
+        for i in range(k + 1, 5):
+            n[i] += 1
+        for i in range(5):
+            self.deseadas[i] += self.incrementos[i]
+
+        # Ajustar los marcadores intermedios con interpolación parabólica (o lineal)
+        for i in range(1, 4):
+            d = self.deseadas[i] - n[i]
+            if (d >= 1 and n[i + 1] - n[i] > 1) or (d <= -1 and n[i - 1] - n[i] < -1):
+                d = 1 if d > 0 else -1
+                parabolica = q[i] + d / (n[i + 1] - n[i - 1]) * (
+                    (n[i] - n[i - 1] + d) * (q[i + 1] - q[i]) / (n[i + 1] - n[i])
+                    + (n[i + 1] - n[i] - d) * (q[i] - q[i - 1]) / (n[i] - n[i - 1]))
+                if q[i - 1] < parabolica < q[i + 1]:
+                    q[i] = parabolica
+                else:
+                    q[i] = q[i] + d * (q[i + d] - q[i]) / (n[i + d] - n[i])
+                n[i] += d
+
+    def valor(self):
+        """Estimación actual del cuantil (NaN si aún no hay datos)"""
+        if not self.alturas:
+            return np.nan
+        if len(self.alturas) < 5:
+            return float(np.quantile(self.alturas, self.p))
+        # Mismo criterio que np.quantile (interpolación lineal en la posición (n - 1)·p)
+        posicion = (self.n - 1) * self.p
+        if self.en_maximo >= self.n - np.floor(posicion):
+            return float(self.maximo)
+        if self.en_minimo > np.ceil(posicion):
+            return float(self.minimo)
+        return self.alturas[2]
+
+
+class DetectorEventosEnLinea:
+    """Detector de eventos críticos que procesa las mediciones conforme llegan
+
+    Equivalente en línea de detectar_eventos_criticos: los percentiles 95 de
+    Generacion y 90 de Entropia se estiman con P² en memoria constante, y los
+    picos de Densidad se buscan con la misma semántica de
+    signal.find_peaks(height=2.0, distance=30) sobre una ventana deslizante.
+    Un pico se emite en cuanto ya no puede llegar otro que lo suprima, y
+    los picos emitidos son los mismos sin importar cómo se dividan los
+    lotes. Difieren de find_peaks solo entre picos de igual altura a menos
+    de la distancia mínima (find_peaks los desempata con un argsort no
+    estable) o si actúa ventana_max.
+    """
+
+    UMBRAL_VELOCIDAD = 85
+
+    def __init__(self, altura_pico=2.0, distancia_pico=30, ventana_max=86400):
+        """
+        Args:
+            altura_pico: Altura mínima de un pico de densidad
+            distancia_pico: Separación mínima entre picos (en muestras)
+            ventana_max: Latencia máxima (en muestras) de un candidato
+                pendiente antes de forzar su resolución; None nunca la fuerza
+                (la memoria queda sin cota si los picos suben sin fin)
+        """
+        self.altura_pico = altura_pico
+        self.distancia_pico = distancia_pico
+        self.ventana_max = ventana_max
+        self.cuantil_generacion = _CuantilP2(0.95)
+        self.cuantil_entropia = _CuantilP2(0.90)
+
+        self.n = 0
+        self.tiempo_previo = None
+        self.dia_actual = 1
+
+        # Cola de densidad aún no resuelta (desde el último valle o meseta final)
+        self._cola = np.empty(0)
+        self._cola_tiempos = np.empty((0, 2))
+        self._inicio_cola = 0
+        self._ultimo_candidato = -1
+        self._candidatos = []
+        self._estados = []      # por candidato: None (pendiente), True (conservado) o False (suprimido)
+        self._picos = []
+
+        self.conteos = {
+            'alta_generacion': 0,
+            'baja_velocidad': 0,
+            'alta_entropia': 0,
+            'picos_densidad': 0
+        }
+
+    def _evento(self, tipo, indice, valor, umbral, tiempo_seg, dia_numero):
+        self.conteos[tipo] += 1
+        return {
+            'tipo': tipo,
+            'indice': int(indice),
+            'valor': float(valor),
+            'umbral': float(umbral),
+            'marca_tiempo': _formatear_marca_tiempo(tiempo_seg),
+            'dia_numero': int(dia_numero)
+        }
+
+    def agregar(self, datos):
+        """Procesa un lote de mediciones nuevas
+
+        Args:
+            datos: DataFrame o dict 'metrics', como en AnalizadorIncremental.agregar
+
+        Returns:
+            Lista de eventos detectados en este lote
+        """
+        datos = _normalizar_lote(datos)
+        columnas = ['Densidad', 'Generacion', 'Velocidad', 'Entropia', 'Tiempo_seg']
+        valores = datos[columnas].to_numpy(dtype=np.float64)
+        valores = valores[~np.isnan(valores).any(axis=1)]
+        if len(valores) == 0:
+            return []
+
+        densidad, generacion, velocidad, entropia, tiempo_seg = valores.T
+        dia_numero = np.cumsum(_detectar_cambios_dia(tiempo_seg, self.tiempo_previo)) + self.dia_actual
+        self.tiempo_previo = tiempo_seg[-1]
+        self.dia_actual = int(dia_numero[-1])
+
+        eventos = []
+        for i in range(len(valores)):
+            indice = self.n + i
+
+            # Se compara contra el percentil estimado con las muestras anteriores
+            umbral_gen = self.cuantil_generacion.valor()
+            if generacion[i] > umbral_gen:
+                eventos.append(self._evento('alta_generacion', indice, generacion[i], umbral_gen,
+                                            tiempo_seg[i], dia_numero[i]))
+            self.cuantil_generacion.agregar(generacion[i])
+
+            umbral_ent = self.cuantil_entropia.valor()
+            if entropia[i] > umbral_ent:
+                eventos.append(self._evento('alta_entropia', indice, entropia[i], umbral_ent,
+                                            tiempo_seg[i], dia_numero[i]))
+            self.cuantil_entropia.agregar(entropia[i])
+
+            if velocidad[i] < self.UMBRAL_VELOCIDAD:
+                eventos.append(self._evento('baja_velocidad', indice, velocidad[i], self.UMBRAL_VELOCIDAD,
+                                            tiempo_seg[i], dia_numero[i]))
+
+        self.n += len(valores)
+        eventos.extend(self._buscar_picos(densidad, np.column_stack([tiempo_seg, dia_numero])))
+        return eventos
+
+    def _buscar_picos(self, densidad, tiempos):
+        """Busca máximos locales en la ventana y resuelve los que ya son definitivos"""
+        ventana = np.concatenate([self._cola, densidad])
+        ventana_tiempos = np.concatenate([self._cola_tiempos, tiempos])
+
+        picos, _ = signal.find_peaks(ventana, height=self.altura_pico)
+        for p in picos:
+            global_p = self._inicio_cola + p
+            if global_p > self._ultimo_candidato:
+                self._candidatos.append((global_p, ventana[p], *ventana_tiempos[p]))
+                self._estados.append(None)
+                self._ultimo_candidato = global_p
+
+        # Conservar la meseta final y la muestra anterior: ahí aún puede haber un pico
+        fin = len(ventana) - 1
+        while fin > 0 and ventana[fin - 1] == ventana[fin]:
+            fin -= 1
+        inicio = max(fin - 1, 0)
+        self._cola = ventana[inicio:]
+        self._cola_tiempos = ventana_tiempos[inicio:]
+        self._inicio_cola += inicio
+
+        return self._resolver_picos(self._inicio_cola)
+
+    def _resolver_picos(self, limite):
+        """Emite, en orden, los candidatos cuyo destino ya es definitivo
+
+        Replica la selección por distancia de find_peaks: de mayor a menor
+        altura (a igual altura gana el índice mayor, como el argsort
+        estable), cada pico conservado suprime a los que están a menos de
+        distancia_pico. Un candidato queda suprimido en cuanto un vecino más
+        alto está conservado, y conservado cuando todos sus vecinos más
+        altos están suprimidos y ya no puede llegar otro a esa distancia.
+        Así el resultado no depende de cómo se parta la serie en lotes.
+
+        Si un candidato sigue pendiente más de ventana_max muestras (una
+        cadena muy larga de picos cada vez más altos), se decide suponiendo
+        que sus vecinos pendientes se conservarán.
+
+        Args:
+            limite: Índice global a partir del cual aún pueden aparecer candidatos
+        """
+        candidatos, estados = self._candidatos, self._estados
+        if not candidatos:
+            return []
+
+        indices = np.array([c[0] for c in candidatos])
+        distancia = self.distancia_pico
+        forzar_antes = limite - self.ventana_max if self.ventana_max is not None else -np.inf
+        orden = sorted(range(len(candidatos)), key=lambda k: (candidatos[k][1], candidatos[k][0]), reverse=True)
+        for k in orden:
+            if estados[k] is not None:
+                continue
+            indice, altura = candidatos[k][0], candidatos[k][1]
+            prioridad = (altura, indice)
+            desde = np.searchsorted(indices, indice - distancia, side='right')
+            hasta = np.searchsorted(indices, indice + distancia, side='left')
+            mas_altos = [estados[m] for m in range(desde, hasta)
+                         if (candidatos[m][1], candidatos[m][0]) > prioridad]
+            mas_altos += [True for q, h in self._picos if indice - q < distancia and (h, q) > prioridad]
+
+            if True in mas_altos:
+                estados[k] = False
+            elif None in mas_altos:
+                if indice < forzar_antes:
+                    estados[k] = False
+            elif indice + distancia <= limite:
+                estados[k] = True
+
+        eventos = []
+        while candidatos and estados[0] is not None:
+            (indice, altura, tiempo_seg, dia_numero), conservado = candidatos.pop(0), estados.pop(0)
+            if conservado:
+                self._picos.append((indice, altura))
+                eventos.append(self._evento('picos_densidad', indice, altura, self.altura_pico,
+                                            tiempo_seg, dia_numero))
+
+        # Solo importan los picos emitidos a menos de la distancia mínima de un candidato pendiente
+        referencia = candidatos[0][0] if candidatos else limite
+        self._picos = [(q, h) for q, h in self._picos if referencia - q < distancia]
+        return eventos
+
+    def finalizar(self):
+        """Resuelve los picos pendientes al terminar la simulación
+
+        Returns:
+            Lista de eventos de pico emitidos
+        """
+        return self._resolver_picos(float('inf'))
+
+    def resumen(self):
+        """Conteos acumulados con las mismas claves que eventos_criticos"""
+        return dict(self.conteos)
+
+
+class BufferCircular:
+    """Últimas `capacidad` filas de mediciones en un arreglo de tamaño fijo
+
+    Las filas nuevas sobrescriben a las más antiguas, así que la memoria no
+    crece con la duración de la simulación.
+    """
+
+    COLUMNAS = ['Tiempo_seg', 'Dia_Numero'] + AnalizadorIncremental.METRICAS
+
+    def __init__(self, capacidad=CAPACIDAD_BUFFER_VIVO):
+        if capacidad < 1:
+            raise ValueError("La capacidad del buffer debe ser al menos 1")
+        self.capacidad = capacidad
+        self.datos = np.empty((capacidad, len(self.COLUMNAS)))
+        self.siguiente = 0   # posición donde se escribe la próxima fila
+        self.n = 0           # filas válidas en el buffer
+        self.total = 0       # filas recibidas desde el inicio
+
+    def __len__(self):
+        return self.n
+
+    def agregar(self, filas):
+        """Escribe un bloque (k, len(COLUMNAS)) dando la vuelta al final del arreglo"""
+        k = len(filas)
+        self.total += k
+        if k >= self.capacidad:
+            filas = filas[-self.capacidad:]
+            self.datos[:] = filas
+            self.siguiente, self.n = 0, self.capacidad
+            return
+        primera = min(k, self.capacidad - self.siguiente)
+        self.datos[self.siguiente:self.siguiente + primera] = filas[:primera]
+        self.datos[:k - primera] = filas[primera:]
+        self.siguiente = (self.siguiente + k) % self.capacidad
+        self.n = min(self.n + k, self.capacidad)
+
+    def ultimas(self, n=None):
+        """Copia de las últimas `n` filas (todas por defecto) en orden cronológico"""
+        n = self.n if n is None else min(n, self.n)
+        indices = (self.siguiente - n + np.arange(n)) % self.capacidad
+        return self.datos[indices]
+
+    def columna(self, nombre, n=None):
+        return self.ultimas(n)[:, self.COLUMNAS.index(nombre)]
+
+
+class SesionEnVivo:
+    """Monitoreo de una simulación en curso a partir de lotes de mediciones
+
+    Combina un BufferCircular con las muestras recientes, un
+    AnalizadorIncremental (estadísticas globales y agregados por hora de
+    toda la corrida, en memoria proporcional a las horas simuladas) y un
+    DetectorEventosEnLinea. Ninguno guarda el historial completo.
+    """
+
+    def __init__(self, capacidad=CAPACIDAD_BUFFER_VIVO, umbrales=None):
+        """
+        Args:
+            capacidad: Muestras recientes que conserva el buffer
+            umbrales: Diccionario que sobrescribe parte de UMBRALES_ESTADO
+        """
+        self.umbrales = _combinar_umbrales(umbrales)
+        self.buffer = BufferCircular(capacidad)
+        self.incremental = AnalizadorIncremental()
+        self.detector = DetectorEventosEnLinea()
+        self.eventos = deque(maxlen=MAX_EVENTOS_RECIENTES)
+
+    def agregar(self, datos):
+        """Agrega un lote de mediciones
+
+        Args:
+            datos: DataFrame o dict 'metrics' del JSON exportado (timestamps,
+                density, throughput, netGeneration, speed, entropy)
+
+        Returns:
+            Diccionario con las filas aceptadas y los eventos detectados en el lote
+        """
+        datos = _normalizar_lote(datos)
+        columnas = ['Tiempo_seg'] + AnalizadorIncremental.METRICAS
+        datos = datos[columnas].astype(np.float64).dropna()
+        if len(datos) == 0:
+            return {'aceptadas': 0, 'eventos': []}
+
+        # Mismo cambio de día que el analizador incremental, calculado antes de agregar
+        tiempo_seg = datos['Tiempo_seg'].to_numpy()
+        dia_numero = np.cumsum(_detectar_cambios_dia(tiempo_seg, self.incremental.tiempo_previo)) \
+            + self.incremental.dia_actual
+
+        self.incremental.agregar(datos)
+        eventos = self.detector.agregar(datos)
+        self.eventos.extend(eventos)
+        self.buffer.agregar(np.column_stack([tiempo_seg, dia_numero,
+                                             datos[AnalizadorIncremental.METRICAS].to_numpy()]))
+        return {'aceptadas': len(datos), 'eventos': eventos}
+
+    def resumen(self, horas=HORAS_RESUMEN_VIVO):
+        """Resultados actuales en un diccionario apto para JSON
+
+        Returns:
+            Diccionario con muestras, ultima_muestra, estado_actual,
+            distribucion_estados (sobre el buffer), estadisticas, capacidad,
+            por_hora (últimas `horas`), eventos_recientes y conteo_eventos
+        """
+        if len(self.buffer) == 0:
+            raise ValueError("La sesión todavía no tiene mediciones")
+
+        ultima = self.buffer.ultimas(1)[0]
+        valores = dict(zip(BufferCircular.COLUMNAS, ultima.tolist()))
+        codigos = _clasificar_estados(self.buffer.columna('Densidad'), self.buffer.columna('Flujo'),
+                                      self.buffer.columna('Velocidad'), self.umbrales)
+        conteos = np.bincount(codigos, minlength=len(ESTADOS_TRAFICO))
+        nombre, emoji, color = ESTADOS_TRAFICO[codigos[-1]]
+
+        total, std = self.incremental.total, self.incremental.total.std()
+        estadisticas = {
+            metrica: {'media': total.media[0, j], 'std': std[0, j],
+                      'min': total.minimo[0, j], 'max': total.maximo[0, j]}
+            for j, metrica in enumerate(AnalizadorIncremental.METRICAS)
+        }
+        maximo = self.incremental.maximo_flujo
+
+        tabla = self.incremental.piramide.tabla('hora').tail(horas)
+        claves = tabla.index.to_numpy()
+        por_hora = {
+            'dia_numero': (claves // 24 + 1).tolist(),
+            'hora': (claves % 24).tolist(),
+            'muestras': tabla[('Densidad', 'count')].astype(int).tolist(),
+            **{metrica: _lista_json(tabla[(metrica, 'mean')]) for metrica in AnalizadorIncremental.METRICAS}
+        }
+
+        return {
+            'muestras': {'total': self.buffer.total, 'en_buffer': len(self.buffer),
+                         'capacidad': self.buffer.capacidad},
+            'ultima_muestra': {
+                'marca_tiempo': _formatear_marca_tiempo(valores['Tiempo_seg']),
+                'dia_numero': int(valores['Dia_Numero']),
+                **{metrica: round(valores[metrica], 4) for metrica in AnalizadorIncremental.METRICAS}
+            },
+            'estado_actual': {'nombre': nombre, 'emoji': emoji, 'color': color},
+            'distribucion_estados': {ESTADOS_TRAFICO[i][0]: int(c) for i, c in enumerate(conteos)},
+            'estadisticas': {m: {k: round(float(v), 4) for k, v in e.items()} for m, e in estadisticas.items()},
+            'capacidad': {
+                'capacidad_maxima': round(float(maximo['capacidad_maxima']), 4),
+                'densidad_critica': round(float(maximo['densidad_critica']), 4),
+                'velocidad_critica': round(float(maximo['velocidad_critica']), 4),
+                'tiempo_critico': _formatear_marca_tiempo(maximo['tiempo_seg']),
+                'dia_numero_critico': maximo['dia_numero'],
+            },
+            'por_hora': por_hora,
+            'eventos_recientes': list(self.eventos),
+            'conteo_eventos': self.detector.resumen(),
+        }
+
+
+def _dibujar_figura_en_proceso(metodo, nombre_bloque, esquema, opciones, piramide=None):
+    """Dibuja una figura en un proceso aparte a partir de la memoria compartida
+
+    Args:
+        metodo: Método de figura de AnalizadorTraficoFLUVI (p. ej. 'figura_temporal')
+        nombre_bloque: Nombre del bloque de SharedMemory con las columnas
+        esquema: Lista de (columna, dtype, filas, desplazamiento) dentro del bloque
+        opciones: umbrales, dpi y decimar del analizador original
+        piramide: PiramideAgregados ya construida (solo la usa figura_fundamentales)
+
+    Returns:
+        Tupla (nombre de la imagen, imagen en base64)
+    """
+    bloque = shared_memory.SharedMemory(name=nombre_bloque)
+    try:
+        columnas = {nombre: np.ndarray((filas,), np.dtype(dtype), buffer=bloque.buf, offset=inicio)
+                    for nombre, dtype, filas, inicio in esquema}
+        analizador = AnalizadorTraficoFLUVI._desde_columnas(columnas, **opciones)
+        if piramide is not None:
+            analizador.piramide = piramide
+            analizador._etapas_ejecutadas.add('piramide')
+        getattr(analizador, metodo)()
+        nombre, imagen = next(iter(analizador.resultados['imagenes'].items()))
+        # Soltar las vistas sobre el bloque antes de cerrarlo
+        del analizador, columnas
+        return nombre, imagen
+    finally:
+        try:
+            bloque.close()
+        except BufferError:
+            pass
+
+
+def convertir_a_npz(archivo, destino, tipo='csv'):
+    """Convierte una exportación CSV/JSON existente al formato binario NPZ
+
+    Args:
+        archivo: Ruta, archivo o contenido de la exportación original
+        destino: Ruta o archivo binario de salida (.npz)
+        tipo: 'csv' o 'json' - tipo de la exportación original
+
+    Returns:
+        Número de mediciones guardadas
+    """
+    if isinstance(archivo, str) and os.path.isfile(archivo):
+        with open(archivo, 'r', encoding='utf-8') as f:
+            return convertir_a_npz(f, destino, tipo)
+
+    analizador = AnalizadorTraficoFLUVI(archivo, tipo=tipo)
+    analizador.guardar_npz(destino)
+    return len(analizador.df)
+
+
+# Núcleo NumPy: carga, días, estadísticas, clasificación y capacidad sin pandas
+def _texto(contenido):
+    """Texto de un contenido str, bytes o archivo abierto"""
+    if hasattr(contenido, 'read'):
+        contenido = contenido.read()
+    if isinstance(contenido, (bytes, bytearray, memoryview)):
+        contenido = bytes(contenido).decode('utf-8-sig')
+    return contenido
+
+
+def _segundos_de_marcas(marcas):
+    """Segundos del día de una lista de marcas HH:MM:SS"""
+    if not len(marcas):
+        return np.zeros(0)
+    partes = np.array(':'.join(marcas).split(':'), dtype=np.float64).reshape(-1, 3)
+    return partes @ np.array([3600.0, 60.0, 1.0])
+
+
+def _columnas_desde_csv(texto):
+    """Tiempo_seg y métricas de un CSV exportado (metadata, encabezado, filas y pie)"""
+    filas = []
+    for linea in texto.splitlines()[7:]:
+        if linea.lstrip().upper().startswith('ESTADISTICAS'):
+            break
+        if linea.strip():
+            filas.append(linea)
+
+    campos = 3 + len(METRICAS_NUCLEO)   # hora, minuto, segundo y las métricas
+    try:
+        valores = np.array(','.join(filas).replace(':', ',').split(','), dtype=np.float64).reshape(-1, campos)
+    except ValueError:
+        # Alguna fila no es numérica: se descartan una por una, como hace pandas con errors='coerce'
+        validas = []
+        for fila in filas:
+            try:
+                fila = np.array(fila.replace(':', ',').split(','), dtype=np.float64)
+            except ValueError:
+                continue
+            if len(fila) == campos:
+                validas.append(fila)
+        valores = np.array(validas).reshape(-1, campos)
+
+    valores = valores[np.isfinite(valores).all(axis=1)]
+    columnas = {'Tiempo_seg': valores[:, :3] @ np.array([3600.0, 60.0, 1.0])}
+    for i, metrica in enumerate(METRICAS_NUCLEO):
+        columnas[metrica] = valores[:, 3 + i]
+    return columnas
+
+
+def _columnas_desde_json(datos):
+    """Tiempo_seg y métricas del JSON exportado (texto o diccionario ya leído)"""
+    if isinstance(datos, str):
+        datos = json.loads(datos)
+    if 'metrics' not in datos:
+        raise ValueError("El archivo JSON debe contener una clave 'metrics' con los datos")
+    metricas = datos['metrics']
+    for clave in ['timestamps', *COLUMNAS_NPZ]:
+        if clave not in metricas:
+            raise ValueError(f"Clave requerida '{clave}' no encontrada en metrics")
+
+    marcas = metricas['timestamps']
+    valores = np.column_stack([np.array(metricas[clave], dtype=np.float64) for clave in COLUMNAS_NPZ])
+    validas = np.isfinite(valores).all(axis=1) & np.array([marca is not None for marca in marcas], dtype=bool)
+    columnas = {'Tiempo_seg': _segundos_de_marcas([marca for marca, ok in zip(marcas, validas) if ok])}
+    for i, metrica in enumerate(COLUMNAS_NPZ.values()):
+        columnas[metrica] = valores[validas, i]
+    return columnas
+
+
+def cargar_columnas(contenido, tipo='csv'):
+    """Carga una exportación en arreglos NumPy, sin pandas
+
+    Hace la misma limpieza y detección de días que AnalizadorTraficoFLUVI,
+    pero devuelve un diccionario de columnas en lugar de un DataFrame.
+
+    Args:
+        contenido: CSV o JSON como texto (o bytes / archivo abierto), NPZ como bytes
+        tipo: 'csv', 'json' o 'npz'
+
+    Returns:
+        Diccionario con Tiempo_seg, las métricas de METRICAS_NUCLEO,
+        Cambio_Dia, Dia_Numero, Dia_Semana_Num y Tiempo_Acumulado_seg
+
+    Raises:
+        ValueError: Si el formato no es válido o no hay filas de datos
+    """
+    if tipo == 'npz':
+        archivo = io.BytesIO(bytes(contenido)) if isinstance(contenido, (bytes, bytearray, memoryview)) else contenido
+        with np.load(archivo, allow_pickle=False) as datos:
+            for clave in ['seconds', *COLUMNAS_NPZ]:
+                if clave not in datos:
+                    raise ValueError(f"Arreglo requerido '{clave}' no encontrado en el archivo NPZ")
+            columnas = {columna: datos[clave].astype(np.float64) for clave, columna in COLUMNAS_NPZ.items()}
+            columnas['Tiempo_seg'] = datos['seconds'].astype(np.float64)
+    elif tipo == 'json':
+        columnas = _columnas_desde_json(contenido if isinstance(contenido, dict) else _texto(contenido))
+    elif tipo == 'csv':
+        columnas = _columnas_desde_csv(_texto(contenido))
+    else:
+        raise ValueError(f"Tipo de archivo no soportado: '{tipo}'. Use 'csv', 'json' o 'npz'")
+
+    tiempo_seg = columnas['Tiempo_seg']
+    if not len(tiempo_seg):
+        raise ValueError("El archivo no contiene filas de datos")
+    columnas['Cambio_Dia'] = _detectar_cambios_dia(tiempo_seg)
+    columnas['Dia_Numero'] = np.cumsum(columnas['Cambio_Dia']) + 1
+    columnas['Dia_Semana_Num'] = (columnas['Dia_Numero'] - 1) % 7
+    columnas['Tiempo_Acumulado_seg'] = (columnas['Dia_Numero'] - 1) * 86400 + tiempo_seg
+    return columnas
+
+
+def estadisticas_columnas(columnas):
+    """Estadísticas de describe() por métrica (std es None con menos de 2 filas)"""
+    estadisticas = {}
+    for metrica in METRICAS_NUCLEO:
+        valores = columnas[metrica]
+        q1, mediana, q3 = np.percentile(valores, [25, 50, 75])
+        estadisticas[metrica] = dict(zip(ESTADISTICAS_DESCRIBE, [
+            len(valores), float(valores.mean()), float(valores.std(ddof=1)) if len(valores) > 1 else None,
+            float(valores.min()), float(q1), float(mediana), float(q3), float(valores.max()),
+        ]))
+    return estadisticas
+
+
+def clasificar_columnas(columnas, umbrales=None):
+    """Estados de tráfico por fila y su resumen (como clustering_estados)
+
+    Returns:
+        Diccionario con 'codigos' (índice en ESTADOS_TRAFICO por fila),
+        'distribucion', 'porcentajes' y 'estadisticas' (promedios por estado),
+        con los estados presentes de mayor a menor frecuencia
+    """
+    codigos = _clasificar_estados(columnas['Densidad'], columnas['Flujo'], columnas['Velocidad'],
+                                  _combinar_umbrales(umbrales))
+    conteos = np.bincount(codigos, minlength=len(ESTADOS_TRAFICO))
+    presentes = [int(c) for c in np.argsort(-conteos, kind='stable') if conteos[c] > 0]
+
+    promedios = {}
+    for metrica in ['Densidad', 'Flujo', 'Velocidad', 'Entropia']:
+        sumas = np.bincount(codigos, weights=columnas[metrica], minlength=len(ESTADOS_TRAFICO))
+        promedios[metrica] = sumas / np.maximum(conteos, 1)
+
+    return {
+        'codigos': codigos,
+        'distribucion': {NOMBRES_ESTADOS[c]: int(conteos[c]) for c in presentes},
+        'porcentajes': {NOMBRES_ESTADOS[c]: float(conteos[c] / len(codigos) * 100) for c in presentes},
+        'estadisticas': {NOMBRES_ESTADOS[c]: {metrica: round(float(promedios[metrica][c]), 2)
+                                              for metrica in promedios} for c in presentes},
+    }
+
+
+def capacidad_columnas(columnas):
+    """Capacidad y densidad crítica (como analisis_capacidad), sin pandas
+
+    Raises:
+        ValueError: Si la densidad máxima no supera el último límite de
+            LIMITES_RANGO_DENSIDAD (los rangos no serían crecientes)
+    """
+    densidad, flujo = columnas['Densidad'], columnas['Flujo']
+    i = int(np.argmax(flujo))
+
+    limites = np.array(LIMITES_RANGO_DENSIDAD + [densidad.max() + 0.1])
+    if np.any(np.diff(limites) <= 0):
+        raise ValueError("Los límites de los rangos de densidad deben ser crecientes")
+    # Intervalos (a, b] como pd.cut; la densidad 0 queda fuera
+    rango = np.searchsorted(limites, densidad, side='left')
+    flujo_por_rango = {}
+    for r, etiqueta in enumerate(ETIQUETAS_RANGO_DENSIDAD, start=1):
+        en_rango = flujo[rango == r]
+        if len(en_rango):
+            flujo_por_rango[etiqueta] = {'mean': float(en_rango.mean()), 'count': len(en_rango)}
+
+    return {
+        'capacidad_maxima': float(flujo[i]),
+        'densidad_critica': float(densidad[i]),
+        'velocidad_critica': float(columnas['Velocidad'][i]),
+        'tiempo_critico': _formatear_marca_tiempo(columnas['Tiempo_seg'][i]),
+        'dia_critico': DIAS_SEMANA[int(columnas['Dia_Semana_Num'][i])],
+        'dia_numero_critico': int(columnas['Dia_Numero'][i]),
+        'fecha_critica': str(FECHA_INICIO + timedelta(seconds=float(columnas['Tiempo_Acumulado_seg'][i]))),
+        'flujo_por_rango': flujo_por_rango,
+    }
+
+
+def resumen_nucleo(contenido, tipo='csv', umbrales=None):
+    """Resumen de una exportación usando solo NumPy
+
+    Es el primer resultado que muestra la página: en Pyodide basta con el
+    paquete numpy, sin esperar a que se descarguen pandas ni matplotlib.
+
+    Returns:
+        Diccionario con filas, total_dias, estadisticas, estados y capacidad
+    """
+    columnas = cargar_columnas(contenido, tipo)
+    estados = clasificar_columnas(columnas, umbrales)
+    del estados['codigos']
+    return {
+        'filas': len(columnas['Tiempo_seg']),
+        'total_dias': int(columnas['Dia_Numero'][-1]),
+        'estadisticas': estadisticas_columnas(columnas),
+        'estados': estados,
+        'capacidad': capacidad_columnas(columnas),
+    }
+
+
+def paquetes_pyodide(formato):
+    """Paquetes que Pyodide debe cargar antes de pedir `formato`
+
+    Returns:
+        Tupla (obligatorios, opcionales)
+    """
+    if formato not in PAQUETES_PYODIDE:
+        raise ValueError(f"Formato de salida no soportado: '{formato}'. Use uno de {list(PAQUETES_PYODIDE)}")
+    return PAQUETES_PYODIDE[formato], PAQUETES_OPCIONALES_PYODIDE.get(formato, [])
+
+
+def precargar_dependencias():
+    """Importa de una vez pandas, matplotlib, scipy y seaborn
+
+    Para procesos de larga vida (los workers del servidor), que prefieren
+    pagar las importaciones al arrancar y no en la primera solicitud.
+    """
+    for nombre in ['pandas', 'matplotlib.pyplot', 'scipy.signal']:
+        importlib.import_module(nombre)
+    _seaborn()
+
 
 # Funciones para usar desde JavaScript con Pyodide
-def analizar_csv_web(contenido_csv):
+def _resultado_web(analizador, formato):
+    """Resultado para JavaScript según el formato pedido
+
+    Args:
+        analizador: AnalizadorTraficoFLUVI ya cargado
+        formato: 'datos' (JSON compacto para Chart.js) o 'imagenes' (PNG en base64,
+            solo cuando se pide el reporte estático)
+
+    Si el analizador está instrumentado, el resultado incluye además la
+    clave 'instrumentacion'.
+    """
+    if formato == 'imagenes':
+        resultado = analizador.ejecutar_analisis_completo(['imagenes'])['imagenes']
+    elif formato == 'datos':
+        resultado = analizador.calcular('datos_graficas')['datos_graficas']
+    else:
+        raise ValueError(f"Formato de salida no soportado: '{formato}'. Use 'datos' o 'imagenes'")
+    if 'instrumentacion' in analizador.resultados:
+        resultado = {**resultado, 'instrumentacion': analizador.resultados['instrumentacion']}
+    if formato == 'imagenes':
+        return resultado
+    return json.dumps(resultado, ensure_ascii=False, separators=(',', ':'))
+
+def analizar_csv_web(contenido_csv, umbrales=None, dpi=DPI_IMAGENES, formato='datos',
+                     instrumentar=False, perfilar=None):
     """Función wrapper para llamar desde JavaScript con CSV"""
     import io
     archivo = io.StringIO(contenido_csv)
-    analizador = AnalizadorTraficoFLUVI(archivo, tipo='csv')
-    resultados = analizador.ejecutar_analisis_completo()
-    return resultados['imagenes']
+    analizador = AnalizadorTraficoFLUVI(archivo, tipo='csv', umbrales=umbrales, dpi=dpi,
+                                        instrumentar=instrumentar, perfilar=perfilar)
+    return _resultado_web(analizador, formato)
 
-def analizar_json_web(contenido_json):
+def analizar_json_web(contenido_json, umbrales=None, dpi=DPI_IMAGENES, formato='datos',
+                      instrumentar=False, perfilar=None):
     """Función wrapper para llamar desde JavaScript con JSON"""
-    analizador = AnalizadorTraficoFLUVI(contenido_json, tipo='json')
-    resultados = analizador.ejecutar_analisis_completo()
-    return resultados['imagenes']
+    analizador = AnalizadorTraficoFLUVI(contenido_json, tipo='json', umbrales=umbrales, dpi=dpi,
+                                        instrumentar=instrumentar, perfilar=perfilar)
+    return _resultado_web(analizador, formato)
+
+def analizar_npz_web(contenido_npz, umbrales=None, dpi=DPI_IMAGENES, formato='datos',
+                     instrumentar=False, perfilar=None):
+    """Función wrapper para llamar desde JavaScript con NPZ (bytes)"""
+    analizador = AnalizadorTraficoFLUVI(contenido_npz, tipo='npz', umbrales=umbrales, dpi=dpi,
+                                        instrumentar=instrumentar, perfilar=perfilar)
+    return _resultado_web(analizador, formato)
+
+def analizar_resumen_web(contenido, tipo='csv', umbrales=None):
+    """Función wrapper del resumen NumPy (solo requiere numpy en Pyodide)
+
+    Returns:
+        String JSON de resumen_nucleo
+    """
+    resumen = resumen_nucleo(contenido, tipo, umbrales)
+    return json.dumps(resumen, ensure_ascii=False, separators=(',', ':'))
 
-def analizar_archivo_web(contenido, tipo='csv'):
+def configurar_cache_resultados(max_bytes=CACHE_RESULTADOS_BYTES, directorio=None,
+                                 max_bytes_disco=CACHE_RESULTADOS_DISCO_BYTES):
+    """Reemplaza CACHE_RESULTADOS (por ejemplo, para agregar el nivel en disco)
+
+    Returns:
+        La nueva CacheResultados
+    """
+    global CACHE_RESULTADOS, _ANALIZADOR_RECIENTE
+    CACHE_RESULTADOS = CacheResultados(max_bytes, directorio, max_bytes_disco)
+    _ANALIZADOR_RECIENTE = None
+    return CACHE_RESULTADOS
+
+# Analizador conservado con conservar_analizador=True (la página en Pyodide, entre
+# los datos y el reporte PNG del mismo archivo): (clave, AnalizadorTraficoFLUVI).
+# Queda fuera del presupuesto de CACHE_RESULTADOS, así que solo hay uno y se
+# libera al usarlo sin conservar o al analizar otro archivo
+_ANALIZADOR_RECIENTE = None
+
+def _analizador_web(contenido, tipo, umbrales, dpi, instrumentar, perfilar, clave=None, conservar=False):
+    """AnalizadorTraficoFLUVI para los wrappers web
+
+    Reutiliza el analizador conservado si tiene la misma clave, y guarda el
+    resultante solo si `conservar` es True.
+    """
+    global _ANALIZADOR_RECIENTE
+    reciente, _ANALIZADOR_RECIENTE = _ANALIZADOR_RECIENTE, None
+    if clave is not None and reciente is not None and reciente[0] == clave:
+        analizador = reciente[1]
+    else:
+        reciente = None
+        if tipo not in ('json', 'npz'):
+            contenido, tipo = io.StringIO(contenido), 'csv'
+        analizador = AnalizadorTraficoFLUVI(contenido, tipo=tipo, umbrales=umbrales, dpi=dpi,
+                                            instrumentar=instrumentar, perfilar=perfilar)
+    if conservar and clave is not None:
+        _ANALIZADOR_RECIENTE = (clave, analizador)
+    return analizador
+
+def analizar_archivo_web(contenido, tipo='csv', umbrales=None, dpi=DPI_IMAGENES, formato='datos',
+                         instrumentar=False, perfilar=None, cache=True, conservar_analizador=False):
     """Función wrapper genérica para llamar desde JavaScript
 
     Args:
-        contenido: Contenido del archivo (CSV como string o JSON como string)
-        tipo: 'csv' o 'json'
+        contenido: Contenido del archivo (CSV o JSON como string, NPZ como bytes)
+        tipo: 'csv', 'json' o 'npz'
+        umbrales: Umbrales de clasificación a sobrescribir (opcional)
+        dpi: Resolución de las imágenes (solo formato 'imagenes')
+        formato: 'datos' devuelve un JSON con los datos de las gráficas;
+            'imagenes' genera el reporte estático en PNG
+        instrumentar: Agrega 'instrumentacion' (tiempo, CPU, memoria y filas
+            por etapa) al resultado; 'tiempo' omite la memoria
+        perfilar: Etapa a ejecutar bajo cProfile (implica instrumentar)
+        cache: CacheResultados a usar; True usa CACHE_RESULTADOS y False o
+            None la desactiva. Las solicitudes instrumentadas no la usan,
+            para que los tiempos medidos sean reales
+        conservar_analizador: Conserva el analizador cargado (uno solo, fuera
+            del presupuesto de la caché) para que la siguiente solicitud del
+            mismo archivo, p. ej. las imágenes después de los datos, no lo
+            vuelva a cargar. Lo usa la página en Pyodide
 
     Returns:
-        Diccionario con las imágenes generadas en base64
+        String JSON con los datos de las gráficas, o diccionario con las
+        imágenes generadas en base64
     """
-    if tipo == 'json':
-        return analizar_json_web(contenido)
-    else:
-        return analizar_csv_web(contenido)
+    if cache is True:
+        cache = CACHE_RESULTADOS
+    if not cache or instrumentar or perfilar:
+        return _resultado_web(_analizador_web(contenido, tipo, umbrales, dpi, instrumentar, perfilar), formato)
+
+    # El dpi solo cambia las imágenes; los datos de las gráficas se comparten entre resoluciones
+    huella = huella_contenido(contenido, tipo)
+    umbrales_efectivos = _combinar_umbrales(umbrales)
+    clave = cache.clave(huella, formato=formato, umbrales=umbrales_efectivos,
+                        dpi=dpi if formato == 'imagenes' else None)
+    resultado = cache.obtener(clave)
+    if resultado is None:
+        clave_analizador = cache.clave(huella, umbrales=umbrales_efectivos, dpi=dpi)
+        analizador = _analizador_web(contenido, tipo, umbrales, dpi, False, None, clave_analizador,
+                                     conservar_analizador)
+        resultado = _resultado_web(analizador, formato)
+        cache.guardar(clave, resultado)
+    return resultado
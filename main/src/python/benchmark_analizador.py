@@ -0,0 +1,338 @@
+"""
+Benchmark del analizador de métricas FLUVI
+
+Genera exportaciones sintéticas realistas (CSV con encabezado de 6 líneas y
+pie ESTADISTICAS, o JSON con 'metrics') desde una hora hasta varias semanas
+simuladas, y mide tiempo y memoria pico de cada etapa del analizador. El
+resultado se guarda en JSON para comparar entre versiones.
+
+Uso (CPython, no Pyodide):
+    python benchmark_analizador.py --salida bench_actual.json
+    python benchmark_analizador.py --tamanos 1h 1d --formatos csv --comparar bench_base.json
+    python benchmark_analizador.py --generar 1sem --formatos csv json   # solo escribe las exportaciones
+    python benchmark_analizador.py --verificar-detector 1sem            # picos en línea vs find_peaks
+"""
+
+import argparse
+import gc
+import io
+import json
+import platform
+import sys
+import time
+import tracemalloc
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+import matplotlib
+matplotlib.use('Agg')
+import matplotlib.pyplot as plt
+from scipy import signal
+
+import analizador
+from analizador import AnalizadorTraficoFLUVI, DetectorEventosEnLinea, FECHA_INICIO
+from simulador_ca import exportacion_csv, exportacion_json
+
+# Tamaños de exportación en horas simuladas
+TAMANOS = {'1h': 1, '1d': 24, '1sem': 24 * 7, '4sem': 24 * 28}
+PASO_SEGUNDOS = 10                              # segundos simulados entre mediciones
+INICIO_SEGUNDOS = (FECHA_INICIO.hour * 3600 + FECHA_INICIO.minute * 60
+                   + FECHA_INICIO.second)       # la simulación arranca a las 07:00:10
+UMBRAL_REGRESION = 1.25                          # más lento que esto respecto a la base se reporta
+
+# Etapas medidas sobre un mismo analizador, en orden de dependencias
+ETAPAS_BENCHMARK = ['estadisticas', 'piramide', 'analisis_dias', 'temporal', 'correlaciones',
+                    'capacidad', 'eventos_criticos', 'clustering', 'datos_graficas', 'imagenes']
+
+
+def generar_metricas(horas, paso=PASO_SEGUNDOS, semilla=0):
+    """Series sintéticas con la forma de una corrida real del simulador
+
+    La densidad sigue un perfil diario con horas pico (08:00 y 18:00) y
+    fines de semana más ligeros, con ruido autocorrelacionado; la velocidad
+    cae con la densidad, el flujo usa la misma fórmula que graficas.js
+    (densidad × velocidad × 10), la generación neta es el cambio de
+    población y la entropía es máxima cerca del 50 % de ocupación. El reloj
+    da la vuelta a medianoche, así que hay cambios de día como en una
+    exportación real.
+
+    Args:
+        horas: Horas simuladas
+        paso: Segundos simulados entre mediciones
+        semilla: Semilla del generador aleatorio
+
+    Returns:
+        Diccionario con el formato de 'metrics' del JSON exportado (timestamps
+        como lista de HH:MM:SS y cada métrica como arreglo numpy)
+    """
+    rng = np.random.default_rng(semilla)
+    n = max(int(horas * 3600 / paso), 1)
+    acumulado = INICIO_SEGUNDOS + np.arange(n, dtype=np.int64) * paso
+    segundos = acumulado % 86400
+    hora = segundos / 3600
+    dia_semana = (acumulado // 86400) % 7
+
+    perfil = (25 + 35 * np.exp(-((hora - 8) / 1.5) ** 2) + 30 * np.exp(-((hora - 18) / 2) ** 2)
+              + 10 * np.exp(-((hora - 13) / 2.5) ** 2))
+    perfil = np.where(dia_semana >= 5, perfil * 0.6, perfil)
+
+    # Ruido AR(1): la ocupación no salta de una medición a la siguiente
+    ruido = rng.normal(0, 3, n)
+    for i in range(1, n):
+        ruido[i] += 0.95 * ruido[i - 1]
+    densidad = np.clip(perfil + ruido, 0, 100)
+
+    velocidad = np.clip(100 - 1.1 * densidad + rng.normal(0, 6, n), 0, 100)
+    flujo = densidad / 100 * velocidad / 100 * 10
+    generacion = np.concatenate([[0.0], np.diff(densidad)]) / paso * 5 + rng.normal(0, 0.2, n)
+    ocupacion = densidad / 100
+    entropia = np.clip(3 * np.sqrt(4 * ocupacion * (1 - ocupacion)) + rng.normal(0, 0.15, n), 0, 3)
+
+    return {
+        'timestamps': [f"{s // 3600:02d}:{s % 3600 // 60:02d}:{s % 60:02d}" for s in segundos.tolist()],
+        'density': np.round(densidad, 2),
+        'throughput': np.round(flujo, 2),
+        'netGeneration': np.round(generacion, 2),
+        'speed': np.round(velocidad, 2),
+        'entropy': np.round(entropia, 3),
+    }
+
+
+def exportacion(metricas, formato, paso=PASO_SEGUNDOS):
+    """Texto de la exportación sintética en el formato del navegador ('csv' o 'json')"""
+    if formato == 'csv':
+        return exportacion_csv(metricas, paso)
+    return exportacion_json(metricas, nombre='FLUVI Traffic Simulation (sintética)')
+
+
+def medir(funcion):
+    """Ejecuta `funcion` midiendo tiempo y memoria pico asignada (tracemalloc)
+
+    Returns:
+        Tupla (resultado, segundos, pico en MB)
+    """
+    gc.collect()
+    tracemalloc.start()
+    inicio = time.perf_counter()
+    try:
+        resultado = funcion()
+    finally:
+        segundos = time.perf_counter() - inicio
+        _, pico = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+    return resultado, segundos, pico / 1e6
+
+
+def medir_tamano(contenido, formato, imagenes=True):
+    """Mide carga, detección de días, cada etapa y el wrapper web para una exportación
+
+    Returns:
+        Lista de diccionarios {etapa, segundos, pico_mb}
+    """
+    def abrir():
+        return io.StringIO(contenido) if formato == 'csv' else contenido
+
+    mediciones = []
+
+    def registrar(etapa, funcion):
+        resultado, segundos, pico = medir(funcion)
+        mediciones.append({'etapa': etapa, 'segundos': round(segundos, 5), 'pico_mb': round(pico, 3)})
+        return resultado
+
+    analizador_ = registrar('cargar_datos', lambda: AnalizadorTraficoFLUVI(abrir(), tipo=formato))
+    columnas_base = analizador_.df[['Tiempo_seg']].copy()
+    registrar('_calcular_dias_semana', lambda: analizador_._calcular_dias_semana(columnas_base.copy()))
+
+    for etapa in ETAPAS_BENCHMARK:
+        if etapa == 'imagenes' and not imagenes:
+            continue
+        registrar(etapa, lambda: analizador_.calcular(etapa))
+    plt.close('all')
+
+    web = analizador.analizar_csv_web if formato == 'csv' else analizador.analizar_json_web
+    registrar(f'analizar_{formato}_web', lambda: web(contenido))
+    return mediciones
+
+
+def ejecutar_benchmark(tamanos, formatos, imagenes=True, repeticiones=1, paso=PASO_SEGUNDOS):
+    """Corre el benchmark completo
+
+    Args:
+        tamanos: Claves de TAMANOS
+        formatos: 'csv' y/o 'json'
+        imagenes: Si es False omite la etapa 'imagenes' (la más lenta)
+        repeticiones: Corridas por tamaño; se conserva el menor tiempo y el mayor pico
+        paso: Segundos simulados entre mediciones
+
+    Returns:
+        Diccionario con el entorno y una lista de resultados por tamaño, formato y etapa
+    """
+    resultados = []
+    for tamano in tamanos:
+        if tamano not in TAMANOS:
+            raise ValueError(f"Tamaño desconocido: '{tamano}'. Use uno de {list(TAMANOS)}")
+        metricas = generar_metricas(TAMANOS[tamano], paso)
+        filas = len(metricas['timestamps'])
+        for formato in formatos:
+            contenido = exportacion(metricas, formato, paso)
+            print(f"⏱️  {tamano} ({filas} filas, {formato.upper()}, {len(contenido) / 1e6:.1f} MB)")
+
+            corridas = [medir_tamano(contenido, formato, imagenes) for _ in range(repeticiones)]
+            for i, medicion in enumerate(corridas[0]):
+                medicion = {
+                    'tamano': tamano, 'formato': formato, 'filas': filas, 'etapa': medicion['etapa'],
+                    'segundos': min(c[i]['segundos'] for c in corridas),
+                    'pico_mb': max(c[i]['pico_mb'] for c in corridas),
+                }
+                resultados.append(medicion)
+                print(f"   {medicion['etapa']:<24} {medicion['segundos']:>9.4f} s {medicion['pico_mb']:>10.2f} MB")
+
+    return {
+        'fecha': datetime.now().isoformat(timespec='seconds'),
+        'entorno': {
+            'python': platform.python_version(),
+            'plataforma': platform.platform(),
+            'numpy': np.__version__,
+            'pandas': pd.__version__,
+            'matplotlib': matplotlib.__version__,
+        },
+        'paso_segundos': paso,
+        'repeticiones': repeticiones,
+        'resultados': resultados,
+    }
+
+
+def _picos_desempate_estable(densidad, altura, distancia):
+    """signal.find_peaks(height, distance) con los empates de altura resueltos a favor del índice mayor"""
+    picos, propiedades = signal.find_peaks(densidad, height=altura)
+    alturas = propiedades['peak_heights']
+    conservar = np.ones(len(picos), dtype=bool)
+    for j in np.lexsort((picos, alturas))[::-1]:
+        if conservar[j]:
+            vecinos = np.abs(picos - picos[j]) < distancia
+            vecinos[j] = False
+            conservar[vecinos] = False
+    return picos[conservar]
+
+
+def verificar_detector(horas, particiones=5, semilla=0, paso=PASO_SEGUNDOS):
+    """Compara los picos de DetectorEventosEnLinea con la selección de find_peaks
+
+    La misma serie sintética se entrega completa y partida en lotes de
+    tamaño aleatorio. Todas las corridas deben dar exactamente los picos de
+    find_peaks con los empates resueltos a favor del índice mayor; contra
+    find_peaks tal cual solo se informan las diferencias, que vienen de
+    picos de igual altura (find_peaks los desempata con un argsort no
+    estable) y de las supresiones que cambian por ellos.
+
+    Returns:
+        Diccionario con 'picos', 'iguales' (todas las particiones coinciden
+        con la referencia), 'faltan' y 'sobran' respecto a find_peaks
+    """
+    metricas = generar_metricas(horas, paso, semilla)
+    n = len(metricas['timestamps'])
+    rng = np.random.default_rng(semilla)
+    detector = DetectorEventosEnLinea()
+    densidad = metricas['density']
+
+    def picos_en_linea(cortes):
+        detector = DetectorEventosEnLinea()
+        bordes = np.unique(np.r_[0, cortes, n])
+        eventos = []
+        for inicio, fin in zip(bordes[:-1], bordes[1:]):
+            eventos += detector.agregar({k: v[inicio:fin] for k, v in metricas.items()})
+        eventos += detector.finalizar()
+        return np.array([e['indice'] for e in eventos if e['tipo'] == 'picos_densidad'], dtype=np.int64)
+
+    corridas = [picos_en_linea(np.empty(0, dtype=np.int64))]
+    for _ in range(particiones):
+        corridas.append(picos_en_linea(rng.choice(np.arange(1, n), size=rng.integers(1, 500), replace=False)))
+
+    referencia = _picos_desempate_estable(densidad, detector.altura_pico, detector.distancia_pico)
+    find_peaks, _ = signal.find_peaks(densidad, height=detector.altura_pico, distance=detector.distancia_pico)
+    return {
+        'picos': len(corridas[0]),
+        'iguales': all(np.array_equal(referencia, c) for c in corridas),
+        'faltan': np.setdiff1d(find_peaks, corridas[0]).tolist(),
+        'sobran': np.setdiff1d(corridas[0], find_peaks).tolist(),
+    }
+
+
+def comparar(actual, base, umbral=UMBRAL_REGRESION):
+    """Compara dos resultados de ejecutar_benchmark
+
+    Returns:
+        Lista de regresiones {tamano, formato, etapa, base, actual, razon}
+        donde el tiempo actual supera `umbral` veces el de la base
+    """
+    indice_base = {(r['tamano'], r['formato'], r['etapa']): r for r in base['resultados']}
+    regresiones = []
+    for r in actual['resultados']:
+        anterior = indice_base.get((r['tamano'], r['formato'], r['etapa']))
+        if anterior is None or anterior['segundos'] <= 0:
+            continue
+        razon = r['segundos'] / anterior['segundos']
+        if razon > umbral:
+            regresiones.append({'tamano': r['tamano'], 'formato': r['formato'], 'etapa': r['etapa'],
+                                'base': anterior['segundos'], 'actual': r['segundos'], 'razon': round(razon, 2)})
+    return regresiones
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark del analizador de métricas FLUVI")
+    parser.add_argument("--tamanos", nargs="+", default=list(TAMANOS), choices=list(TAMANOS))
+    parser.add_argument("--formatos", nargs="+", default=['csv', 'json'], choices=['csv', 'json'])
+    parser.add_argument("--paso", type=int, default=PASO_SEGUNDOS, help="Segundos simulados entre mediciones")
+    parser.add_argument("--repeticiones", type=int, default=1)
+    parser.add_argument("--sin-imagenes", action="store_true", help="Omite la etapa de imágenes PNG")
+    parser.add_argument("--salida", default="benchmark_analizador.json", help="Resultados en JSON")
+    parser.add_argument("--comparar", help="JSON de una corrida anterior para detectar regresiones")
+    parser.add_argument("--umbral", type=float, default=UMBRAL_REGRESION,
+                        help=f"Razón de tiempo que cuenta como regresión (por defecto {UMBRAL_REGRESION})")
+    parser.add_argument("--generar", choices=list(TAMANOS),
+                        help="Solo escribe exportaciones sintéticas de ese tamaño y termina")
+    parser.add_argument("--verificar-detector", choices=list(TAMANOS),
+                        help="Compara los picos del detector en línea (lotes aleatorios) con find_peaks y termina")
+    args = parser.parse_args()
+
+    if args.verificar_detector:
+        r = verificar_detector(TAMANOS[args.verificar_detector], paso=args.paso)
+        print(f"📊 {r['picos']} picos; faltan {len(r['faltan'])}, sobran {len(r['sobran'])} respecto a "
+              f"find_peaks (empates de altura)")
+        if not r['iguales']:
+            print("⚠️  El detector en línea depende de la partición en lotes")
+            sys.exit(1)
+        print("✅ Mismos picos con cualquier partición en lotes")
+        return
+
+    if args.generar:
+        metricas = generar_metricas(TAMANOS[args.generar], args.paso)
+        for formato in args.formatos:
+            destino = f"sintetica_{args.generar}.{formato}"
+            with open(destino, 'w', encoding='utf-8') as f:
+                f.write(exportacion(metricas, formato, args.paso))
+            print(f"📄 {destino} ({len(metricas['timestamps'])} filas)")
+        return
+
+    resultado = ejecutar_benchmark(args.tamanos, args.formatos, imagenes=not args.sin_imagenes,
+                                   repeticiones=args.repeticiones, paso=args.paso)
+    with open(args.salida, 'w', encoding='utf-8') as f:
+        json.dump(resultado, f, indent=2, ensure_ascii=False)
+    print(f"\n📊 Resultados: {args.salida}")
+
+    if args.comparar:
+        with open(args.comparar, encoding='utf-8') as f:
+            base = json.load(f)
+        regresiones = comparar(resultado, base, args.umbral)
+        if not regresiones:
+            print(f"✅ Sin regresiones respecto a {args.comparar} (umbral {args.umbral}x)")
+            return
+        print(f"⚠️  {len(regresiones)} regresión(es) respecto a {args.comparar}:")
+        for r in regresiones:
+            print(f"   {r['tamano']} {r['formato']} {r['etapa']}: {r['base']:.4f} s -> {r['actual']:.4f} s ({r['razon']}x)")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
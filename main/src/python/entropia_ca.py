@@ -0,0 +1,238 @@
+"""
+Entropía de Shannon de los vecindarios del autómata celular de FLUVI
+
+Calcula, para instantáneas de ocupación de todas las calles y carriles, el
+histograma de las 8 configuraciones (izquierda, centro, derecha) que usa
+calculateMetrics de graficas.js y su entropía H = -Σ p·log2(p). La
+ocupación se empaqueta en palabras de 64 bits: los vecinos se obtienen
+desplazando las palabras completas y los conteos con popcount, sin recorrer
+celda por celda, así que alcanza para calcularla en cada paso o para
+recalcular por lotes una corrida completa.
+
+Como en el navegador, cada carril es periódico: el vecino izquierdo de la
+primera celda es la última y viceversa.
+
+Uso (CPython):
+    python entropia_ca.py ocupacion.npz --salida entropia_por_paso.csv
+"""
+
+import argparse
+import sys
+
+import numpy as np
+
+PATRONES_VECINDARIO = 8          # índice = izquierda*4 + centro*2 + derecha
+BITS_PALABRA = 64
+TAM_BLOQUE_INSTANTANEAS = 4096   # instantáneas por bloque en el cálculo por lotes
+
+# np.bitwise_count existe desde NumPy 2.0; Pyodide 0.25 trae NumPy 1.26
+POPCOUNT_NATIVO = hasattr(np, 'bitwise_count')
+_BITS_POR_BYTE = np.unpackbits(np.arange(256, dtype=np.uint8)[:, None], axis=1).sum(axis=1).astype(np.int64)
+
+_UNO = np.uint64(1)
+_ULTIMO_BIT = np.uint64(BITS_PALABRA - 1)
+
+
+def _popcount(palabras):
+    """Bits encendidos por fila (suma sobre el último eje)"""
+    if POPCOUNT_NATIVO:
+        return np.bitwise_count(palabras).sum(axis=-1, dtype=np.int64)
+    bytes_ = palabras.view(np.uint8)
+    return _BITS_POR_BYTE[bytes_].sum(axis=-1)
+
+
+def entropia_de_histograma(conteo, total=None):
+    """Entropía de Shannon (bits) de uno o varios histogramas
+
+    Args:
+        conteo: Arreglo (..., 8) de conteos
+        total: Celdas totales (por defecto, la suma del histograma)
+
+    Returns:
+        float o arreglo con una entropía por histograma
+    """
+    conteo = np.asarray(conteo, dtype=np.float64)
+    total = conteo.sum(axis=-1, keepdims=True) if total is None else total
+    with np.errstate(invalid='ignore', divide='ignore'):
+        p = conteo / total
+        terminos = np.where(p > 0, p * np.log2(np.where(p > 0, p, 1)), 0.0)
+    entropia = np.maximum(-terminos.sum(axis=-1), 0.0)
+    return float(entropia) if entropia.ndim == 0 else entropia
+
+
+class EntropiaVecindarios:
+    """Histograma de vecindarios y entropía sobre ocupación empaquetada en bits
+
+    La ocupación es un arreglo plano con los carriles uno tras otro (el
+    mismo orden que SimuladorCA.celdas). El ancho de cada carril y las
+    celdas que cuentan para la métrica se fijan una vez; después cada
+    instantánea cuesta unas cuantas operaciones sobre n/64 palabras.
+    """
+
+    def __init__(self, longitudes_carril, incluidas=None):
+        """
+        Args:
+            longitudes_carril: Número de celdas de cada carril, en orden
+            incluidas: Máscara booleana de celdas que cuentan (None = todas)
+
+        Raises:
+            ValueError: Si no hay carriles, alguno está vacío o la máscara no
+                coincide con el número de celdas
+        """
+        longitudes = np.asarray(longitudes_carril, dtype=np.int64)
+        if not longitudes.size or (longitudes < 1).any():
+            raise ValueError("Se necesita al menos un carril y todos con una celda o más")
+        self.n_celdas = int(longitudes.sum())
+        self.n_palabras = -(-self.n_celdas // BITS_PALABRA)
+        self._inicios = np.concatenate([[0], np.cumsum(longitudes)[:-1]])
+        self._fines = self._inicios + longitudes - 1
+
+        if incluidas is None:
+            incluidas = np.ones(self.n_celdas, dtype=bool)
+        incluidas = np.asarray(incluidas, dtype=bool)
+        if incluidas.shape != (self.n_celdas,):
+            raise ValueError(f"La máscara de celdas incluidas debe tener {self.n_celdas} elementos")
+        self.total_celdas = int(incluidas.sum())
+        self._validas = self.empaquetar(incluidas)
+
+        # Bits de frontera: se borran del desplazamiento y se reponen con el otro extremo del carril
+        self._sin_inicios = ~self.empaquetar(np.isin(np.arange(self.n_celdas), self._inicios))
+        self._sin_fines = ~self.empaquetar(np.isin(np.arange(self.n_celdas), self._fines))
+        self._colocar_inicios = self._preparar_colocacion(self._inicios)
+        self._colocar_fines = self._preparar_colocacion(self._fines)
+
+    def _preparar_colocacion(self, celdas):
+        """Orden y grupos para escribir un bit por carril en palabras compartidas"""
+        orden = np.argsort(celdas, kind='stable')
+        palabra = celdas[orden] // BITS_PALABRA
+        grupos = np.flatnonzero(np.r_[True, palabra[1:] != palabra[:-1]])
+        desplazamiento = (celdas[orden] % BITS_PALABRA).astype(np.uint64)
+        return orden, palabra[grupos], grupos, desplazamiento
+
+    def _colocar(self, bits, colocacion):
+        """Palabras (..., n_palabras) con `bits[..., k]` en la celda k de la colocación"""
+        orden, palabras, grupos, desplazamiento = colocacion
+        valores = bits[..., orden] << desplazamiento
+        # Cada celda ocupa un bit distinto de su palabra: sumar equivale a OR
+        salida = np.zeros(bits.shape[:-1] + (self.n_palabras,), dtype=np.uint64)
+        salida[..., palabras] = np.add.reduceat(valores, grupos, axis=-1)
+        return salida
+
+    @staticmethod
+    def _bits(palabras, celdas):
+        """Bit de ocupación de `celdas` como uint64 0/1"""
+        return (palabras[..., celdas // BITS_PALABRA] >> (celdas % BITS_PALABRA).astype(np.uint64)) & _UNO
+
+    def empaquetar(self, ocupacion):
+        """Ocupación booleana (..., n_celdas) a palabras uint64 (..., n_palabras)"""
+        ocupacion = np.asarray(ocupacion)
+        if ocupacion.shape[-1] != self.n_celdas:
+            raise ValueError(f"Se esperaban {self.n_celdas} celdas por instantánea, no {ocupacion.shape[-1]}")
+        return self.desde_bytes(np.packbits(ocupacion != 0, axis=-1, bitorder='little'))
+
+    def desde_bytes(self, bytes_):
+        """Bytes de np.packbits(..., bitorder='little') a palabras uint64"""
+        bytes_ = np.asarray(bytes_, dtype=np.uint8)
+        faltan = self.n_palabras * 8 - bytes_.shape[-1]
+        if faltan < 0:
+            raise ValueError("Las instantáneas empaquetadas tienen más celdas que el mapa")
+        if faltan:
+            bytes_ = np.concatenate([bytes_, np.zeros(bytes_.shape[:-1] + (faltan,), dtype=np.uint8)], axis=-1)
+        return np.ascontiguousarray(bytes_).view('<u8').astype(np.uint64, copy=False)
+
+    def histograma(self, palabras):
+        """Conteo de las 8 configuraciones de vecindario
+
+        Args:
+            palabras: Ocupación empaquetada (..., n_palabras) de empaquetar()
+
+        Returns:
+            Arreglo int64 (..., 8) indexado por izquierda*4 + centro*2 + derecha
+        """
+        centro = palabras
+        izquierda = centro << _UNO
+        izquierda[..., 1:] |= centro[..., :-1] >> _ULTIMO_BIT
+        derecha = centro >> _UNO
+        derecha[..., :-1] |= centro[..., 1:] << _ULTIMO_BIT
+
+        izquierda &= self._sin_inicios
+        izquierda |= self._colocar(self._bits(centro, self._fines), self._colocar_inicios)
+        derecha &= self._sin_fines
+        derecha |= self._colocar(self._bits(centro, self._inicios), self._colocar_fines)
+
+        conteo = np.empty(palabras.shape[:-1] + (PATRONES_VECINDARIO,), dtype=np.int64)
+        for bit_izq, vecino_izq in ((0, ~izquierda), (1, izquierda)):
+            for bit_centro, celda in ((0, ~centro), (1, centro)):
+                par = vecino_izq & celda & self._validas
+                conteo[..., bit_izq * 4 + bit_centro * 2] = _popcount(par & ~derecha)
+                conteo[..., bit_izq * 4 + bit_centro * 2 + 1] = _popcount(par & derecha)
+        return conteo
+
+    def entropia(self, ocupacion):
+        """Entropía (bits) de una instantánea booleana de n_celdas"""
+        if not self.total_celdas:
+            return 0.0
+        return entropia_de_histograma(self.histograma(self.empaquetar(ocupacion)), self.total_celdas)
+
+    def entropia_lote(self, instantaneas, empaquetadas=False, tam_bloque=TAM_BLOQUE_INSTANTANEAS):
+        """Entropía de muchas instantáneas, por bloques para acotar la memoria
+
+        Args:
+            instantaneas: (T, n_celdas) booleano, o (T, bytes) de np.packbits
+                con bitorder='little' si `empaquetadas` es True
+            empaquetadas: Indica el formato de `instantaneas`
+            tam_bloque: Instantáneas por bloque
+
+        Returns:
+            Tupla (entropías (T,), histogramas (T, 8))
+        """
+        total = len(instantaneas)
+        entropias = np.zeros(total)
+        histogramas = np.zeros((total, PATRONES_VECINDARIO), dtype=np.int64)
+        for inicio in range(0, total, tam_bloque):
+            bloque = instantaneas[inicio:inicio + tam_bloque]
+            palabras = self.desde_bytes(bloque) if empaquetadas else self.empaquetar(bloque)
+            histogramas[inicio:inicio + len(bloque)] = self.histograma(palabras)
+        if self.total_celdas:
+            entropias[:] = entropia_de_histograma(histogramas, self.total_celdas)
+        return entropias, histogramas
+
+
+def entropia_desde_archivo(ruta, tam_bloque=TAM_BLOQUE_INSTANTANEAS):
+    """Recalcula la entropía de cada paso de una corrida guardada por SimuladorCA.guardar_ocupacion
+
+    Returns:
+        Diccionario con 'pasos', 'entropia' e 'histogramas'
+    """
+    with np.load(ruta) as datos:
+        incluidas = datos['incluidas'] if datos['incluidas'].size else None
+        calculadora = EntropiaVecindarios(datos['longitudes_carril'], incluidas)
+        entropias, histogramas = calculadora.entropia_lote(datos['ocupacion'], empaquetadas=True,
+                                                           tam_bloque=tam_bloque)
+        pasos = datos['pasos']
+    return {'pasos': pasos, 'entropia': entropias, 'histogramas': histogramas}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Entropía por paso de una corrida headless de FLUVI")
+    parser.add_argument("ocupacion", help="Instantáneas guardadas con simulador_ca.py --ocupacion (.npz)")
+    parser.add_argument("--salida", default="entropia_por_paso.csv", help="CSV con paso, entropía e histograma")
+    args = parser.parse_args()
+
+    try:
+        resultado = entropia_desde_archivo(args.ocupacion)
+    except (ValueError, KeyError, OSError) as e:
+        print(f"\nERROR: {e}")
+        sys.exit(1)
+
+    columnas = ['paso', 'entropia'] + [f"n_{p:03b}" for p in range(PATRONES_VECINDARIO)]
+    tabla = np.column_stack([resultado['pasos'], resultado['entropia'], resultado['histogramas']])
+    np.savetxt(args.salida, tabla, delimiter=',', header=','.join(columnas), comments='',
+               fmt=['%d', '%.6f'] + ['%d'] * PATRONES_VECINDARIO)
+    entropia = resultado['entropia']
+    print(f"📊 {len(entropia)} pasos: entropía media {entropia.mean():.3f} bits "
+          f"(mín {entropia.min():.3f}, máx {entropia.max():.3f}) -> {args.salida}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,749 @@
+"""
+Motor headless del autómata celular de FLUVI
+
+Reproduce en NumPy el paso de simulación de trafico.js (generación en
+calles GENERADOR, transferencia por conexiones, cambio de carril, regla 184
+modificada y calles DEVORADOR) sin navegador ni render, y escribe la misma
+exportación de métricas (CSV o JSON) que lee AnalizadorTraficoFLUVI.
+
+Todas las celdas de todas las calles viven en un solo arreglo plano: cada
+carril es un tramo contiguo, así que cada regla se aplica al mapa completo
+con unas cuantas operaciones vectorizadas en lugar de recorrer celda por
+celda.
+
+Entrada: la simulación guardada desde el constructor (guardarSimulacion:
+calles, conexiones y configuracionTiempo) y, opcionalmente, un escenario de
+escenarios.js cuyas celdas bloqueadas se marcan con 7. Los estacionamientos
+de edificios no se simulan.
+
+Uso (CPython, no Pyodide):
+    python simulador_ca.py mapa.json --horas 168 --salida semana.csv
+    python simulador_ca.py mapa.json --escenario inundacion.json --pasos 50000 --semilla 7 --salida corrida.json
+"""
+
+import argparse
+import json
+import math
+import sys
+import time
+from datetime import datetime
+
+import numpy as np
+
+from entropia_ca import EntropiaVecindarios
+
+# Parámetros del simulador del navegador (trafico.js, tiempo.js, graficas.js)
+SEGUNDOS_POR_PASO = 2.0                 # tiempo simulado por paso
+INTERVALO_METRICAS = 10                 # pasos entre mediciones (METRICS_UPDATE_INTERVAL de escritorio)
+INTERVALO_ENTROPIA = 60                 # cadencia del navegador para la entropía (ENTROPY_UPDATE_INTERVAL)
+FACTOR_ESCALA_FLUJO = 10                # temporalScaleFactor de calculateMetrics
+OCUPACION_INICIAL_GENERADOR = 0.1       # fracción de celdas ocupadas al crear un GENERADOR
+PROBABILIDAD_CAMBIO_OBSTRUCCION = 0.30  # cambio de carril con un bloqueo cerca
+DISTANCIA_OBSTRUCCION = 3               # celdas que se revisan adelante buscando bloqueos
+TIPOS_VEHICULO = 6                      # los vehículos son 1-6
+BLOQUEO = 7                             # celda bloqueada (escenarios)
+
+TIPOS_CALLE = ('generador', 'conexion', 'devorador')
+TIPOS_CONEXION = ('LINEAL', 'INCORPORACION', 'PROBABILISTICA')
+
+# 0 = Domingo, como configuracionTiempo.diaActual
+NOMBRES_DIAS = ['Domingo', 'Lunes', 'Martes', 'Miércoles', 'Jueves', 'Viernes', 'Sábado']
+INICIO_RELOJ = {'diaActual': 1, 'horaActual': 7, 'minutoActual': 0, 'segundoActual': 0}
+
+# Multiplicadores de generación por día y hora (MULTIPLICADORES_POR_DIA_HORA de tiempo.js)
+MULTIPLICADORES_POR_DIA_HORA = {
+    0: [0.0, 0.0, 0.1, 0.2, 0.2, 0.2, 0.2, 0.2, 0.3, 0.3, 0.4, 0.6,
+        0.6, 0.7, 0.7, 0.7, 0.7, 0.6, 0.6, 0.5, 0.2, 0.1, 0.0, 0.0],
+    1: [0.0, 0.05, 0.08, 0.1, 0.2, 0.1, 0.4, 1.2, 1.4, 1.0, 0.6, 0.7,
+        0.9, 1.0, 0.9, 0.8, 0.8, 1.1, 1.4, 1.3, 1.1, 0.4, 0.2, 0.0],
+    2: [0.0, 0.05, 0.08, 0.2, 0.2, 0.2, 0.4, 1.2, 1.4, 1.0, 0.7, 0.7,
+        0.9, 1.0, 0.9, 0.8, 0.8, 1.1, 1.5, 1.3, 1.1, 0.2, 0.1, 0.0],
+    3: [0.0, 0.05, 0.08, 0.1, 0.2, 0.1, 0.4, 1.3, 1.5, 1.0, 0.5, 0.7,
+        0.9, 1.1, 1.0, 0.8, 0.9, 1.2, 1.5, 1.4, 1.2, 0.3, 0.2, 0.0],
+    4: [0.0, 0.05, 0.08, 0.2, 0.2, 0.2, 0.4, 1.3, 1.5, 1.0, 0.7, 0.7,
+        0.9, 1.1, 1.0, 0.8, 1.0, 1.3, 1.6, 1.5, 1.0, 0.2, 0.1, 0.0],
+    5: [0.0, 0.1, 0.1, 0.1, 0.2, 0.3, 0.5, 1.5, 1.8, 1.3, 0.8, 0.8,
+        1.0, 1.2, 1.1, 0.9, 1.7, 2.1, 3.0, 2.5, 1.0, 0.5, 0.2, 0.0],
+    6: [0.0, 0.1, 0.2, 0.3, 0.3, 0.3, 0.3, 0.3, 0.4, 0.5, 0.8, 0.9,
+        1.0, 1.2, 1.3, 1.3, 1.2, 1.1, 1.0, 0.9, 0.5, 0.1, 0.1, 0.0],
+}
+
+# Formato de exportación de graficas.js (descargarMetricasCSV / descargarMetricasJSON)
+ENCABEZADO_CSV = ('Marca de Tiempo,Densidad (%),Flujo (veh/s),Generacion Neta (veh/s),'
+                  'Velocidad (% movimiento),Entropia (bits)')
+NOMBRES_ESTADISTICAS_CSV = {
+    'density': 'Densidad (%)',
+    'throughput': 'Flujo (veh/s)',
+    'netGeneration': 'Generacion Neta (veh/s)',
+    'speed': 'Velocidad (% movimiento)',
+    'entropy': 'Entropia (bits)',
+}
+DESCRIPCION_METRICAS = {
+    'density': 'Porcentaje de celdas ocupadas',
+    'throughput': 'Flujo vehicular real (Q = Densidad × Velocidad) en veh/s',
+    'netGeneration': 'Tasa de cambio neta de población vehicular en veh/s',
+    'speed': 'Porcentaje de vehículos en movimiento',
+    'entropy': ('Entropía de Shannon del autómata celular en bits (mide diversidad de las 8 '
+                'transiciones basadas en vecindario de 3 celdas: 000, 001, 010, 011, 100, 101, '
+                '110, 111 con estado binario 0=vacío, 1=carro)'),
+}
+
+
+def _numero_js(valor):
+    """Formatea un número como lo imprime JavaScript (12.0 -> '12')"""
+    texto = repr(float(valor))
+    return texto[:-2] if texto.endswith('.0') else texto
+
+
+def exportacion_csv(metricas, segundos_por_paso=SEGUNDOS_POR_PASO, tiempo_virtual=None, perfiles=True):
+    """Texto CSV con el formato de descargarMetricasCSV
+
+    Args:
+        metricas: Diccionario con el formato de 'metrics' del JSON exportado
+        segundos_por_paso: Valor de la línea 'Tiempo por Paso'
+        tiempo_virtual: Texto de la línea 'Tiempo Virtual' (por defecto, la última marca de tiempo)
+        perfiles: Si los perfiles dinámicos estaban activos
+
+    Returns:
+        Texto con el encabezado de 6 líneas, las mediciones y el pie ESTADISTICAS
+    """
+    n = len(metricas['timestamps'])
+    lineas = [
+        'FLUVI - Simulador de Trafico - Exportacion de Metricas',
+        f"Tiempo Virtual: {tiempo_virtual or (metricas['timestamps'][-1] if n else '')}",
+        f"Perfiles Dinamicos Activos: {'Si' if perfiles else 'No'}",
+        f'Tiempo por Paso: {_numero_js(segundos_por_paso)} segundo(s) simulados',
+        f'Total de Mediciones: {n}',
+        '',
+        ENCABEZADO_CSV,
+    ]
+    columnas = [[_numero_js(v) for v in np.asarray(metricas[clave], dtype=np.float64).tolist()]
+                for clave in NOMBRES_ESTADISTICAS_CSV]
+    lineas.extend(','.join(fila) for fila in zip(metricas['timestamps'], *columnas))
+    lineas += ['', 'ESTADISTICAS', 'Metrica,Promedio,Minimo,Maximo']
+    for clave, nombre in NOMBRES_ESTADISTICAS_CSV.items():
+        estadisticas = _estadisticas_exportacion(metricas[clave])
+        lineas.append(f"{nombre},{estadisticas['avg']},{estadisticas['min']},{estadisticas['max']}")
+    return '\n'.join(lineas) + '\n'
+
+
+def exportacion_json(metricas, tiempo_virtual=None, nombre='FLUVI Traffic Simulation'):
+    """Texto JSON con el formato de descargarMetricasJSON (metadata, metrics y statistics)
+
+    Args:
+        metricas: Diccionario con el formato de 'metrics' del JSON exportado
+        tiempo_virtual: Diccionario 'virtualTime' de la metadata (opcional)
+        nombre: Valor de 'simulationName'
+    """
+    metadata = {
+        'version': '2.2',
+        'exportDate': datetime.now().isoformat(),
+        'simulationName': nombre,
+        'totalDataPoints': len(metricas['timestamps']),
+        'metricsDescription': DESCRIPCION_METRICAS,
+    }
+    if tiempo_virtual:
+        metadata['virtualTime'] = tiempo_virtual
+    datos = {
+        'metadata': metadata,
+        'metrics': {clave: (list(valores) if clave == 'timestamps'
+                            else np.asarray(valores, dtype=np.float64).tolist())
+                    for clave, valores in metricas.items()},
+        'statistics': {clave: _estadisticas_exportacion(metricas[clave]) for clave in NOMBRES_ESTADISTICAS_CSV},
+    }
+    return json.dumps(datos, ensure_ascii=False)
+
+
+def _estadisticas_exportacion(valores):
+    """Promedio, mínimo y máximo con dos decimales, como calcularEstadisticas de graficas.js"""
+    valores = np.asarray(valores, dtype=np.float64)
+    if not valores.size:
+        return {'avg': 0, 'min': 0, 'max': 0}
+    return {'avg': f"{valores.mean():.2f}", 'min': f"{valores.min():.2f}", 'max': f"{valores.max():.2f}"}
+
+
+def _es_vehiculo(celdas):
+    """Máscara de celdas con vehículo (1-6); el 0 da la vuelta a 255 como uint8"""
+    return (celdas.view(np.uint8) - np.uint8(1)) < TIPOS_VEHICULO
+
+
+def _leer_json(fuente):
+    """Acepta un diccionario ya cargado o la ruta de un archivo JSON"""
+    if isinstance(fuente, dict):
+        return fuente
+    with open(fuente, encoding='utf-8') as f:
+        return json.load(f)
+
+
+class SimuladorCA:
+    """Simulación de un mapa FLUVI sin navegador
+
+    El estado es `celdas` (int8: 0 vacía, 1-6 tipo de vehículo, 7 bloqueo)
+    y `esperando` (bool), ambos planos. `calle(nombre)` devuelve una vista
+    (carriles, tamano) de una calle sin copiar. Con la misma semilla dos
+    corridas producen exactamente las mismas métricas.
+    """
+
+    def __init__(self, mapa, escenario=None, semilla=None, usar_perfiles=None,
+                 segundos_por_paso=SEGUNDOS_POR_PASO, calles_excluidas=(), entropia_navegador=False,
+                 registrar_ocupacion=False):
+        """
+        Args:
+            mapa: Simulación guardada (diccionario o ruta al JSON de guardarSimulacion)
+            escenario: Escenario de escenarios.js con celdasBloqueadas (diccionario o ruta)
+            semilla: Semilla del generador aleatorio (None = no reproducible)
+            usar_perfiles: Aplica los multiplicadores por día y hora; por defecto
+                lo que diga configuracionTiempo del mapa (o True)
+            segundos_por_paso: Tiempo simulado que avanza cada paso
+            calles_excluidas: Nombres de calles que no cuentan en las métricas
+            entropia_navegador: Si es True la entropía se recalcula cada
+                INTERVALO_ENTROPIA pasos contra la instantánea anterior, como
+                graficas.js; por defecto cada medición usa los vecindarios del
+                último paso
+            registrar_ocupacion: Guarda la ocupación empaquetada de cada paso
+                para recalcular la entropía por paso (ver guardar_ocupacion)
+
+        Raises:
+            ValueError: Si el mapa no tiene calles, si una calle o conexión es
+                inválida, o si el escenario no corresponde al mapa
+        """
+        mapa = _leer_json(mapa)
+        calles = mapa.get('calles') or []
+        if not calles:
+            raise ValueError("El mapa no contiene calles")
+
+        self.rng = np.random.default_rng(semilla)
+        self.segundos_por_paso = float(segundos_por_paso)
+        self._construir_calles(calles)
+        self._construir_conexiones(mapa.get('conexiones') or [])
+        self._construir_cambio_carril()
+        self._configurar_reloj(mapa.get('configuracionTiempo'), usar_perfiles)
+        if escenario is not None:
+            self.aplicar_escenario(escenario)
+
+        incluida = ~np.isin(self._calle_de, [self._indice_calle[n] for n in calles_excluidas
+                                              if n in self._indice_calle])
+        self._celdas_metricas = None if incluida.all() else np.flatnonzero(incluida)
+        self._incluidas = None if incluida.all() else incluida
+        self._vecindarios = EntropiaVecindarios(np.repeat(self._tamanos, self._carriles), self._incluidas)
+        self.entropia_navegador = entropia_navegador
+
+        self.pasos = 0
+        self._ocupacion_entropia = None
+        self._registro_ocupacion = [] if registrar_ocupacion else None
+        self._entropia = 0.0
+        self._autos_previos = None
+        self._mediciones = {clave: [] for clave in ['timestamps', 'density', 'throughput',
+                                                      'netGeneration', 'speed', 'entropy']}
+
+    # ------------------------------------------------------------------ carga
+
+    def _construir_calles(self, calles):
+        """Distribuye los carriles de todas las calles en un arreglo plano"""
+        self.nombres = [c['nombre'] for c in calles]
+        self._indice_calle = {nombre: i for i, nombre in enumerate(self.nombres)}
+        tamanos = np.array([int(c['tamano']) for c in calles], dtype=np.int64)
+        carriles = np.array([int(c.get('carriles', 1)) for c in calles], dtype=np.int64)
+        tipos = [str(c.get('tipo', 'conexion')).lower() for c in calles]
+        for calle, tamano, n_carriles, tipo in zip(calles, tamanos, carriles, tipos):
+            if tamano < 1 or n_carriles < 1:
+                raise ValueError(f"Calle '{calle['nombre']}' con tamaño o carriles inválidos")
+            if tipo not in TIPOS_CALLE:
+                raise ValueError(f"Calle '{calle['nombre']}' con tipo desconocido: '{tipo}'")
+
+        self._tamanos, self._carriles = tamanos, carriles
+        self._inicio_calle = np.concatenate([[0], np.cumsum(tamanos * carriles)])
+        n = int(self._inicio_calle[-1])
+
+        self._calle_de = np.repeat(np.arange(len(calles)), tamanos * carriles)
+        self._tam = tamanos[self._calle_de]
+        relativo = np.arange(n) - self._inicio_calle[self._calle_de]
+        self._pos = relativo % self._tam
+        self._carril = relativo // self._tam
+        self._n_carriles = carriles[self._calle_de]
+
+        inicio_carril = self._pos == 0
+        fin_carril = self._pos == self._tam - 1
+        self._inicios_carril = np.flatnonzero(inicio_carril)
+        self._fines_carril = np.flatnonzero(fin_carril)
+        indices = np.arange(n)
+        # Vecino de adelante con frontera periódica dentro de cada carril (como calculateMetrics)
+        self._siguiente = np.where(fin_carril, indices - self._tam + 1, indices + 1)
+
+        self.celdas = np.zeros(n, dtype=np.int8)
+        self.esperando = np.zeros(n, dtype=bool)
+
+        es_generador = np.array([t == 'generador' for t in tipos])
+        es_devorador = np.array([t == 'devorador' for t in tipos])
+        self._fines_devorador = self._fines_carril[es_devorador[self._calle_de[self._fines_carril]]]
+        self._inicios_generador = self._inicios_carril[es_generador[self._calle_de[self._inicios_carril]]]
+        probabilidades = np.array([float(c.get('probabilidadGeneracion') or 0) for c in calles])
+        self._p_generacion = probabilidades[self._calle_de[self._inicios_generador]]
+
+        celdas_generador = es_generador[self._calle_de]
+        self.celdas[celdas_generador] = (self.rng.random(int(celdas_generador.sum()))
+                                         < OCUPACION_INICIAL_GENERADOR)
+        self._p_salto_calle = np.array([float(c.get('probabilidadSaltoDeCarril') or 0) for c in calles])
+
+    def _construir_conexiones(self, conexiones):
+        """Traduce las conexiones a índices planos agrupados en rondas sin celdas compartidas
+
+        En el navegador las conexiones se procesan una tras otra. Dos
+        conexiones solo interactúan si tocan la misma celda (origen o
+        destino); las que no comparten ninguna conmutan. Cada conexión va en
+        la ronda siguiente a la última que tocó alguna de sus celdas, así una
+        ronda completa se aplica con operaciones vectorizadas y el resultado
+        es el mismo que el recorrido secuencial.
+        """
+        origenes, destinos, probabilidades, probabilisticas = [], [], [], []
+        for conexion in conexiones:
+            tipo = str(conexion.get('tipo', 'LINEAL')).upper()
+            if tipo not in TIPOS_CONEXION:
+                raise ValueError(f"Tipo de conexión desconocido: '{conexion.get('tipo')}'")
+            origen, destino = conexion.get('origenIdx'), conexion.get('destinoIdx')
+            if not (0 <= origen < len(self.nombres) and 0 <= destino < len(self.nombres)):
+                continue    # el navegador también omite conexiones cuyas calles no existen
+            for detalle in conexion.get('detalles') or []:
+                pos_origen = detalle.get('posOrigen', -1)
+                pos_origen = self._tamanos[origen] - 1 if pos_origen == -1 else pos_origen
+                origenes.append(self._celda(origen, detalle['carrilOrigen'], pos_origen))
+                destinos.append(self._celda(destino, detalle['carrilDestino'], detalle.get('posDestino', 0)))
+                probabilidad = detalle.get('probabilidad')
+                probabilidades.append(1.0 if probabilidad is None else float(probabilidad))
+                probabilisticas.append(tipo == 'PROBABILISTICA')
+
+        self.n_conexiones = len(origenes)
+        origenes, destinos = np.array(origenes, dtype=np.int64), np.array(destinos, dtype=np.int64)
+        probabilidades, probabilisticas = np.array(probabilidades), np.array(probabilisticas, dtype=bool)
+
+        ronda = np.zeros(self.n_conexiones, dtype=np.int64)
+        ultima_ronda = {}
+        for k, (origen, destino) in enumerate(zip(origenes.tolist(), destinos.tolist())):
+            ronda[k] = max(ultima_ronda.get(origen, -1), ultima_ronda.get(destino, -1)) + 1
+            ultima_ronda[origen] = ultima_ronda[destino] = ronda[k]
+        self._rondas = []
+        for r in range(int(ronda.max()) + 1 if self.n_conexiones else 0):
+            sel = ronda == r
+            self._rondas.append((origenes[sel], destinos[sel], probabilidades[sel],
+                                 probabilisticas[sel], bool(probabilisticas[sel].any())))
+
+        # Un vehículo en el origen de una conexión no probabilística (o en una
+        # calle de una sola celda) no avanza por la regla CA
+        self._retenida = self._tam <= 1
+        self._retenida[origenes[~probabilisticas]] = True
+
+    def _celda(self, calle, carril, posicion):
+        """Índice plano de (calle, carril, posición)"""
+        if not (0 <= carril < self._carriles[calle] and 0 <= posicion < self._tamanos[calle]):
+            raise ValueError(f"Celda fuera de la calle '{self.nombres[calle]}': carril {carril}, posición {posicion}")
+        return int(self._inicio_calle[calle] + carril * self._tamanos[calle] + posicion)
+
+    def _construir_cambio_carril(self):
+        """Celdas donde puede iniciar un cambio de carril y sus destinos diagonales"""
+        interior = (self._pos >= 1) & (self._pos <= self._tam - 2)
+        self._puede_cambiar = interior & (self._n_carriles > 1) & (self._p_salto_calle[self._calle_de] > 0)
+        indices = np.arange(len(self.celdas))
+        self._destino_arriba = np.where(self._carril > 0, indices - self._tam + 1, -1)
+        self._destino_abajo = np.where(self._carril < self._n_carriles - 1, indices + self._tam + 1, -1)
+        self._carriles_cambio = np.unique(self._carril[self._puede_cambiar])
+        # Marcas temporales reutilizadas en cada paso (se limpian al terminar)
+        self._reservado = np.zeros(len(self.celdas), dtype=bool)
+        self._sube = np.zeros(len(self.celdas), dtype=bool)
+        # Un bloqueo solo sale de su celda por una conexión (se transfiere como un vehículo)
+        # o al final de un devorador
+        self._salidas_bloqueo = np.unique(np.concatenate([ronda[0] for ronda in self._rondas]
+                                                         + [self._fines_devorador]))
+        self._probabilidad_salto()
+
+    def _probabilidad_salto(self):
+        """Probabilidad de cambio de carril de cada celda según los bloqueos actuales
+
+        Una celda con un bloqueo a DISTANCIA_OBSTRUCCION o menos, adelante en
+        el mismo carril, usa PROBABILIDAD_CAMBIO_OBSTRUCCION. Se recalcula al
+        aplicar un escenario o cuando un bloqueo deja una de _salidas_bloqueo,
+        no en cada paso.
+        """
+        self._p_salto = self._p_salto_calle[self._calle_de]
+        bloqueos = np.flatnonzero(self.celdas == BLOQUEO)
+        if bloqueos.size:
+            cerca = np.concatenate([bloqueos[self._pos[bloqueos] >= k] - k
+                                    for k in range(1, DISTANCIA_OBSTRUCCION + 1)])
+            self._p_salto[cerca] = PROBABILIDAD_CAMBIO_OBSTRUCCION
+        en_salida = self.celdas[self._salidas_bloqueo] == BLOQUEO
+        # Sin bloqueos en las salidas ninguno puede moverse y no hace falta vigilarlas
+        self._bloqueos_en_salida = en_salida if en_salida.any() else None
+
+    def _configurar_reloj(self, configuracion, usar_perfiles):
+        """Reloj virtual y multiplicadores de tiempo.js"""
+        configuracion = configuracion or {}
+        reloj = {clave: configuracion.get(clave) or valor for clave, valor in INICIO_RELOJ.items()}
+        self.dia = int(reloj['diaActual']) % 7
+        self.segundo_del_dia = (int(reloj['horaActual']) * 3600 + int(reloj['minutoActual']) * 60
+                                + float(reloj['segundoActual']))
+        if usar_perfiles is None:
+            usar_perfiles = configuracion.get('usarPerfiles', True)
+        self.usar_perfiles = bool(usar_perfiles)
+
+        self.multiplicadores = {dia: list(valores) for dia, valores in MULTIPLICADORES_POR_DIA_HORA.items()}
+        for dia, valores in (configuracion.get('multiplicadoresPorDiaHora') or {}).items():
+            if isinstance(valores, list) and len(valores) == 24:
+                self.multiplicadores[int(dia)] = [float(v) for v in valores]
+
+    def aplicar_escenario(self, escenario):
+        """Marca como bloqueo (7) las celdas de un escenario de escenarios.js
+
+        Raises:
+            ValueError: Si una calle del escenario no existe o tiene otro tamaño
+                o número de carriles (como validarEscenario)
+        """
+        escenario = _leer_json(escenario)
+        errores = []
+        for guardada in escenario.get('callesConfig') or []:
+            indice = self._indice_calle.get(guardada.get('id'), self._indice_calle.get(guardada.get('nombre')))
+            if indice is None:
+                errores.append(f"La calle \"{guardada.get('nombre')}\" no existe en el mapa")
+            elif (self._tamanos[indice] != guardada.get('tamano', self._tamanos[indice])
+                  or self._carriles[indice] != guardada.get('carriles', self._carriles[indice])):
+                errores.append(f"La calle \"{guardada.get('nombre')}\" tiene otra longitud o número de carriles")
+        if errores:
+            raise ValueError("El escenario no corresponde al mapa:\n" + "\n".join(errores))
+
+        for celda in escenario.get('celdasBloqueadas') or []:
+            indice = self._indice_calle.get(celda.get('calleId'), self._indice_calle.get(celda.get('calleNombre')))
+            if indice is not None:
+                self.celdas[self._celda(indice, int(celda['carril']), int(celda['indice']))] = BLOQUEO
+        self._probabilidad_salto()
+
+    # ------------------------------------------------------------ simulación
+
+    def calle(self, nombre):
+        """Vista (carriles, tamano) del estado de una calle"""
+        i = self._indice_calle[nombre]
+        return self.celdas[self._inicio_calle[i]:self._inicio_calle[i + 1]].reshape(
+            int(self._carriles[i]), int(self._tamanos[i]))
+
+    def multiplicador(self):
+        """Multiplicador de generación de la hora virtual actual"""
+        if not self.usar_perfiles:
+            return 1.0
+        return self.multiplicadores[self.dia][int(self.segundo_del_dia // 3600)]
+
+    def paso(self):
+        """Un paso completo, en el mismo orden que paso() de trafico.js"""
+        mide = (self.pasos + 1) % INTERVALO_METRICAS == 0
+        if (mide and not self.entropia_navegador) or self._registro_ocupacion is not None:
+            # Vecindarios a los que se aplica la regla en este paso
+            previa = self.celdas > 0
+            if not self.entropia_navegador:
+                self._ocupacion_entropia = previa
+            if self._registro_ocupacion is not None:
+                self._registro_ocupacion.append(np.packbits(previa, bitorder='little'))
+        self._generar()
+        self._transferir()
+        self._cambiar_carril()
+        self._actualizar_calles()
+        self._avanzar_reloj()
+        self.pasos += 1
+        if self.pasos % INTERVALO_METRICAS == 0:
+            self._medir()
+
+    def simular(self, pasos=None, horas=None, reporte=None):
+        """Avanza la simulación
+
+        Args:
+            pasos: Número de pasos
+            horas: Alternativa a `pasos`, en horas simuladas
+            reporte: Si se indica, imprime el avance cada `reporte` pasos
+
+        Returns:
+            Métricas acumuladas (ver metricas())
+
+        Raises:
+            ValueError: Si no se indicó ni `pasos` ni `horas`
+        """
+        if pasos is None:
+            if horas is None:
+                raise ValueError("Indique el número de pasos o de horas a simular")
+            pasos = math.ceil(horas * 3600 / self.segundos_por_paso)
+        inicio = time.perf_counter()
+        for i in range(1, int(pasos) + 1):
+            self.paso()
+            if reporte and i % reporte == 0:
+                transcurrido = time.perf_counter() - inicio
+                print(f"   {i}/{pasos} pasos ({self.timestamp_virtual()}, {i / transcurrido:.0f} pasos/s)")
+        return self.metricas()
+
+    def _generar(self):
+        """Nuevos vehículos en la primera celda de cada carril GENERADOR libre"""
+        idx = self._inicios_generador
+        if not idx.size:
+            return
+        sorteo = self.rng.random(idx.size)
+        tipos = self.rng.integers(1, TIPOS_VEHICULO + 1, idx.size, dtype=np.int8)
+        nace = (self.celdas[idx] == 0) & (sorteo < self._p_generacion * self.multiplicador())
+        self.celdas[idx[nace]] = tipos[nace]
+
+    def _transferir(self):
+        """ConexionCA.transferir para todas las conexiones, ronda por ronda"""
+        celdas, esperando = self.celdas, self.esperando
+        for origenes, destinos, probabilidades, probabilisticas, hay_probabilisticas in self._rondas:
+            vehiculos = celdas[origenes]
+            pasa = vehiculos > 0
+            if hay_probabilisticas:
+                pasa &= ~probabilisticas | (self.rng.random(origenes.size) < probabilidades)
+            bloqueada = pasa & (celdas[destinos] > 0)
+            mover = pasa & ~bloqueada & ~esperando[origenes]
+            esperando[origenes[bloqueada]] = True
+            celdas[destinos[mover]] = vehiculos[mover]
+            celdas[origenes[mover]] = 0
+
+    def _cambiar_carril(self):
+        """cambioCarril de trafico.js vectorizado sobre todas las calles
+
+        Los carriles se recorren en orden (como el ciclo externo del
+        navegador) para respetar qué vehículo reserva primero un destino; dentro
+        de un carril los destinos nunca coinciden y se resuelven juntos.
+        """
+        celdas, esperando = self.celdas, self.esperando
+        if (self._bloqueos_en_salida is not None
+                and not np.array_equal(celdas[self._salidas_bloqueo] == BLOQUEO, self._bloqueos_en_salida)):
+            self._probabilidad_salto()
+        origen = np.flatnonzero(_es_vehiculo(celdas) & ~esperando & self._puede_cambiar)
+        if not origen.size:
+            return
+
+        probabilidad = self._p_salto[origen]
+        sorteo = self.rng.random((2, origen.size))
+        intenta = sorteo[0] < probabilidad
+        if not intenta.any():
+            return
+        origen, eleccion = origen[intenta], sorteo[1][intenta]
+
+        reservado = self._reservado
+        carril = self._carril[origen]
+        origenes, destinos = [], []
+        for c in self._carriles_cambio:
+            sel = carril == c
+            if not sel.any():
+                continue
+            de_carril = origen[sel]
+            arriba, abajo = self._destino_arriba[de_carril], self._destino_abajo[de_carril]
+            libre = []
+            for destino in (arriba, abajo):
+                seguro = np.maximum(destino, 0)
+                libre.append((destino >= 0) & (celdas[seguro] == 0) & ~esperando[seguro] & ~reservado[seguro])
+            libre_arriba, libre_abajo = libre
+            elegir_arriba = libre_arriba & (~libre_abajo | (eleccion[sel] < 0.5))
+            destino = np.where(elegir_arriba, arriba, np.where(libre_abajo, abajo, -1))
+            valido = destino >= 0
+            origenes.append(de_carril[valido])
+            destinos.append(destino[valido])
+            reservado[destino[valido]] = True
+
+        origenes, destinos = np.concatenate(origenes), np.concatenate(destinos)
+        reservado[destinos] = False
+        if not origenes.size:
+            return
+
+        # Cruces en "X": un vehículo baja y el de abajo en la misma columna sube; se cancelan ambos
+        tam = self._tam[origenes]
+        baja = destinos > origenes
+        self._sube[origenes[~baja]] = True
+        cruzada = np.zeros(origenes.size, dtype=bool)
+        cruzada[baja] = self._sube[origenes[baja] + tam[baja]]
+        self._sube[origenes[~baja]] = False
+        if cruzada.any():
+            pareja = origenes[cruzada] + tam[cruzada]
+            cruzada |= np.isin(origenes, pareja)
+            origenes, destinos = origenes[~cruzada], destinos[~cruzada]
+
+        vehiculos = celdas[origenes]
+        celdas[origenes] = 0
+        celdas[destinos] = vehiculos
+        esperando[destinos] = True
+        for celda in (destinos, origenes):
+            siguiente = celda[self._pos[celda] < self._tam[celda] - 1] + 1
+            esperando[siguiente] = True
+
+    def _actualizar_calles(self):
+        """Regla 184 modificada (tabla `reglas` de trafico.js) sobre todo el mapa
+
+        La tabla se reduce a: un vehículo deja su celda si la de adelante está
+        vacía y se queda si está ocupada; una celda vacía recibe el vehículo
+        de atrás; el bloqueo 7 nunca se mueve. Las celdas esperando y los
+        vehículos retenidos por una conexión no cambian, y una celda esperando
+        atrás cuenta como vacía.
+        """
+        celdas, esperando = self.celdas, self.esperando
+        vehiculo = _es_vehiculo(celdas)
+        retener = esperando | (self._retenida & (celdas != 0))
+
+        adelante_libre = np.empty_like(vehiculo)
+        np.equal(celdas[1:], 0, out=adelante_libre[:-1])
+        adelante_libre[self._fines_carril] = True
+        sale = vehiculo & adelante_libre & ~retener
+
+        llega = np.zeros_like(vehiculo)
+        np.logical_and(vehiculo[:-1], ~esperando[:-1], out=llega[1:])
+        llega[self._inicios_carril] = False
+        llega &= (celdas == 0) & ~retener
+        destinos = np.flatnonzero(llega)
+        llegan = celdas[destinos - 1]
+
+        celdas[sale] = 0
+        celdas[destinos] = llegan
+        esperando[:] = False
+        celdas[self._fines_devorador] = 0
+
+    def _avanzar_reloj(self):
+        self.segundo_del_dia += self.segundos_por_paso
+        if self.segundo_del_dia >= 86400:
+            dias, self.segundo_del_dia = divmod(self.segundo_del_dia, 86400)
+            self.dia = (self.dia + int(dias)) % 7
+
+    # -------------------------------------------------------------- métricas
+
+    def timestamp_corto(self):
+        """HH:MM:SS del reloj virtual"""
+        segundos = int(self.segundo_del_dia)
+        return f"{segundos // 3600:02d}:{segundos % 3600 // 60:02d}:{segundos % 60:02d}"
+
+    def timestamp_virtual(self):
+        """'Lunes 14:35:42', como obtenerTimestampVirtual"""
+        return f"{NOMBRES_DIAS[self.dia]} {self.timestamp_corto()}"
+
+    def _medir(self):
+        """calculateMetrics de graficas.js sobre las calles incluidas
+
+        A diferencia del navegador, la generación neta se mide con un reloj
+        que no se reinicia cada semana y la primera medición no compara
+        contra cero vehículos.
+        """
+        ocupadas = self.celdas > 0
+        en_movimiento = ocupadas & (self.celdas[self._siguiente] == 0)
+        incluidas = self._celdas_metricas
+        if incluidas is None:
+            total_celdas, autos, moviendo = ocupadas.size, int(ocupadas.sum()), int(en_movimiento.sum())
+        else:
+            total_celdas = incluidas.size
+            autos, moviendo = int(ocupadas[incluidas].sum()), int(en_movimiento[incluidas].sum())
+
+        if not self.entropia_navegador:
+            self._entropia = self._calcular_entropia()
+        elif self.pasos % INTERVALO_ENTROPIA == 0:
+            self._entropia = self._calcular_entropia()
+            self._ocupacion_entropia = ocupadas
+
+        densidad = autos / total_celdas if total_celdas else 0.0
+        velocidad = moviendo / autos if autos else 0.0
+        intervalo = INTERVALO_METRICAS * self.segundos_por_paso
+        generacion = 0.0 if self._autos_previos is None else abs(autos - self._autos_previos) / intervalo
+        self._autos_previos = autos
+
+        m = self._mediciones
+        m['timestamps'].append(self.timestamp_corto())
+        m['density'].append(round(densidad * 100, 2))
+        m['throughput'].append(round(densidad * velocidad * FACTOR_ESCALA_FLUJO, 2))
+        m['netGeneration'].append(round(generacion, 2))
+        m['speed'].append(round(velocidad * 100, 2))
+        m['entropy'].append(round(self._entropia, 3))
+
+    def _calcular_entropia(self):
+        """Entropía de Shannon de los vecindarios (izq, centro, der) de la ocupación guardada"""
+        if self._ocupacion_entropia is None:
+            return 0.0
+        return self._vecindarios.entropia(self._ocupacion_entropia)
+
+    def metricas(self):
+        """Métricas acumuladas con el formato de 'metrics' del JSON exportado"""
+        return {clave: (list(valores) if clave == 'timestamps' else np.array(valores, dtype=np.float64))
+                for clave, valores in self._mediciones.items()}
+
+    def tiempo_virtual(self):
+        """Diccionario 'virtualTime' de la metadata JSON"""
+        segundos = int(self.segundo_del_dia)
+        return {
+            'currentTime': self.timestamp_virtual(),
+            'day': NOMBRES_DIAS[self.dia],
+            'hour': segundos // 3600,
+            'minute': segundos % 3600 // 60,
+            'second': segundos % 60,
+            'profilesActive': self.usar_perfiles,
+            'secondsPerStep': self.segundos_por_paso,
+            'currentMultiplier': self.multiplicador(),
+        }
+
+    def guardar_ocupacion(self, destino):
+        """Escribe las instantáneas registradas en un .npz para entropia_ca.py
+
+        Cada fila es la ocupación (np.packbits, bitorder='little') al inicio
+        del paso indicado en 'pasos'; la entropía de la fila de un paso
+        múltiplo de INTERVALO_METRICAS coincide con la de esa medición.
+
+        Raises:
+            ValueError: Si el simulador se creó sin registrar_ocupacion
+        """
+        if self._registro_ocupacion is None:
+            raise ValueError("El simulador no registra la ocupación (registrar_ocupacion=False)")
+        registro = self._registro_ocupacion
+        ocupacion = np.array(registro) if registro else np.zeros((0, -(-self.celdas.size // 8)), dtype=np.uint8)
+        np.savez_compressed(
+            destino,
+            ocupacion=ocupacion,
+            pasos=np.arange(self.pasos - len(registro) + 1, self.pasos + 1),
+            longitudes_carril=np.repeat(self._tamanos, self._carriles),
+            incluidas=np.zeros(0, dtype=bool) if self._incluidas is None else self._incluidas,
+        )
+
+    def exportar(self, destino):
+        """Escribe las métricas en CSV o JSON según la extensión de `destino`"""
+        metricas = self.metricas()
+        if destino.lower().endswith('.json'):
+            contenido = exportacion_json(metricas, self.tiempo_virtual(), 'FLUVI Traffic Simulation (headless)')
+        else:
+            contenido = exportacion_csv(metricas, self.segundos_por_paso, self.timestamp_virtual(),
+                                        self.usar_perfiles)
+        with open(destino, 'w', encoding='utf-8') as f:
+            f.write(contenido)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Simulación headless de un mapa FLUVI")
+    parser.add_argument("mapa", help="Simulación guardada desde el constructor (.json)")
+    parser.add_argument("--escenario", help="Escenario de bloqueos guardado (.json)")
+    duracion = parser.add_mutually_exclusive_group(required=True)
+    duracion.add_argument("--horas", type=float, help="Horas simuladas")
+    duracion.add_argument("--pasos", type=int, help="Pasos de simulación")
+    parser.add_argument("--semilla", type=int, help="Semilla para corridas reproducibles")
+    parser.add_argument("--sin-perfiles", action="store_true", help="Ignora los multiplicadores por día y hora")
+    parser.add_argument("--salida", default="metricas_headless.csv", help="Exportación de métricas (.csv o .json)")
+    parser.add_argument("--entropia-navegador", action="store_true",
+                        help=f"Entropía cada {INTERVALO_ENTROPIA} pasos, como graficas.js")
+    parser.add_argument("--ocupacion", help="Guarda la ocupación de cada paso (.npz) para entropia_ca.py")
+    args = parser.parse_args()
+
+    try:
+        simulador = SimuladorCA(args.mapa, args.escenario, semilla=args.semilla,
+                                usar_perfiles=False if args.sin_perfiles else None,
+                                entropia_navegador=args.entropia_navegador,
+                                registrar_ocupacion=bool(args.ocupacion))
+    except (ValueError, KeyError, OSError) as e:
+        print(f"\nERROR: {e}")
+        sys.exit(1)
+
+    print(f"🚦 {len(simulador.nombres)} calles, {simulador.celdas.size} celdas, {simulador.n_conexiones} conexiones")
+    pasos = args.pasos or math.ceil(args.horas * 3600 / simulador.segundos_por_paso)
+    inicio = time.perf_counter()
+    simulador.simular(pasos, reporte=max(pasos // 10, 1))
+    transcurrido = time.perf_counter() - inicio
+    simulador.exportar(args.salida)
+    print(f"⏱️  {pasos} pasos en {transcurrido:.1f} s ({pasos / transcurrido:.0f} pasos/s, "
+          f"{pasos * simulador.segundos_por_paso / max(transcurrido, 1e-9):.0f}x tiempo real simulado)")
+    print(f"📊 Métricas: {args.salida} ({len(simulador._mediciones['timestamps'])} mediciones)")
+    if args.ocupacion:
+        simulador.guardar_ocupacion(args.ocupacion)
+        print(f"🧮 Ocupación por paso: {args.ocupacion}")
+
+
+if __name__ == "__main__":
+    main()